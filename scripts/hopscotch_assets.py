@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""Build a manifest of every asset an adventure uses and check local files.
+
+Asset blocks (SPEC §17) and the ``assets`` attachment lists of other blocks
+are gathered with a fence-only scan: only ``asset`` bodies and bodies that
+mention ``assets:`` are decoded. Entries are de-duplicated by the file or
+URL an asset points to, so an image shared by several asset ids or files is
+listed (and packaged) once, with every declaring id and attaching block.
+
+Relative and ``file://`` URIs are resolved against the directory of the
+file declaring them and checked on a thread pool. Each local file is
+stat'ed once; the previous manifest serves as a stat cache, so a file whose
+size and modification time are unchanged keeps its recorded content hash
+and only new or edited files are read. Other URIs are recorded as remote
+and not fetched.
+"""
+import argparse
+import hashlib
+import json
+import os
+import stat
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+from urllib.request import url2pathname
+
+from validate_hopscotch import block_tree, decode_span, expand_paths, map_file, scan_spans
+
+DEFAULT_MANIFEST = "hopscotch-assets.json"
+MANIFEST_VERSION = 1
+DIGEST_SIZE = 16
+
+
+@dataclass
+class AssetEntry:
+    uri: str
+    # Resolved local path, or None for a remote URI.
+    path: Optional[str]
+    # {"id", "path", "line"} of each asset block pointing here.
+    declarations: List[Dict[str, Any]] = field(default_factory=list)
+    # {"id", "type", "path", "line"} of each block attaching one of those assets.
+    referrers: List[Dict[str, Any]] = field(default_factory=list)
+    # "ok", "missing" or "remote"
+    status: str = "remote"
+    size: Optional[int] = None
+    mtime_ns: Optional[int] = None
+    digest: Optional[str] = None
+    # Whether the file was read this run rather than taken from the previous manifest.
+    hashed: bool = False
+
+
+def resolve_uri(uri: str, base_dir: str) -> Optional[str]:
+    """The local path ``uri`` names, relative to ``base_dir``, or None if it is remote."""
+    parts = urlsplit(uri)
+    if parts.scheme == "file":
+        return os.path.normpath(url2pathname(parts.path))
+    # One-letter schemes are Windows drive letters, not URLs.
+    if len(parts.scheme) > 1:
+        return None
+    return os.path.normpath(os.path.join(base_dir, unquote(uri)))
+
+
+class AssetCollector:
+    """Asset entries keyed by resolved path or remote URI, in order of declaration."""
+
+    def __init__(self) -> None:
+        self.entries: Dict[str, AssetEntry] = {}
+        self.problems: List[str] = []
+
+    def add_file(self, path: str, buffer: Any) -> None:
+        base_dir = os.path.dirname(path)
+        declared: Dict[str, AssetEntry] = {}
+        # (asset id, referrer) in document order; resolved once every asset is known.
+        attachments: List[Tuple[str, Dict[str, Any]]] = []
+        for span in scan_spans(buffer):
+            if span.block_type != "asset" and b"assets:" not in buffer[span.body_start : span.body_end]:
+                continue
+            tree = block_tree(decode_span(buffer, span))
+            if span.block_type == "asset":
+                uri = tree.get("uri")
+                if not isinstance(uri, str) or not uri or span.block_id in declared:
+                    continue
+                local = resolve_uri(uri, base_dir)
+                key = uri if local is None else local
+                entry = self.entries.setdefault(key, AssetEntry(uri, local))
+                entry.declarations.append({"id": span.block_id, "path": path, "line": span.line_start})
+                declared[span.block_id] = entry
+            entries = tree.get("assets")
+            if isinstance(entries, list):
+                referrer = {"id": span.block_id, "type": span.block_type, "path": path, "line": span.line_start}
+                refs = [item.get("ref") for item in entries if isinstance(item, dict)]
+                attachments.extend((ref, referrer) for ref in refs if isinstance(ref, str) and ref)
+        for ref, referrer in attachments:
+            entry = declared.get(ref)
+            if entry is None:
+                self.problems.append(
+                    f"{path}:{referrer['line']}: {referrer['type']} {referrer['id']} "
+                    f"attaches undeclared asset '{ref}'."
+                )
+            # Another of this block's assets may already have led to the same entry.
+            elif not entry.referrers or entry.referrers[-1] is not referrer:
+                entry.referrers.append(referrer)
+
+
+def check_entry(entry: AssetEntry, path: str, previous: Dict[str, Dict[str, Any]]) -> None:
+    """Stat the local asset at ``path`` and hash it unless the previous manifest already has it."""
+    try:
+        info = os.stat(path)
+    except OSError:
+        entry.status = "missing"
+        return
+    if not stat.S_ISREG(info.st_mode):
+        entry.status = "missing"
+        return
+    entry.size, entry.mtime_ns = info.st_size, info.st_mtime_ns
+    cached = previous.get(path, {})
+    if (cached.get("size"), cached.get("mtimeNs")) == (entry.size, entry.mtime_ns) and cached.get("blake2b"):
+        entry.digest = cached["blake2b"]
+    else:
+        try:
+            with open(path, "rb") as f:
+                entry.digest = hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=DIGEST_SIZE)).hexdigest()
+        except OSError:
+            entry.status = "missing"
+            return
+        entry.hashed = True
+    entry.status = "ok"
+
+
+def check_entries(entries: List[AssetEntry], previous: Dict[str, Dict[str, Any]], jobs: int) -> None:
+    local = [entry for entry in entries if entry.path is not None]
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        list(executor.map(lambda entry: check_entry(entry, entry.path, previous), local))
+
+
+def load_manifest(path: str) -> Dict[str, Dict[str, Any]]:
+    """Local entries of a previous manifest by path; empty if it is missing or unreadable."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            document = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(document, dict) or document.get("version") != MANIFEST_VERSION:
+        return {}
+    return {
+        item["path"]: item
+        for item in document.get("assets", [])
+        if isinstance(item, dict) and isinstance(item.get("path"), str)
+    }
+
+
+def manifest_document(entries: List[AssetEntry]) -> Dict[str, Any]:
+    assets = []
+    for entry in entries:
+        item: Dict[str, Any] = {"uri": entry.uri, "path": entry.path, "status": entry.status}
+        if entry.status == "ok":
+            item.update({"size": entry.size, "mtimeNs": entry.mtime_ns, "blake2b": entry.digest})
+        item["declarations"] = entry.declarations
+        item["referrers"] = entry.referrers
+        assets.append(item)
+    return {"version": MANIFEST_VERSION, "assets": assets}
+
+
+def write_manifest(path: str, document: Dict[str, Any]) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(document, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="validate_hopscotch.py assets",
+        description="Write a de-duplicated manifest of every asset with its referrers, size and content hash.",
+        epilog="Exit status is 1 if a local asset is missing or an undeclared asset is attached, 2 on errors.",
+    )
+    parser.add_argument(
+        "paths", nargs="+", metavar="path", help="Path to a .hopscotch file, a directory, or a glob"
+    )
+    parser.add_argument(
+        "-o",
+        "--manifest",
+        default=DEFAULT_MANIFEST,
+        metavar="PATH",
+        help=f"Manifest to write; its hashes are reused for unchanged files (default: {DEFAULT_MANIFEST})",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=min(32, (os.cpu_count() or 1) + 4),
+        help="Threads checking local files (default: CPU count + 4, at most 32)",
+    )
+    args = parser.parse_args(argv)
+
+    collector = AssetCollector()
+    for path in expand_paths(args.paths):
+        try:
+            with open(path, "rb") as f:
+                # Empty files cannot be mapped; read them instead.
+                buffer = map_file(f) or f.read()
+                try:
+                    collector.add_file(path, buffer)
+                finally:
+                    if hasattr(buffer, "close"):
+                        buffer.close()
+        except (OSError, UnicodeDecodeError) as exc:
+            print(f"ERROR: Could not read {path}: {exc}", file=sys.stderr)
+            return 2
+
+    entries = list(collector.entries.values())
+    check_entries(entries, load_manifest(args.manifest), args.jobs)
+    try:
+        write_manifest(args.manifest, manifest_document(entries))
+    except OSError as exc:
+        print(f"ERROR: Could not write {args.manifest}: {exc}", file=sys.stderr)
+        return 2
+
+    problems = list(collector.problems)
+    for entry in entries:
+        if entry.status == "missing":
+            for declaration in entry.declarations:
+                problems.append(
+                    f"{declaration['path']}:{declaration['line']}: {declaration['id']} uri '{entry.uri}' "
+                    f"does not name a readable file ({entry.path})."
+                )
+    for problem in problems:
+        print(problem)
+    counts = {status: sum(entry.status == status for entry in entries) for status in ("ok", "missing", "remote")}
+    hashed = sum(entry.hashed for entry in entries)
+    print(
+        f"Wrote {args.manifest}: {len(entries)} assets ({counts['ok']} local, {counts['missing']} missing, "
+        f"{counts['remote']} remote); {hashed} hashed, {counts['ok'] - hashed} unchanged."
+    )
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Benchmark the validator's phases on generated adventures.
+
+Each size is measured in a fresh spawned process so peak RSS belongs to
+that size alone. ``parse_blocks``, ``validate_block``, ``build_node_index``
+and ``print_node_hierarchy`` are timed separately (best of ``--repeat``)
+and reported as items per second. Results can be saved as a JSON baseline
+and later runs compared against it, failing when a phase slows down or
+peak RSS grows by more than ``--threshold``.
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from typing import Any, Callable, Dict, List, Optional
+
+from hopscotch_generate import generate_adventure
+from validate_hopscotch import (
+    NODE_TYPES,
+    build_node_index,
+    parse_blocks,
+    print_node_hierarchy,
+    read_frontmatter,
+    validate_block,
+)
+
+try:
+    import resource
+except ImportError:  # Windows has no getrusage; peak RSS is then not recorded.
+    resource = None  # type: ignore[assignment]
+
+PHASES = ["parse_blocks", "validate_block", "build_node_index", "print_node_hierarchy"]
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+
+def peak_rss_kb() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere.
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _best_of(repeat: int, func: Callable[[], Any]) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def measure(blocks: int, seed: int = 0, repeat: int = 3) -> Dict[str, Any]:
+    """Time each phase on a ``blocks``-block adventure generated from ``seed``."""
+    lines = list(generate_adventure(blocks, seed))
+    _, version = read_frontmatter(iter(lines))
+    parsed, _ = parse_blocks(lines)
+    nodes = [block for block in parsed if block.block_type in NODE_TYPES]
+
+    def validate_all() -> None:
+        for block in parsed:
+            validate_block(block, version)
+
+    def render() -> None:
+        with redirect_stdout(io.StringIO()):
+            print_node_hierarchy(nodes)
+
+    timings = [
+        ("parse_blocks", len(parsed), lambda: parse_blocks(lines)),
+        ("validate_block", len(parsed), validate_all),
+        ("build_node_index", len(parsed), lambda: build_node_index(parsed)),
+        ("print_node_hierarchy", len(nodes), render),
+    ]
+    phases = {}
+    for name, items, func in timings:
+        seconds = _best_of(repeat, func)
+        phases[name] = {"items": items, "seconds": seconds, "opsPerSec": items / max(seconds, 1e-9)}
+    return {"blocks": blocks, "lines": len(lines), "peakRssKb": peak_rss_kb(), "phases": phases}
+
+
+def run_benchmarks(sizes: List[int], seed: int = 0, repeat: int = 3) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    context = multiprocessing.get_context("spawn")
+    for blocks in sizes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results[str(blocks)] = pool.submit(measure, blocks, seed, repeat).result()
+    return {"seed": seed, "repeat": repeat, "python": platform.python_version(), "sizes": results}
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Return one message per phase or RSS figure that regressed past ``threshold``."""
+    regressions: List[str] = []
+    for size, run in current["sizes"].items():
+        base = baseline.get("sizes", {}).get(size)
+        if base is None:
+            continue
+        for phase, stats in run["phases"].items():
+            base_stats = base["phases"].get(phase)
+            if base_stats is None:
+                continue
+            floor = base_stats["opsPerSec"] * (1 - threshold)
+            if stats["opsPerSec"] < floor:
+                drop = 1 - stats["opsPerSec"] / base_stats["opsPerSec"]
+                regressions.append(
+                    f"{size} blocks: {phase} {stats['opsPerSec']:.1f} ops/sec is {drop:.1%} below "
+                    f"baseline {base_stats['opsPerSec']:.1f}."
+                )
+        rss, base_rss = run.get("peakRssKb"), base.get("peakRssKb")
+        if rss and base_rss and rss > base_rss * (1 + threshold):
+            regressions.append(
+                f"{size} blocks: peak RSS {rss / 1024:.1f} MB is {rss / base_rss - 1:.1%} above "
+                f"baseline {base_rss / 1024:.1f} MB."
+            )
+    return regressions
+
+
+def print_results(results: Dict[str, Any]) -> None:
+    print(f"{'blocks':>9}  {'phase':<22}{'items':>9}{'seconds':>11}{'ops/sec':>13}")
+    for size, run in results["sizes"].items():
+        for phase in PHASES:
+            stats = run["phases"][phase]
+            print(f"{size:>9}  {phase:<22}{stats['items']:>9}{stats['seconds']:>11.4f}{stats['opsPerSec']:>13.1f}")
+        if run["peakRssKb"] is not None:
+            print(f"{size:>9}  {'peak RSS':<22}{run['peakRssKb'] / 1024:>29.1f} MB")
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="validate_hopscotch.py bench",
+        description="Time parsing, validation and hierarchy phases on generated adventures.",
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=int,
+        default=DEFAULT_SIZES,
+        metavar="N",
+        help="Adventure sizes in blocks (default: 1000 10000 100000)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Generator seed (default: 0)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per phase; the best is kept (default: 3)")
+    parser.add_argument("--baseline", metavar="PATH", help="Compare against a saved JSON baseline")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.15,
+        help="Allowed fractional slowdown or RSS growth before failing (default: 0.15)",
+    )
+    parser.add_argument("--save", metavar="PATH", help="Write results as a JSON baseline to PATH")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as exc:
+            print(f"ERROR: Could not read baseline {args.baseline}: {exc}", file=sys.stderr)
+            return 2
+        if baseline.get("seed") != args.seed:
+            print(
+                f"ERROR: Baseline {args.baseline} was recorded with seed {baseline.get('seed')}, not {args.seed}.",
+                file=sys.stderr,
+            )
+            return 2
+
+    results = run_benchmarks(args.sizes, args.seed, max(args.repeat, 1))
+    print_results(results)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+
+    if baseline is None:
+        return 0
+    regressions = compare_results(results, baseline, args.threshold)
+    if regressions:
+        print("\nRegressions:", file=sys.stderr)
+        for message in regressions:
+            print(f"- {message}", file=sys.stderr)
+        return 1
+    print(f"\nNo regressions beyond {args.threshold:.0%} of baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
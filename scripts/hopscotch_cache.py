@@ -0,0 +1,131 @@
+"""Persistent per-block validation cache for validate_hopscotch.py.
+
+Entries are keyed by a hash of the block's type, id, raw body bytes, the
+file's ``hopscotchVersion`` and the JSON Schemas in use, salted with the
+validator source so rule changes invalidate everything. Each entry holds the
+block's errors, warnings and references, so a hit needs no parsing at all.
+Messages are stored with their diagnostic codes but without their ``Line N:``
+prefix, so blocks that merely move within a file still hit.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import List, Optional, Sequence, Tuple
+
+from validate_hopscotch import Message, diagnostic_code
+
+DEFAULT_CACHE_DIR = ".hopscotch-cache"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Bumped whenever the payload layout changes, so old entries stop matching.
+PAYLOAD_FORMAT = 3
+
+# (errors, warnings, (field, target) of each reference) for one block
+CachedBlock = Tuple[List[str], List[str], List[Tuple[str, str]]]
+
+
+class BlockCache:
+    def __init__(self, directory: str, salt: bytes = b"") -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._salt = salt
+        self._db = sqlite3.connect(os.path.join(directory, "blocks.sqlite3"), timeout=60)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key BLOB PRIMARY KEY, payload TEXT NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)"
+        )
+        self._pending: List[Tuple[bytes, str, int, float]] = []
+        self._touched: List[bytes] = []
+        self.hits = 0
+        self.misses = 0
+
+    def __enter__(self) -> "BlockCache":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def key(
+        self,
+        block_type: str,
+        block_id: str,
+        body: bytes,
+        hopscotch_version: Optional[Tuple[int, int, int]],
+        schemas: str = "",
+    ) -> bytes:
+        """Key for a block's raw UTF-8 ``body``; ``schemas`` is the fingerprint of the schemas applied."""
+        digest = hashlib.blake2b(self._salt, digest_size=20)
+        digest.update(f"{PAYLOAD_FORMAT}\0{block_type}\0{block_id}\0{hopscotch_version}\0{schemas}\0".encode("utf-8"))
+        digest.update(body)
+        return digest.digest()
+
+    def get(self, key: bytes, line_start: int) -> Optional[CachedBlock]:
+        row = self._db.execute("SELECT payload FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touched.append(key)
+        errors, warnings, refs = json.loads(row[0])
+        prefix = f"Line {line_start}: "
+        return (
+            [Message(code, prefix + msg) for code, msg in errors],
+            [Message(code, prefix + msg) for code, msg in warnings],
+            refs,
+        )
+
+    def put(
+        self,
+        key: bytes,
+        line_start: int,
+        errors: List[str],
+        warnings: List[str],
+        refs: Sequence[Tuple[str, str]] = (),
+    ) -> None:
+        prefix = f"Line {line_start}: "
+        if not all(msg.startswith(prefix) for msg in errors + warnings):
+            return
+        payload = json.dumps(
+            [
+                [[diagnostic_code(msg), msg[len(prefix) :]] for msg in errors],
+                [[diagnostic_code(msg), msg[len(prefix) :]] for msg in warnings],
+                list(refs),
+            ],
+            separators=(",", ":"),
+        )
+        self._pending.append((key, payload, len(key) + len(payload), time.time()))
+
+    def flush(self) -> None:
+        now = time.time()
+        with self._db:
+            if self._pending:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO entries (key, payload, size, used) VALUES (?, ?, ?, ?)",
+                    self._pending,
+                )
+            if self._touched:
+                self._db.executemany(
+                    "UPDATE entries SET used = ? WHERE key = ?", ((now, key) for key in self._touched)
+                )
+        self._pending.clear()
+        self._touched.clear()
+
+    def evict(self, max_bytes: int = DEFAULT_MAX_BYTES) -> int:
+        """Drop least recently used entries until the cache fits in ``max_bytes``."""
+        self.flush()
+        total = 0
+        stale: List[Tuple[bytes]] = []
+        for key, size in self._db.execute("SELECT key, size FROM entries ORDER BY used DESC"):
+            total += size
+            if total > max_bytes:
+                stale.append((key,))
+        if stale:
+            with self._db:
+                self._db.executemany("DELETE FROM entries WHERE key = ?", stale)
+        return len(stale)
+
+    def close(self) -> None:
+        self.flush()
+        self._db.close()
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""Compile a Hopscotch file into a binary sidecar index for fast loading.
+
+``adventure.hopscotch`` gets ``adventure.hopscotch.idx``, a little-endian
+file of fixed-width ``struct`` records (no pickle):
+
+* a header: magic, format version, the source's size, modification time
+  and BLAKE2b digest, and the count and offset of each table;
+* a string table: ``count + 1`` uint32 offsets followed by the UTF-8 blob,
+  holding every type name, id, field name and field value once;
+* a block table: per block, its type, id, line and the byte offsets of its
+  opening fence, body and end in the source, plus its run of fields;
+* a field table of ``(name, value)`` string pairs, the pre-parsed top-level
+  values each block's ``values`` would hold;
+* an id table of ``(id, block)`` pairs sorted by the id's UTF-8 bytes, so
+  the first declaration of a duplicated id comes first;
+* an inverted index: ``(field, term)`` records sorted by field and term
+  bytes, each pointing at an ascending run of block numbers in a postings
+  table, for the block type and every ``tags``, ``parent`` and ``scope``
+  value;
+* an error table of string numbers, the parse errors met while compiling,
+  so a current sidecar reports them as a fresh compile would.
+
+``CompiledIndex`` maps the sidecar and finds a block by id, id prefix or
+term with a binary search, decoding only the records it touches.
+``load_index`` checks the stamp against the source and recompiles when the
+sidecar is missing, stale or unreadable; the source is only re-hashed when
+its size or modification time differs from the stamp.
+"""
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from validate_hopscotch import Block, block_tree, decode_span, expand_paths, map_file, scan_spans
+
+SIDECAR_SUFFIX = ".idx"
+MAGIC = b"HSIDX\r\n\x1a"
+FORMAT_VERSION = 4
+DIGEST_SIZE = 16
+
+# magic, version, source size, source mtime (ns), source digest, block/field/id/string/term/posting/error
+# counts, then the offsets of the string, block, field, id, term, posting and error tables.
+HEADER = struct.Struct(f"<8sIQQ{DIGEST_SIZE}sIIIIIIIQQQQQQQ")
+# where the source mtime sits in the header, so a touched but unchanged source is re-stamped in place
+MTIME = struct.Struct("<Q")
+MTIME_AT = 20
+# type, id, line, fence, body start, body end, end, first field, field count
+BLOCK_RECORD = struct.Struct("<IIIQQQQII")
+# name, value
+FIELD_RECORD = struct.Struct("<II")
+# id, block
+ID_RECORD = struct.Struct("<II")
+# field, term, first posting, posting count
+TERM_RECORD = struct.Struct("<IIII")
+POSTING = struct.Struct("<I")
+# Fields in the inverted index; a term record stores the field's position here.
+TERM_FIELDS = ["type", "tags", "parent", "scope"]
+OFFSET = struct.Struct("<I")
+# a string's start and end within the blob
+OFFSET_PAIR = struct.Struct("<II")
+
+
+class SidecarError(Exception):
+    """Raised when a sidecar is truncated, corrupt or from another format version."""
+
+
+def sidecar_path(path: str) -> str:
+    return path + SIDECAR_SUFFIX
+
+
+def source_digest(data: Any) -> bytes:
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).digest()
+
+
+def build_index(data: Any, errors: Optional[List[str]] = None, mtime_ns: int = 0) -> bytes:
+    """The sidecar for the UTF-8 source ``data`` (bytes or an mmap); parse errors go to ``errors``.
+
+    ``mtime_ns`` is the source's modification time; left at 0 the stamp
+    never looks current, so the first load checks the digest.
+    """
+    strings: Dict[str, int] = {}
+
+    def string(text: str) -> int:
+        number = strings.get(text)
+        if number is None:
+            number = strings[text] = len(strings)
+        return number
+
+    blocks = bytearray()
+    fields = bytearray()
+    ids: List[Tuple[bytes, int, int]] = []
+    # (field, term) -> ascending block numbers
+    postings: Dict[Tuple[int, str], List[int]] = {}
+    field_count = 0
+    parse_errors: List[str] = []
+    for number, span in enumerate(scan_spans(data, parse_errors)):
+        block = decode_span(data, span)
+        values = block.values
+        blocks += BLOCK_RECORD.pack(
+            string(span.block_type),
+            string(span.block_id),
+            span.line_start,
+            span.start,
+            span.body_start,
+            span.body_end,
+            span.end,
+            field_count,
+            len(values),
+        )
+        for name, value in values.items():
+            fields += FIELD_RECORD.pack(string(name), string(value))
+        field_count += len(values)
+        if span.block_id:
+            ids.append((span.block_id.encode("utf-8"), number, string(span.block_id)))
+        for field, term in _terms(block):
+            numbers = postings.get((field, term))
+            if numbers is None:
+                numbers = postings[field, term] = []
+                string(term)
+            if not numbers or numbers[-1] != number:
+                numbers.append(number)
+    ids.sort()
+    error_table = b"".join(OFFSET.pack(string(error)) for error in parse_errors)
+    if errors is not None:
+        errors.extend(parse_errors)
+
+    encoded = [text.encode("utf-8") for text in strings]
+    offsets = [0]
+    for item in encoded:
+        offsets.append(offsets[-1] + len(item))
+    string_table = struct.pack(f"<{len(offsets)}I", *offsets) + b"".join(encoded)
+    id_table = b"".join(ID_RECORD.pack(name, number) for _, number, name in ids)
+    terms = bytearray()
+    posting_table = bytearray()
+    posting_count = 0
+    for (field, term), numbers in sorted(postings.items(), key=lambda item: (item[0][0], item[0][1].encode("utf-8"))):
+        terms += TERM_RECORD.pack(field, strings[term], posting_count, len(numbers))
+        posting_table += struct.pack(f"<{len(numbers)}I", *numbers)
+        posting_count += len(numbers)
+
+    strings_at = HEADER.size
+    blocks_at = strings_at + len(string_table)
+    fields_at = blocks_at + len(blocks)
+    ids_at = fields_at + len(fields)
+    terms_at = ids_at + len(id_table)
+    postings_at = terms_at + len(terms)
+    errors_at = postings_at + len(posting_table)
+    header = HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        len(data),
+        mtime_ns,
+        source_digest(data),
+        len(blocks) // BLOCK_RECORD.size,
+        field_count,
+        len(ids),
+        len(strings),
+        len(terms) // TERM_RECORD.size,
+        posting_count,
+        len(parse_errors),
+        strings_at,
+        blocks_at,
+        fields_at,
+        ids_at,
+        terms_at,
+        postings_at,
+        errors_at,
+    )
+    return b"".join([header, string_table, blocks, fields, id_table, terms, posting_table, error_table])
+
+
+def _terms(block: Block) -> Iterator[Tuple[int, str]]:
+    """``(field, term)`` for each inverted-index entry of ``block``."""
+    yield 0, block.block_type
+    tree = block_tree(block)
+    for field in range(1, len(TERM_FIELDS)):
+        value = tree.get(TERM_FIELDS[field])
+        for term in value if isinstance(value, list) else [value]:
+            if isinstance(term, str) and term:
+                yield field, term
+
+
+@dataclass
+class IndexedBlock:
+    block_type: str
+    block_id: str
+    line_start: int
+    start: int
+    body_start: int
+    body_end: int
+    end: int
+    values: Dict[str, str]
+
+    def to_block(self, source: Any) -> Block:
+        """A ``Block`` over the source's bytes, without parsing; its tree is parsed on demand."""
+        return Block.from_buffer(
+            self.block_type, self.block_id, self.values, self.line_start, source, self.body_start, self.body_end
+        )
+
+
+class CompiledIndex:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self._buffer: Any = map_file(f) or f.read()
+        try:
+            (
+                magic,
+                version,
+                self.source_size,
+                self.source_mtime_ns,
+                self.source_digest,
+                self.block_count,
+                field_count,
+                self.id_count,
+                string_count,
+                self.term_count,
+                posting_count,
+                self.error_count,
+                self._strings,
+                self._blocks,
+                self._fields,
+                self._ids,
+                self._terms,
+                self._postings,
+                self._errors,
+            ) = HEADER.unpack_from(self._buffer)
+        except struct.error:
+            self.close()
+            raise SidecarError(f"{path}: truncated header") from None
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise SidecarError(f"{path}: not a version {FORMAT_VERSION} Hopscotch index")
+        self._blob = self._strings + OFFSET.size * (string_count + 1)
+        size = len(self._buffer)
+        tables = [
+            (self._strings, string_count + 1, OFFSET.size),
+            (self._blocks, self.block_count, BLOCK_RECORD.size),
+            (self._fields, field_count, FIELD_RECORD.size),
+            (self._ids, self.id_count, ID_RECORD.size),
+            (self._terms, self.term_count, TERM_RECORD.size),
+            (self._postings, posting_count, POSTING.size),
+            (self._errors, self.error_count, OFFSET.size),
+        ]
+        truncated = any(start + count * width > size for start, count, width in tables)
+        if not truncated:
+            truncated = self._blob + OFFSET.unpack_from(self._buffer, self._blob - OFFSET.size)[0] > size
+        if truncated:
+            self.close()
+            raise SidecarError(f"{path}: truncated tables")
+
+    def __enter__(self) -> "CompiledIndex":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+    def __len__(self) -> int:
+        return self.block_count
+
+    def __iter__(self) -> Iterator[IndexedBlock]:
+        for number in range(self.block_count):
+            yield self.block(number)
+
+    def _raw_string(self, number: int) -> bytes:
+        start, end = OFFSET_PAIR.unpack_from(self._buffer, self._strings + OFFSET.size * number)
+        return self._buffer[self._blob + start : self._blob + end]
+
+    def string(self, number: int) -> str:
+        return self._raw_string(number).decode("utf-8")
+
+    def block(self, number: int) -> IndexedBlock:
+        """The ``number``-th block in file order."""
+        if not 0 <= number < self.block_count:
+            raise IndexError(number)
+        type_at, id_at, line, start, body_start, body_end, end, first, count = BLOCK_RECORD.unpack_from(
+            self._buffer, self._blocks + BLOCK_RECORD.size * number
+        )
+        values: Dict[str, str] = {}
+        at = self._fields + FIELD_RECORD.size * first
+        for _ in range(count):
+            name, value = FIELD_RECORD.unpack_from(self._buffer, at)
+            values[sys.intern(self.string(name))] = self.string(value)
+            at += FIELD_RECORD.size
+        return IndexedBlock(
+            sys.intern(self.string(type_at)), self.string(id_at), line, start, body_start, body_end, end, values
+        )
+
+    def identity(self, number: int) -> Tuple[str, str]:
+        """The type and id of the ``number``-th block, without decoding its fields."""
+        type_at, id_at = BLOCK_RECORD.unpack_from(self._buffer, self._blocks + BLOCK_RECORD.size * number)[:2]
+        return self.string(type_at), self.string(id_at)
+
+    def _id_at(self, position: int) -> Tuple[bytes, int]:
+        name, number = ID_RECORD.unpack_from(self._buffer, self._ids + ID_RECORD.size * position)
+        return self._raw_string(name), number
+
+    def _id_bound(self, key: bytes, prefix: bool = False) -> int:
+        """First id-table position whose id is not below ``key`` (or, with ``prefix``, past every id starting with it)."""
+        low, high = 0, self.id_count
+        while low < high:
+            middle = (low + high) // 2
+            name = self._id_at(middle)[0]
+            if (name[: len(key)] <= key) if prefix else (name < key):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def lookup(self, block_id: str) -> Optional[IndexedBlock]:
+        """The first block declaring ``block_id``, found by binary search, or None."""
+        key = block_id.encode("utf-8")
+        position = self._id_bound(key)
+        if position == self.id_count:
+            return None
+        name, number = self._id_at(position)
+        return self.block(number) if name == key else None
+
+    def ids_with_prefix(self, prefix: str) -> Iterator[Tuple[str, int]]:
+        """``(id, block number)`` for every declaration whose id starts with ``prefix``, in id order."""
+        key = prefix.encode("utf-8")
+        for position in range(self._id_bound(key), self._id_bound(key, prefix=True)):
+            name, number = self._id_at(position)
+            yield name.decode("utf-8"), number
+
+    def postings(self, field: str, term: str) -> Tuple[int, ...]:
+        """Ascending numbers of the blocks whose ``field`` holds ``term``."""
+        code = TERM_FIELDS.index(field)
+        key = term.encode("utf-8")
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            record = TERM_RECORD.unpack_from(self._buffer, self._terms + TERM_RECORD.size * middle)
+            if (record[0], self._raw_string(record[1])) < (code, key):
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.term_count:
+            return ()
+        found, name, first, count = TERM_RECORD.unpack_from(self._buffer, self._terms + TERM_RECORD.size * low)
+        if found != code or self._raw_string(name) != key:
+            return ()
+        return struct.unpack_from(f"<{count}I", self._buffer, self._postings + POSTING.size * first)
+
+    def parse_errors(self) -> List[str]:
+        """The parse errors recorded when the source was compiled."""
+        return [
+            self.string(OFFSET.unpack_from(self._buffer, self._errors + OFFSET.size * number)[0])
+            for number in range(self.error_count)
+        ]
+
+    def matches(self, source: Any) -> bool:
+        """Whether this index was compiled from ``source``, the file's bytes."""
+        return self.source_size == len(source) and self.source_digest == source_digest(source)
+
+    def stamped(self, stat: os.stat_result) -> bool:
+        """Whether the source still has the size and modification time it had when compiled."""
+        return self.source_size == stat.st_size and self.source_mtime_ns == stat.st_mtime_ns
+
+    def restamped(self, mtime_ns: int) -> bytes:
+        """This sidecar's bytes with the source mtime replaced by ``mtime_ns``."""
+        data = bytearray(self._buffer)
+        MTIME.pack_into(data, MTIME_AT, mtime_ns)
+        return bytes(data)
+
+
+def write_sidecar(path: str, data: bytes) -> None:
+    partial_path = f"{path}.{os.getpid()}.tmp"
+    with open(partial_path, "wb") as f:
+        f.write(data)
+    # Readers never see a half-written index.
+    os.replace(partial_path, path)
+
+
+def _refresh(path: str, force: bool = False) -> Tuple[CompiledIndex, bool, List[str]]:
+    """Open the index for ``path``, first rewriting the sidecar if it is stale (or ``force``)."""
+    sidecar = sidecar_path(path)
+    index: Optional[CompiledIndex] = None
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        if not force:
+            try:
+                index = CompiledIndex(sidecar)
+            except (OSError, SidecarError):
+                pass
+            else:
+                if index.stamped(stat):
+                    return index, False, index.parse_errors()
+        source = map_file(f) or f.read()
+    try:
+        if index is not None:
+            if index.matches(source):
+                # Touched but unchanged: record the new mtime so the next load skips the hash.
+                data, kept = index.restamped(stat.st_mtime_ns), index.parse_errors()
+                index.close()
+                write_sidecar(sidecar, data)
+                return CompiledIndex(sidecar), False, kept
+            index.close()
+        errors: List[str] = []
+        write_sidecar(sidecar, build_index(source, errors, stat.st_mtime_ns))
+    finally:
+        if isinstance(source, mmap.mmap):
+            source.close()
+    return CompiledIndex(sidecar), True, errors
+
+
+def compile_file(path: str, force: bool = False) -> Tuple[bool, int, List[str]]:
+    """Write the sidecar for ``path`` unless it is current.
+
+    Returns whether it was rewritten, the number of blocks indexed and any
+    parse errors, which are kept in the sidecar and reported again while it
+    stays current; an unparseable block is left out of the index.
+    """
+    index, rewritten, errors = _refresh(path, force)
+    with index:
+        return rewritten, len(index), errors
+
+
+def load_index(path: str) -> CompiledIndex:
+    """Open the index for the source file ``path``, recompiling it first if stale."""
+    return _refresh(path)[0]
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="validate_hopscotch.py compile",
+        description="Write a binary sidecar index (PATH.idx) next to each Hopscotch file.",
+    )
+    parser.add_argument(
+        "paths", nargs="+", metavar="path", help="Path to a .hopscotch file, a directory, or a glob"
+    )
+    parser.add_argument("--force", action="store_true", help="Rewrite sidecars even when they are current")
+    args = parser.parse_args(argv)
+
+    exit_code = 0
+    for path in expand_paths(args.paths):
+        try:
+            rewritten, blocks, errors = compile_file(path, args.force)
+        except UnicodeDecodeError as exc:
+            print(f"ERROR: Could not read {path}: {exc}", file=sys.stderr)
+            exit_code = 2
+            continue
+        except OSError as exc:
+            print(f"ERROR: Could not compile {path}: {exc}", file=sys.stderr)
+            exit_code = 2
+            continue
+        if rewritten:
+            print(f"{path}: indexed {blocks} blocks into {sidecar_path(path)}")
+        else:
+            print(f"{path}: {sidecar_path(path)} is up to date")
+        for error in errors:
+            print(f"- {path}: {error}", file=sys.stderr)
+        if errors:
+            exit_code = max(exit_code, 1)
+    return exit_code
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
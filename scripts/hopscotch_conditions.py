@@ -0,0 +1,275 @@
+"""Compile scene conditions (SPEC §6.5, §6.6) and evaluate them in batches.
+
+Every flag a condition can test is given a bit position in a ``FlagTable``:
+expression identifiers such as ``party.is_polite``, secret ids from
+``hasSecret`` and each distinct ``clockAtLeast`` threshold. A party state is
+then one integer with a bit set for every flag that holds.
+
+Each condition is reduced once to disjunctive normal form, a list of
+``(required, forbidden)`` bit masks, and a ``ConditionSet`` turns all of its
+conditions into two generated Python functions: one testing a single state
+with a few mask comparisons per condition, and one evaluating every condition
+against many states at once. For the batch the states are transposed into
+one integer column per flag (bit ``j`` set when state ``j`` has the flag), so
+a condition costs the same handful of big-integer ``&``/``|`` operations
+whether there are ten tables or ten thousand.
+
+Scene gating (``enterIf`` and ``skipIf``) and each conditional talking point
+(``dialogue[i].conditions[j].if``) are separate conditions; a talking point's
+result does not include its scene's gating.
+"""
+import re
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from validate_hopscotch import Block, block_tree
+
+# (required bits, forbidden bits); a condition holds if any of its clauses does.
+Clause = Tuple[int, int]
+# (block id, path of the condition within the block)
+ConditionKey = Tuple[str, str]
+
+IDENTIFIER_RE = re.compile(r"[A-Za-z_][\w-]*(?:\.[\w-]+)*\Z")
+
+
+class ConditionError(Exception):
+    """Raised when a condition expression or simple condition is malformed."""
+
+
+class FlagTable:
+    """Bit positions for flags, assigned in order of first use."""
+
+    def __init__(self) -> None:
+        self.bits: Dict[str, int] = {}
+        # (clock id, track) -> [(days, bit)]
+        self.thresholds: Dict[Tuple[str, str], List[Tuple[float, int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.bits)
+
+    def bit(self, name: str) -> int:
+        if name not in self.bits:
+            self.bits[name] = len(self.bits)
+        return self.bits[name]
+
+    def clock_bit(self, clock_id: str, track: str, days: float) -> int:
+        name = f"{clock_id}[{track}]>={days:g}"
+        if name not in self.bits:
+            self.thresholds.setdefault((clock_id, track), []).append((days, self.bit(name)))
+        return self.bits[name]
+
+    def pack(self, flags: Iterable[str], clocks: Optional[Mapping[Tuple[str, str], float]] = None) -> int:
+        """The state with ``flags`` set and each ``(clock id, track)`` at the given days.
+
+        Flags no condition tests are ignored, since they cannot change a result.
+        """
+        state = 0
+        for name in flags:
+            bit = self.bits.get(name)
+            if bit is not None:
+                state |= 1 << bit
+        for key, value in (clocks or {}).items():
+            for days, bit in self.thresholds.get(key, ()):
+                if value >= days:
+                    state |= 1 << bit
+        return state
+
+
+def _literal(required: int, forbidden: int, negated: bool) -> Clause:
+    return (forbidden, required) if negated else (required, forbidden)
+
+
+def compile_expression(text: str, flags: FlagTable) -> List[Clause]:
+    """Clauses for an ``if:`` expression: ``!`` binds tightest, then ``&&``, then ``||``."""
+    if not isinstance(text, str) or not text.strip():
+        raise ConditionError("Condition expression must be a non-empty string.")
+    clauses: List[Clause] = []
+    for alternative in text.split("||"):
+        required = forbidden = 0
+        for operand in alternative.split("&&"):
+            name = operand.strip()
+            negated = False
+            while name.startswith("!"):
+                name = name[1:].strip()
+                negated = not negated
+            if not IDENTIFIER_RE.match(name):
+                raise ConditionError(f"Invalid condition operand '{operand.strip()}' in '{text}'.")
+            mask = 1 << flags.bit(name)
+            if negated:
+                forbidden |= mask
+            else:
+                required |= mask
+        # ``a && !a`` can never hold.
+        if not required & forbidden:
+            clauses.append((required, forbidden))
+    return clauses
+
+
+def compile_simple_condition(condition: Any, flags: FlagTable) -> Clause:
+    """The single clause for a ``hasSecret``, ``not`` or ``clockAtLeast`` condition."""
+    if not isinstance(condition, dict) or len(condition) != 1:
+        raise ConditionError("Simple condition must be a mapping with exactly one of hasSecret, not, clockAtLeast.")
+    (kind, value), = condition.items()
+    if kind == "hasSecret":
+        if not isinstance(value, str) or not value:
+            raise ConditionError("hasSecret must name a secret id.")
+        return (1 << flags.bit(value), 0)
+    if kind == "not":
+        return _literal(*compile_simple_condition(value, flags), negated=True)
+    if kind == "clockAtLeast":
+        if not isinstance(value, dict):
+            raise ConditionError("clockAtLeast must be a mapping with id, track and days.")
+        clock_id, track, days = value.get("id"), value.get("track"), value.get("days")
+        if not isinstance(clock_id, str) or not isinstance(track, str):
+            raise ConditionError("clockAtLeast must define id and track strings.")
+        if not isinstance(days, (int, float)) or isinstance(days, bool):
+            raise ConditionError("clockAtLeast days must be a number.")
+        return (1 << flags.clock_bit(clock_id, track, days), 0)
+    raise ConditionError(f"Unknown simple condition '{kind}'.")
+
+
+def compile_gating(conditions: Any, flags: FlagTable) -> List[Clause]:
+    """Clauses for a scene's ``conditions``: every ``enterIf`` holds and no ``skipIf`` does."""
+    if conditions is None:
+        return [(0, 0)]
+    if not isinstance(conditions, dict):
+        raise ConditionError("Scene conditions must be a mapping with enterIf and/or skipIf.")
+    required = forbidden = 0
+    for name, negated in (("enterIf", False), ("skipIf", True)):
+        items = conditions.get(name, [])
+        if not isinstance(items, list):
+            raise ConditionError(f"{name} must be a list of simple conditions.")
+        for item in items:
+            more_required, more_forbidden = _literal(*compile_simple_condition(item, flags), negated=negated)
+            required |= more_required
+            forbidden |= more_forbidden
+    return [] if required & forbidden else [(required, forbidden)]
+
+
+def _state_test(clauses: List[Clause]) -> str:
+    tests = []
+    for required, forbidden in clauses:
+        parts = []
+        if required:
+            parts.append(f"s & {required} == {required}")
+        if forbidden:
+            parts.append(f"not s & {forbidden}")
+        tests.append(" and ".join(parts) or "True")
+    if not tests:
+        return "False"
+    return tests[0] if len(tests) == 1 else "(" + " or ".join(f"({test})" for test in tests) + ")"
+
+
+def _bits(mask: int) -> List[int]:
+    return [position for position in range(mask.bit_length()) if mask >> position & 1]
+
+
+def _batch_test(clauses: List[Clause]) -> str:
+    terms = []
+    for required, forbidden in clauses:
+        parts = [f"c[{bit}]" for bit in _bits(required)] + [f"(a ^ c[{bit}])" for bit in _bits(forbidden)]
+        terms.append(" & ".join(parts) or "a")
+    if not terms:
+        return "0"
+    return terms[0] if len(terms) == 1 else "(" + " | ".join(f"({term})" for term in terms) + ")"
+
+
+class ConditionSet:
+    """Compiled conditions sharing one ``FlagTable``, evaluated together."""
+
+    def __init__(self, flags: Optional[FlagTable] = None) -> None:
+        self.flags = flags if flags is not None else FlagTable()
+        self.keys: List[ConditionKey] = []
+        self.clauses: List[List[Clause]] = []
+        self._evaluate: Optional[Callable[[int], Tuple[bool, ...]]] = None
+        self._evaluate_columns: Optional[Callable[[List[int], int], Tuple[int, ...]]] = None
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: ConditionKey, clauses: List[Clause]) -> None:
+        self.keys.append(key)
+        self.clauses.append(clauses)
+        self._evaluate = self._evaluate_columns = None
+
+    def source(self) -> str:
+        """The generated module defining ``evaluate(s)`` and ``evaluate_columns(c, a)``."""
+        state_tests = "".join(f"        {_state_test(clauses)},\n" for clauses in self.clauses)
+        batch_tests = "".join(f"        {_batch_test(clauses)},\n" for clauses in self.clauses)
+        return (
+            f"def evaluate(s):\n    return (\n{state_tests}    )\n\n\n"
+            f"def evaluate_columns(c, a):\n    return (\n{batch_tests}    )\n"
+        )
+
+    def _compile(self) -> None:
+        namespace: Dict[str, Any] = {}
+        exec(compile(self.source(), "<conditions>", "exec"), namespace)
+        self._evaluate = namespace["evaluate"]
+        self._evaluate_columns = namespace["evaluate_columns"]
+
+    def evaluate(self, state: int) -> Tuple[bool, ...]:
+        """Whether each condition holds in ``state``, in ``keys`` order."""
+        if self._evaluate is None:
+            self._compile()
+        return self._evaluate(state)
+
+    def live(self, state: int) -> List[ConditionKey]:
+        return [key for key, holds in zip(self.keys, self.evaluate(state)) if holds]
+
+    def evaluate_batch(self, states: Sequence[int]) -> Tuple[int, ...]:
+        """For each condition, a bitset with bit ``j`` set when it holds in ``states[j]``."""
+        if self._evaluate_columns is None:
+            self._compile()
+        columns = [0] * len(self.flags)
+        for index, state in enumerate(states):
+            row = 1 << index
+            while state:
+                low = state & -state
+                columns[low.bit_length() - 1] |= row
+                state ^= low
+        return self._evaluate_columns(columns, (1 << len(states)) - 1)
+
+    def live_batch(self, states: Sequence[int]) -> List[List[ConditionKey]]:
+        """The live conditions of every state, one list per state in ``keys`` order."""
+        live: List[List[ConditionKey]] = [[] for _ in states]
+        for key, holds in zip(self.keys, self.evaluate_batch(states)):
+            while holds:
+                low = holds & -holds
+                live[low.bit_length() - 1].append(key)
+                holds ^= low
+        return live
+
+
+def compile_scene_conditions(
+    blocks: Iterable[Block], errors: Optional[List[str]] = None, flags: Optional[FlagTable] = None
+) -> ConditionSet:
+    """Every scene's gating and conditional talking points as one ``ConditionSet``.
+
+    Each scene contributes ``(scene id, "conditions")``, which holds for
+    scenes without conditions, and ``(scene id, "dialogue[i].conditions[j]")``
+    per talking point. Malformed conditions are reported to ``errors`` when
+    it is given and left out.
+    """
+    conditions = ConditionSet(flags)
+    for block in blocks:
+        if block.block_type != "scene":
+            continue
+        tree = block_tree(block)
+        # (path, compile function, condition)
+        pending: List[Tuple[str, Callable[[Any, FlagTable], List[Clause]], Any]] = [
+            ("conditions", compile_gating, tree.get("conditions"))
+        ]
+        dialogue = tree.get("dialogue")
+        for i, item in enumerate(dialogue if isinstance(dialogue, list) else []):
+            if not isinstance(item, dict) or item.get("type") != "conditional":
+                continue
+            points = item.get("conditions")
+            for j, point in enumerate(points if isinstance(points, list) else []):
+                if isinstance(point, dict) and "if" in point:
+                    pending.append((f"dialogue[{i}].conditions[{j}]", compile_expression, point["if"]))
+        for path, compile_condition, condition in pending:
+            try:
+                conditions.add((block.block_id, path), compile_condition(condition, conditions.flags))
+            except ConditionError as exc:
+                if errors is not None:
+                    errors.append(f"Line {block.line_start}: {block.block_id} {path}: {exc}")
+    return conditions
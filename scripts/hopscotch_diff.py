@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""Compare two versions of an adventure block by block, matching blocks by id.
+
+Each file is scanned with ``scan_spans``, which decodes nothing but fence
+lines, and every block body is hashed straight from the mapped bytes. Blocks
+whose type and hash agree are unchanged and are never parsed, so the cost of
+diffing two large files is close to the cost of hashing them. Only blocks
+whose hashes differ are parsed, and their top-level fields are compared to
+report field-level changes; a block whose bytes changed but whose parsed
+fields did not (re-indentation, comments, line endings) counts as unchanged.
+
+A block is *moved* when its position relative to the other blocks present in
+both versions changed. The largest set of blocks that kept their relative
+order (a longest increasing subsequence) stays put, so inserting or removing
+one block does not make everything after it look moved. Blocks without an id
+cannot be matched and are skipped; for duplicate ids the first block counts,
+as in validation.
+"""
+import argparse
+import hashlib
+import json
+import sys
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from validate_hopscotch import BlockSpan, block_tree, decode_span, map_file, scan_spans
+
+CHANGE_KINDS = ["added", "removed", "moved", "changed"]
+# Longest field value shown in text output before it is elided.
+PREVIEW_LENGTH = 60
+
+
+@dataclass
+class BlockDigest:
+    span: BlockSpan
+    digest: bytes
+    position: int
+
+
+@dataclass
+class FieldChange:
+    name: str
+    # "added", "removed" or "changed"; ``old``/``new`` are unset for a side the field is absent from.
+    kind: str
+    old: Any = None
+    new: Any = None
+
+
+@dataclass
+class BlockChange:
+    kinds: List[str]
+    block_id: str
+    block_type: str
+    old_line: Optional[int] = None
+    new_line: Optional[int] = None
+    fields: List[FieldChange] = field(default_factory=list)
+
+
+def digest_blocks(buffer: Any) -> Dict[str, BlockDigest]:
+    """Hash each block's type and body, keyed by id in file order, without parsing."""
+    digests: Dict[str, BlockDigest] = {}
+    for span in scan_spans(buffer):
+        if span.block_id and span.block_id not in digests:
+            digest = hashlib.blake2b(span.block_type.encode("utf-8"), digest_size=16)
+            digest.update(buffer[span.body_start : span.body_end])
+            digests[span.block_id] = BlockDigest(span, digest.digest(), len(digests))
+    return digests
+
+
+def stable_positions(positions: List[int]) -> Set[int]:
+    """Indexes into ``positions`` of a longest increasing subsequence."""
+    tails: List[int] = []
+    tail_indexes: List[int] = []
+    previous = [-1] * len(positions)
+    for index, position in enumerate(positions):
+        slot = bisect_left(tails, position)
+        if slot:
+            previous[index] = tail_indexes[slot - 1]
+        if slot == len(tails):
+            tails.append(position)
+            tail_indexes.append(index)
+        else:
+            tails[slot] = position
+            tail_indexes[slot] = index
+    stable: Set[int] = set()
+    index = tail_indexes[-1] if tail_indexes else -1
+    while index >= 0:
+        stable.add(index)
+        index = previous[index]
+    return stable
+
+
+def field_changes(old_tree: Dict[str, Any], new_tree: Dict[str, Any]) -> List[FieldChange]:
+    changes: List[FieldChange] = []
+    for name, value in old_tree.items():
+        if name not in new_tree:
+            changes.append(FieldChange(name, "removed", old=value))
+        elif new_tree[name] != value:
+            changes.append(FieldChange(name, "changed", value, new_tree[name]))
+    changes.extend(FieldChange(name, "added", new=value) for name, value in new_tree.items() if name not in old_tree)
+    return changes
+
+
+def diff_buffers(old: Any, new: Any) -> Tuple[List[BlockChange], int]:
+    """Changes from ``old`` to ``new`` in new-file order, then removals; and the unchanged count."""
+    old_blocks = digest_blocks(old)
+    new_blocks = digest_blocks(new)
+    common = [block_id for block_id in old_blocks if block_id in new_blocks]
+    stable = stable_positions([new_blocks[block_id].position for block_id in common])
+    moved = {block_id for index, block_id in enumerate(common) if index not in stable}
+
+    changes: List[BlockChange] = []
+    unchanged = 0
+    for block_id, after in new_blocks.items():
+        before = old_blocks.get(block_id)
+        if before is None:
+            changes.append(BlockChange(["added"], block_id, after.span.block_type, new_line=after.span.line_start))
+            continue
+        change = BlockChange([], block_id, after.span.block_type, before.span.line_start, after.span.line_start)
+        if block_id in moved:
+            change.kinds.append("moved")
+        if before.digest != after.digest:
+            if before.span.block_type != after.span.block_type:
+                change.fields.append(FieldChange("type", "changed", before.span.block_type, after.span.block_type))
+            old_tree = block_tree(decode_span(old, before.span))
+            new_tree = block_tree(decode_span(new, after.span))
+            change.fields.extend(field_changes(old_tree, new_tree))
+            if change.fields:
+                change.kinds.append("changed")
+        if change.kinds:
+            changes.append(change)
+        else:
+            unchanged += 1
+    for block_id, before in old_blocks.items():
+        if block_id not in new_blocks:
+            changes.append(BlockChange(["removed"], block_id, before.span.block_type, old_line=before.span.line_start))
+    return changes, unchanged
+
+
+def diff_files(old_path: str, new_path: str) -> Tuple[List[BlockChange], int]:
+    with open(old_path, "rb") as old_file, open(new_path, "rb") as new_file:
+        # Empty files cannot be mapped; fall back to reading them.
+        old = map_file(old_file) or old_file.read()
+        new = map_file(new_file) or new_file.read()
+        try:
+            return diff_buffers(old, new)
+        finally:
+            for buffer in (old, new):
+                if hasattr(buffer, "close"):
+                    buffer.close()
+
+
+def _preview(value: Any) -> str:
+    text = json.dumps(value, ensure_ascii=False)
+    return text if len(text) <= PREVIEW_LENGTH else text[: PREVIEW_LENGTH - 3] + "..."
+
+
+def format_change(change: BlockChange) -> List[str]:
+    lines = [f"{', '.join(change.kinds)}: {change.block_type} {change.block_id}"]
+    if change.old_line is not None and change.new_line is not None:
+        lines[0] += f" (line {change.old_line} -> {change.new_line})"
+    else:
+        lines[0] += f" (line {change.new_line if change.old_line is None else change.old_line})"
+    for item in change.fields:
+        if item.kind == "added":
+            lines.append(f"  + {item.name}: {_preview(item.new)}")
+        elif item.kind == "removed":
+            lines.append(f"  - {item.name}: {_preview(item.old)}")
+        else:
+            lines.append(f"  ~ {item.name}: {_preview(item.old)} -> {_preview(item.new)}")
+    return lines
+
+
+def field_document(item: FieldChange) -> Dict[str, Any]:
+    document: Dict[str, Any] = {"name": item.name, "change": item.kind}
+    if item.kind != "added":
+        document["old"] = item.old
+    if item.kind != "removed":
+        document["new"] = item.new
+    return document
+
+
+def change_document(change: BlockChange) -> Dict[str, Any]:
+    return {
+        "changes": change.kinds,
+        "id": change.block_id,
+        "type": change.block_type,
+        "oldLine": change.old_line,
+        "newLine": change.new_line,
+        "fields": [field_document(item) for item in change.fields],
+    }
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="validate_hopscotch.py diff",
+        description="Report blocks added, removed, moved or changed between two versions, matched by id.",
+        epilog="Exit status is 0 if the versions match, 1 if they differ and 2 on errors.",
+    )
+    parser.add_argument("old", help="Path to the original .hopscotch file")
+    parser.add_argument("new", help="Path to the revised .hopscotch file")
+    parser.add_argument("--json", action="store_true", help="Write one JSON object per changed block")
+    args = parser.parse_args(argv)
+
+    try:
+        changes, unchanged = diff_files(args.old, args.new)
+    except OSError as exc:
+        print(f"ERROR: Could not read {exc.filename or args.old}: {exc}", file=sys.stderr)
+        return 2
+    except UnicodeDecodeError as exc:
+        # Only the bodies of changed blocks are decoded, so either file may hold the bad bytes.
+        print(f"ERROR: Could not read {args.old} or {args.new}: {exc}", file=sys.stderr)
+        return 2
+
+    if args.json:
+        for change in changes:
+            print(json.dumps(change_document(change), ensure_ascii=False))
+    else:
+        for change in changes:
+            print("\n".join(format_change(change)))
+        totals = {kind: sum(kind in change.kinds for change in changes) for kind in CHANGE_KINDS}
+        print(", ".join(f"{count} {kind}" for kind, count in totals.items()) + f", {unchanged} unchanged")
+    return 1 if changes else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
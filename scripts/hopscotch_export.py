@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Write the SPEC §22 JSON projection of a Hopscotch file.
+
+Each block is projected as its parsed body. The projection is streamed:
+nodes are written as they are parsed while entities and edges are spooled to
+temporary files, so memory stays bounded by the largest block. Output is
+byte-stable for a given input: members are emitted in document order and
+nothing run-dependent is included.
+"""
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+from itertools import chain
+from typing import Any, Dict, IO, Iterable, Iterator, List, Set, Tuple
+
+from validate_hopscotch import (
+    NODE_TYPES,
+    Block,
+    block_tree,
+    iter_blocks,
+    iter_refs,
+    parse_body,
+    read_frontmatter,
+)
+
+
+def dumps(value: object) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def project_metadata(head: List[str]) -> Dict[str, Any]:
+    if len(head) < 2 or not head[0].startswith("---") or not head[-1].startswith("---"):
+        return {}
+    return parse_body(head[1:-1])[2]
+
+
+def project_block(block: Block) -> Dict[str, object]:
+    return {
+        "id": block.block_id,
+        "type": block.block_type,
+        "line": block.line_start,
+        "fields": block_tree(block),
+    }
+
+
+def block_edges(block: Block) -> Iterator[Dict[str, str]]:
+    """Yield one edge per reference; link blocks are typed by their linkType."""
+    kind = ""
+    if block.block_type == "link":
+        kind = block.values.get("linkType", "") or "link"
+    for field, target in iter_refs(block_tree(block)):
+        yield {"from": block.block_id, "to": target, "field": field, "type": kind or field}
+
+
+def iter_projection(lines: Iterable[str], errors: List[str]) -> Tuple[Dict[str, Any], Iterator[Block]]:
+    line_iter = iter(lines)
+    head, _ = read_frontmatter(line_iter)
+
+    def blocks() -> Iterator[Block]:
+        seen_ids: Set[str] = set()
+        for block in iter_blocks(chain(head, line_iter), errors):
+            if not block.block_id:
+                errors.append(f"Line {block.line_start}: Block missing id; not exported.")
+                continue
+            if block.block_id in seen_ids:
+                errors.append(
+                    f"Line {block.line_start}: Duplicate id '{block.block_id}'; not exported."
+                )
+                continue
+            seen_ids.add(block.block_id)
+            yield block
+
+    return project_metadata(head), blocks()
+
+
+def export_json(lines: Iterable[str], out: IO[str]) -> List[str]:
+    """Write the keyed projection to ``out``; return parse/export errors."""
+    errors: List[str] = []
+    metadata, blocks = iter_projection(lines, errors)
+    out.write('{"metadata":' + dumps(metadata) + ',\n"nodes":{')
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as entities, tempfile.TemporaryFile(
+        "w+", encoding="utf-8"
+    ) as edges:
+        node_sep = entity_sep = edge_sep = "\n"
+        for block in blocks:
+            member = dumps(block.block_id) + ":" + dumps(project_block(block))
+            if block.block_type in NODE_TYPES:
+                out.write(node_sep + member)
+                node_sep = ",\n"
+            else:
+                entities.write(entity_sep + member)
+                entity_sep = ",\n"
+            for edge in block_edges(block):
+                edges.write(edge_sep + dumps(edge))
+                edge_sep = ",\n"
+        out.write('\n},\n"entities":{')
+        entities.seek(0)
+        shutil.copyfileobj(entities, out)
+        out.write('\n},\n"edges":[')
+        edges.seek(0)
+        shutil.copyfileobj(edges, out)
+    out.write("\n]}\n")
+    return errors
+
+
+def export_ndjson(lines: Iterable[str], out: IO[str]) -> List[str]:
+    """Write a metadata record, then one record per block with its edges."""
+    errors: List[str] = []
+    metadata, blocks = iter_projection(lines, errors)
+    out.write(dumps({"metadata": metadata}) + "\n")
+    for block in blocks:
+        record = project_block(block)
+        record["edges"] = list(block_edges(block))
+        out.write(dumps(record) + "\n")
+    return errors
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="validate_hopscotch.py export",
+        description="Write the SPEC §22 JSON projection of a Hopscotch file.",
+    )
+    parser.add_argument("path", help="Path to .hopscotch file")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    parser.add_argument(
+        "--ndjson", action="store_true", help="Write one JSON record per line instead of one document"
+    )
+    args = parser.parse_args(argv)
+
+    export = export_ndjson if args.ndjson else export_json
+    try:
+        with open(args.path, "r", encoding="utf-8") as f:
+            if args.output:
+                with open(args.output, "w", encoding="utf-8", newline="\n") as out:
+                    errors = export(f, out)
+            else:
+                sys.stdout.reconfigure(encoding="utf-8", newline="\n")
+                errors = export(f, sys.stdout)
+    except UnicodeDecodeError as exc:
+        print(f"ERROR: Could not read {args.path}: {exc}", file=sys.stderr)
+        return 2
+    except OSError as exc:
+        print(f"ERROR: Could not export {args.path}: {exc}", file=sys.stderr)
+        return 2
+
+    if errors:
+        print("Export errors:", file=sys.stderr)
+        for err in errors:
+            print(f"- {err}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
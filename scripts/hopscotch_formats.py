@@ -0,0 +1,113 @@
+"""Machine-readable diagnostics for ``--format jsonl`` and ``--format sarif``.
+
+Both writers stream. Files validated in this process pass each diagnostic
+to ``write`` as the validator finds it; results from worker processes are
+written with ``write_file`` as each one arrives. Nothing is held beyond the
+current record, and SARIF is emitted as a single 2.1.0 log whose
+``results`` array is written incrementally.
+"""
+import json
+import os
+from pathlib import Path
+from typing import IO, Any, Dict, List
+from urllib.parse import quote
+
+from validate_hopscotch import DIAGNOSTIC_CODES, Diagnostic, FileResult, result_diagnostics
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+TOOL_NAME = "validate_hopscotch"
+RULE_IDS = sorted(DIAGNOSTIC_CODES)
+RULE_INDEX = {code: index for index, code in enumerate(RULE_IDS)}
+
+
+def file_diagnostics(file_result: FileResult) -> List[Diagnostic]:
+    """Diagnostics of ``file_result`` not yet written, which are none once it has been streamed."""
+    if file_result.result is None:
+        return [Diagnostic(0, "HS001", "error", f"Could not read {file_result.path}: {file_result.read_error}")]
+    if file_result.streamed:
+        return []
+    return result_diagnostics(file_result.result)
+
+
+def file_exit_code(file_result: FileResult) -> int:
+    """The exit code ``report_file`` would give this result."""
+    if file_result.result is None:
+        return 2
+    return 1 if file_result.result.errors else 0
+
+
+def path_uri(path: str) -> str:
+    if os.path.isabs(path):
+        return Path(path).as_uri()
+    return quote(path.replace(os.sep, "/"))
+
+
+class JsonLinesWriter:
+    """One JSON object per diagnostic: path, line, code, severity, message."""
+
+    def __init__(self, stream: IO[str]) -> None:
+        self.stream = stream
+
+    def write(self, path: str, message: str, severity: str = "error") -> None:
+        """Write one ``Line N: ...`` message as found by the validator."""
+        self.write_diagnostic(path, Diagnostic.from_message(message, severity))
+
+    def write_diagnostic(self, path: str, diagnostic: Diagnostic) -> None:
+        record = {
+            "path": path,
+            "line": diagnostic.line,
+            "code": diagnostic.code,
+            "severity": diagnostic.severity,
+            "message": diagnostic.message,
+        }
+        self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def write_file(self, file_result: FileResult) -> int:
+        for diagnostic in file_diagnostics(file_result):
+            self.write_diagnostic(file_result.path, diagnostic)
+        return file_exit_code(file_result)
+
+    def close(self) -> None:
+        self.stream.flush()
+
+
+class SarifWriter:
+    """A SARIF 2.1.0 log with one run; every diagnostic code is declared as a rule."""
+
+    def __init__(self, stream: IO[str]) -> None:
+        self.stream = stream
+        self.count = 0
+        rules = [{"id": code, "shortDescription": {"text": DIAGNOSTIC_CODES[code]}} for code in RULE_IDS]
+        driver = {"name": TOOL_NAME, "rules": rules}
+        tool = json.dumps({"driver": driver}, ensure_ascii=False)
+        stream.write(f'{{"version": "2.1.0", "$schema": "{SARIF_SCHEMA}", "runs": [{{"tool": {tool}, "results": [')
+
+    def result(self, path: str, diagnostic: Diagnostic) -> Dict[str, Any]:
+        location: Dict[str, Any] = {"artifactLocation": {"uri": path_uri(path)}}
+        if diagnostic.line > 0:
+            location["region"] = {"startLine": diagnostic.line}
+        result: Dict[str, Any] = {"ruleId": diagnostic.code}
+        if diagnostic.code in RULE_INDEX:
+            result["ruleIndex"] = RULE_INDEX[diagnostic.code]
+        result["level"] = diagnostic.severity
+        result["message"] = {"text": diagnostic.message}
+        result["locations"] = [{"physicalLocation": location}]
+        return result
+
+    def write(self, path: str, message: str, severity: str = "error") -> None:
+        """Write one ``Line N: ...`` message as found by the validator."""
+        self.write_diagnostic(path, Diagnostic.from_message(message, severity))
+
+    def write_diagnostic(self, path: str, diagnostic: Diagnostic) -> None:
+        separator = ",\n" if self.count else "\n"
+        self.stream.write(separator + json.dumps(self.result(path, diagnostic), ensure_ascii=False))
+        self.count += 1
+
+    def write_file(self, file_result: FileResult) -> int:
+        for diagnostic in file_diagnostics(file_result):
+            self.write_diagnostic(file_result.path, diagnostic)
+        return file_exit_code(file_result)
+
+    def close(self) -> None:
+        self.stream.write("\n]}]}\n")
+        self.stream.flush()
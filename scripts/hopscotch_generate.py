@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""Generate deterministic synthetic adventures for benchmarks and tests.
+
+Output is a function of ``(blocks, seed)`` only. Adventures are built one
+destination at a time (locations, areas, cast, scenes with dialogue, the
+links between them, encounters and the occasional clock), with every
+reference pointing at a block emitted earlier, so stopping at exactly
+``blocks`` blocks always leaves a file that validates cleanly, including
+against the JSON Schemas (``--schema``).
+"""
+import argparse
+import random
+import sys
+from typing import Iterator, List, Optional
+
+WORDS = [
+    "ash", "bleak", "briar", "cinder", "cold", "crow", "dusk", "ember", "fen", "frost",
+    "gale", "glass", "grim", "hollow", "iron", "lantern", "marrow", "mire", "moss", "pale",
+    "quill", "raven", "rime", "salt", "shard", "silver", "sleet", "stone", "thorn", "tide",
+    "umber", "vale", "warden", "whisper", "willow", "wolf", "wyrm", "yew",
+]
+SKILLS = ["Athletics", "Insight", "Investigation", "Perception", "Persuasion", "Stealth", "Survival"]
+DESTINATION_KINDS = ["settlement", "dungeon", "outpost", "wilderness", "ruin"]
+LOCATION_KINDS = ["building", "dwelling", "landmark", "camp", "district"]
+ENCOUNTER_TYPES = ["combat", "social", "exploration", "puzzle", "mixed"]
+TONES = ["somber", "tense", "hopeful", "eerie", "urgent"]
+DESTINATIONS_PER_REGION = 8
+REGIONS_PER_CONTINENT = 6
+
+
+class _Writer:
+    """Accumulates block lines and stops once the block budget is spent."""
+
+    def __init__(self, blocks: int, rng: random.Random) -> None:
+        self.remaining = blocks
+        self.rng = rng
+        self.lines: List[str] = []
+
+    def words(self, low: int, high: int) -> str:
+        return " ".join(self.rng.choice(WORDS) for _ in range(self.rng.randint(low, high)))
+
+    def name(self) -> str:
+        return self.words(2, 3).title()
+
+    def sentence(self, low: int = 6, high: int = 14) -> str:
+        return self.words(low, high).capitalize() + "."
+
+    def expression(self) -> str:
+        """A flag expression for a conditional talking point, such as ``party.ash && !party.frost``."""
+        operands = [
+            ("!" if self.rng.random() < 0.3 else "") + f"party.{self.rng.choice(WORDS)}"
+            for _ in range(self.rng.randint(1, 3))
+        ]
+        return f" {self.rng.choice(['&&', '||'])} ".join(operands)
+
+    def block(self, block_type: str, block_id: str, body: List[str]) -> bool:
+        """Queue one block; returns False when the budget is exhausted."""
+        if self.remaining <= 0:
+            return False
+        self.remaining -= 1
+        self.lines.append(f"```hopscotch:{block_type} id={block_id}\n")
+        self.lines.extend(line + "\n" for line in body)
+        self.lines.append("```\n")
+        return True
+
+    def drain(self) -> List[str]:
+        lines, self.lines = self.lines, []
+        return lines
+
+
+def _dialogue(out: _Writer, npcs: List[str]) -> List[str]:
+    body = ["dialogue:", "  - type: read_aloud", f'    text: "{out.sentence(20, 40)}"']
+    for _ in range(out.rng.randint(1, 4)):
+        kind = out.rng.choice(["dm_guidance", "likely_actions", "conditional", "mechanics"])
+        body.append(f"  - type: {kind}")
+        if kind == "likely_actions":
+            body += [f"    action: {out.sentence(3, 6)}", f"    response: {out.sentence()}"]
+        elif kind == "conditional":
+            body += [
+                "    conditions:",
+                f'      - if: "{out.expression()}"',
+                f'        says: "{out.sentence()}"',
+                f'      - if: "{out.expression()}"',
+                f'        says: "{out.sentence()}"',
+            ]
+        else:
+            body.append(f"    text: {out.sentence(10, 24)}")
+    if npcs:
+        body += ["participants:"] + [f"  - {npc}" for npc in npcs]
+    return body
+
+
+def _destination(out: _Writer, number: int, region: str, lead_in: Optional[str]) -> str:
+    """Emit one destination and its contents; returns the id of its last scene.
+
+    ``lead_in`` is the last scene of the previous destination, which gets a
+    link into this destination's first scene and a travel block between them.
+    """
+    rng = out.rng
+    tag = f"d{number}"
+    destination = f"destination.{tag}"
+    if not out.block(
+        "destination",
+        destination,
+        [f"name: {out.name()}", f"kind: {rng.choice(DESTINATION_KINDS)}", f"parent: {region}", f"summary: {out.sentence()}"],
+    ):
+        return ""
+    if number:
+        out.block(
+            "travel",
+            f"travel.{tag}",
+            [
+                f"name: {out.name()}",
+                f"from: destination.d{number - 1}",
+                f"to: {destination}",
+                f'distanceOrDuration: "{rng.randint(1, 9)} days"',
+            ],
+        )
+
+    places: List[str] = []
+    for i in range(rng.randint(1, 3)):
+        location = f"location.{tag}.l{i}"
+        out.block(
+            "location",
+            location,
+            [f"name: {out.name()}", f"kind: {rng.choice(LOCATION_KINDS)}", f"parent: {destination}", f"summary: {out.sentence()}"],
+        )
+        places.append(location)
+        for a in range(rng.randint(1, 3)):
+            area = f"area.{tag}.l{i}.a{a}"
+            out.block(
+                "area",
+                area,
+                [
+                    f"name: {out.name()}",
+                    f"parent: {location}",
+                    f"key: L{i}A{a}",
+                    f"summary: {out.sentence()}",
+                    f'readAloud: "{out.sentence(15, 30)}"',
+                ],
+            )
+            places.append(area)
+
+    npcs: List[str] = []
+    for n in range(rng.randint(1, 3)):
+        npc = f"npc.{tag}.n{n}"
+        out.block(
+            "npc",
+            npc,
+            [
+                f"name: {out.name()}",
+                f"scope: {destination}",
+                f"disposition: {rng.choice(['enemy', 'neutral', 'ally'])}",
+                f"role: {out.words(1, 2)}",
+                "hooks:",
+                f"  - {out.sentence()}",
+            ],
+        )
+        npcs.append(npc)
+    creatures: List[str] = []
+    for c in range(rng.randint(0, 2)):
+        creature = f"creature.{tag}.c{c}"
+        out.block(
+            "creature", creature, [f"name: {out.name()}", f"scope: {destination}", f"baseRef: srd:{rng.choice(WORDS)}"]
+        )
+        creatures.append(creature)
+    secrets: List[str] = []
+    for s in range(rng.randint(0, 2)):
+        secret = f"secret.{tag}.s{s}"
+        out.block(
+            "secret",
+            secret,
+            [
+                f"name: {out.name()}",
+                f"scope: {destination}",
+                f"text: {out.sentence()}",
+                "reveal:",
+                f"  - by: {out.sentence(3, 6)}",
+                f"    method: {rng.choice(SKILLS)}",
+                f"    dc: {rng.randint(8, 18)}",
+            ],
+        )
+        secrets.append(secret)
+    if rng.random() < 0.6:
+        out.block(
+            "loot",
+            f"loot.{tag}",
+            [f"name: {out.name()}", f"scope: {rng.choice(places)}", "items:"]
+            + [f'  - name: "{out.name()}"' for _ in range(rng.randint(1, 3))],
+        )
+    if rng.random() < 0.4:
+        out.block(
+            "hazard",
+            f"hazard.{tag}",
+            [f"name: {out.name()}", f"scope: {rng.choice(places)}", f"trigger: {out.sentence()}", f"effect: {out.sentence()}"],
+        )
+    checks: List[str] = []
+    for k in range(rng.randint(0, 2)):
+        check = f"check.{tag}.k{k}"
+        out.block(
+            "check",
+            check,
+            [
+                f"skill: {rng.choice(SKILLS)}",
+                f"dc: {rng.randint(8, 18)}",
+                f"scope: {destination}",
+                f"onSuccess: {out.sentence(4, 8)}",
+                f"onFail: {out.sentence(4, 8)}",
+            ],
+        )
+        checks.append(check)
+
+    scenes: List[str] = []
+    for s in range(rng.randint(2, 4)):
+        scene = f"scene.{tag}.s{s}"
+        body = [
+            f'title: "{out.name()}"',
+            f"summary: {out.sentence()}",
+            f"location: {rng.choice(places)}",
+            f"tone: {rng.choice(TONES)}",
+        ]
+        body += _dialogue(out, rng.sample(npcs, rng.randint(0, len(npcs))))
+        if secrets:
+            body += ["linkedSecrets:", f"  - {rng.choice(secrets)}"]
+        if checks:
+            body += ["linkedChecks:", f"  - {rng.choice(checks)}"]
+        body += ["outcomes:", "  possible:", f"    - id: outcome.{tag}.s{s}", f"      description: {out.sentence()}"]
+        if scenes and rng.random() < 0.1:
+            body += ["      blocks:", f"        - {scenes[0]}"]
+        out.block("scene", scene, body)
+        source = scenes[-1] if scenes else lead_in
+        if source:
+            out.block(
+                "link",
+                f"link.{tag}.s{s}",
+                [
+                    f"from: {source}",
+                    "to:",
+                    f"  - {scene}",
+                    f"linkType: {rng.choice(['narrative_linear', 'narrative_branch'])}",
+                    f'notes: "{out.sentence(3, 6)}"',
+                ],
+            )
+        scenes.append(scene)
+
+    for e in range(rng.randint(1, 3)):
+        body = [
+            f"name: {out.name()}",
+            f"scope: {rng.choice(places)}",
+            f"encounterType: {rng.choice(ENCOUNTER_TYPES)}",
+            f"trigger: {out.sentence()}",
+        ]
+        cast = creatures + npcs
+        if cast:
+            body.append("participants:")
+            for ref in rng.sample(cast, rng.randint(1, min(3, len(cast)))):
+                body += [f"  - ref: {ref}", f"    count: {rng.randint(1, 4)}"]
+        out.block("encounter", f"encounter.{tag}.e{e}", body)
+    if rng.random() < 0.3:
+        out.block(
+            "clock",
+            f"clock.{tag}",
+            [
+                f"name: {out.name()}",
+                f"scope: {destination}",
+                f"unit: {rng.choice(['days', 'hours', 'turns', 'milestones'])}",
+                "tracks:",
+                f'  - subject: "{out.name()}"',
+                f"    max: {rng.randint(3, 8)}",
+                "onExpire:",
+                f"  - ref: {scenes[-1]}",
+            ],
+        )
+    return scenes[-1]
+
+
+def generate_adventure(blocks: int, seed: int = 0) -> Iterator[str]:
+    """Yield the lines of an adventure with exactly ``blocks`` valid blocks."""
+    out = _Writer(blocks, random.Random(seed))
+    yield "---\n"
+    yield 'hopscotchVersion: "0.5.0"\n'
+    yield f'title: "Synthetic Adventure {seed}"\n'
+    yield "---\n"
+    out.block("world", "world.synthetic", [f"name: {out.name()}", f"summary: {out.sentence()}"])
+    number = 0
+    continent = region = ""
+    lead_in: Optional[str] = None
+    while out.remaining > 0:
+        if number % (DESTINATIONS_PER_REGION * REGIONS_PER_CONTINENT) == 0:
+            continent = f"continent.c{number}"
+            out.block("continent", continent, [f"name: {out.name()}", "parent: world.synthetic"])
+        if number % DESTINATIONS_PER_REGION == 0:
+            region = f"region.r{number}"
+            out.block("region", region, [f"name: {out.name()}", f"parent: {continent}", f"summary: {out.sentence()}"])
+        yield f"\n## Destination {number}\n\n"
+        lead_in = _destination(out, number, region, lead_in)
+        yield from out.drain()
+        number += 1
+    yield from out.drain()
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="validate_hopscotch.py generate",
+        description="Write a deterministic synthetic adventure for benchmarking.",
+    )
+    parser.add_argument("--blocks", type=int, default=1000, help="Number of blocks to generate (default: 1000)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("-o", "--output", metavar="PATH", help="Write to PATH instead of stdout")
+    args = parser.parse_args(argv)
+
+    if args.output is None:
+        sys.stdout.writelines(generate_adventure(args.blocks, args.seed))
+        return 0
+    try:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.writelines(generate_adventure(args.blocks, args.seed))
+    except OSError as exc:
+        print(f"ERROR: Could not write {args.output}: {exc}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""Analyse the narrative graph formed by scene outcomes and link blocks.
+
+Nodes are numbered densely in order of first appearance and adjacency is
+stored in CSR form (an ``offsets`` array indexing into ``targets``), so
+reachability, strongly connected components and orphan detection are all
+linear in the number of nodes plus edges.
+"""
+import argparse
+import json
+import sys
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set
+
+from validate_hopscotch import Block, block_tree, iter_blocks
+
+# Edge kinds; "blocks" edges close off content and are not followed for reachability.
+EDGE_KINDS = ["unlocks", "blocks", "narrative_linear", "narrative_branch", "mechanical", "link"]
+BLOCKS_KIND = EDGE_KINDS.index("blocks")
+
+
+class GraphError(Exception):
+    """Raised when an entry id is not a node of the graph."""
+
+
+@dataclass
+class NarrativeGraph:
+    ids: List[str]
+    types: List[str]
+    offsets: array
+    targets: array
+    kinds: array
+
+    def successors(self, node: int, follow_blocks: bool = False) -> Iterable[int]:
+        for edge in range(self.offsets[node], self.offsets[node + 1]):
+            if follow_blocks or self.kinds[edge] != BLOCKS_KIND:
+                yield self.targets[edge]
+
+
+def _as_list(value: object) -> List[object]:
+    if isinstance(value, list):
+        return value
+    return [] if value is None else [value]
+
+
+def build_graph(blocks: Iterable[Block]) -> NarrativeGraph:
+    index: Dict[str, int] = {}
+    ids: List[str] = []
+    id_types: Dict[str, str] = {}
+    sources = array("i")
+    dests = array("i")
+    kinds = array("B")
+
+    def node(block_id: str) -> int:
+        number = index.get(block_id)
+        if number is None:
+            number = index[block_id] = len(ids)
+            ids.append(block_id)
+        return number
+
+    def add_edges(source: str, targets: object, kind: str) -> None:
+        for target in _as_list(targets):
+            if isinstance(target, dict):
+                target = target.get("ref")
+            if isinstance(target, str) and target:
+                sources.append(node(source))
+                dests.append(node(target))
+                kinds.append(EDGE_KINDS.index(kind))
+
+    for block in blocks:
+        if block.block_id:
+            id_types.setdefault(block.block_id, block.block_type)
+        if block.block_type == "scene" and block.block_id:
+            node(block.block_id)
+            outcomes = block_tree(block).get("outcomes")
+            possible = outcomes.get("possible") if isinstance(outcomes, dict) else None
+            for outcome in _as_list(possible):
+                if isinstance(outcome, dict):
+                    add_edges(block.block_id, outcome.get("unlocks"), "unlocks")
+                    add_edges(block.block_id, outcome.get("blocks"), "blocks")
+        elif block.block_type == "link":
+            tree = block_tree(block)
+            source = tree.get("from")
+            if isinstance(source, str) and source:
+                link_type = tree.get("linkType")
+                kind = link_type if link_type in EDGE_KINDS[2:] else "link"
+                add_edges(source, tree.get("to"), kind)
+
+    count = len(ids)
+    offsets = array("i", bytes(4 * (count + 1)))
+    for source in sources:
+        offsets[source + 1] += 1
+    for number in range(count):
+        offsets[number + 1] += offsets[number]
+    cursor = array("i", offsets[:count])
+    targets = array("i", bytes(4 * len(dests)))
+    edge_kinds = array("B", bytes(len(dests)))
+    for source, dest, kind in zip(sources, dests, kinds):
+        slot = cursor[source]
+        targets[slot] = dest
+        edge_kinds[slot] = kind
+        cursor[source] = slot + 1
+    types = [id_types.get(block_id, "") for block_id in ids]
+    return NarrativeGraph(ids, types, offsets, targets, edge_kinds)
+
+
+def reachable(graph: NarrativeGraph, entries: Iterable[int]) -> bytearray:
+    seen = bytearray(len(graph.ids))
+    stack = list(entries)
+    for node in stack:
+        seen[node] = 1
+    while stack:
+        node = stack.pop()
+        for succ in graph.successors(node):
+            if not seen[succ]:
+                seen[succ] = 1
+                stack.append(succ)
+    return seen
+
+
+def strongly_connected_components(graph: NarrativeGraph) -> List[List[int]]:
+    """Iterative Tarjan; returns components in reverse topological order."""
+    count = len(graph.ids)
+    order = array("i", [-1]) * count
+    low = array("i", bytes(4 * count))
+    on_stack = bytearray(count)
+    stack: List[int] = []
+    components: List[List[int]] = []
+    counter = 0
+    for root in range(count):
+        if order[root] != -1:
+            continue
+        work = [(root, iter(graph.successors(root)))]
+        order[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = 1
+        while work:
+            node, successors = work[-1]
+            for succ in successors:
+                if order[succ] == -1:
+                    order[succ] = low[succ] = counter
+                    counter += 1
+                    stack.append(succ)
+                    on_stack[succ] = 1
+                    work.append((succ, iter(graph.successors(succ))))
+                    break
+                if on_stack[succ] and order[succ] < low[node]:
+                    low[node] = order[succ]
+            else:
+                work.pop()
+                if work and low[node] < low[work[-1][0]]:
+                    low[work[-1][0]] = low[node]
+                if low[node] == order[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = 0
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
+
+def find_cycles(graph: NarrativeGraph) -> List[List[int]]:
+    cycles = []
+    for component in strongly_connected_components(graph):
+        if len(component) > 1 or component[0] in graph.successors(component[0]):
+            cycles.append(sorted(component))
+    return sorted(cycles)
+
+
+@dataclass
+class GraphReport:
+    entries: List[str]
+    unreachable: List[str]
+    dead_ends: List[str]
+    orphans: List[str]
+    cycles: List[List[str]]
+
+
+def analyse(graph: NarrativeGraph, entry_ids: Optional[List[str]] = None) -> GraphReport:
+    scenes = [number for number, block_type in enumerate(graph.types) if block_type == "scene"]
+    if entry_ids:
+        lookup = {block_id: number for number, block_id in enumerate(graph.ids)}
+        unknown = [block_id for block_id in entry_ids if block_id not in lookup]
+        if unknown:
+            raise GraphError(f"Unknown entry id{'s' if len(unknown) > 1 else ''}: {', '.join(unknown)}")
+        entries = [lookup[block_id] for block_id in entry_ids]
+    else:
+        entries = scenes[:1]
+    seen = reachable(graph, entries)
+    has_incoming = bytearray(len(graph.ids))
+    for target in graph.targets:
+        has_incoming[target] = 1
+    entry_set: Set[int] = set(entries)
+    ids = graph.ids
+    return GraphReport(
+        entries=[ids[n] for n in entries],
+        unreachable=[ids[n] for n in scenes if not seen[n]],
+        dead_ends=[ids[n] for n in scenes if next(iter(graph.successors(n)), None) is None],
+        orphans=[ids[n] for n in scenes if not has_incoming[n] and n not in entry_set],
+        cycles=[[ids[n] for n in cycle] for cycle in find_cycles(graph)],
+    )
+
+
+def edge_field(kind: str) -> str:
+    """The field an edge of ``kind`` comes from: an outcome's ``unlocks``/``blocks`` or a link's ``to``."""
+    return kind if kind in ("unlocks", "blocks") else "to"
+
+
+def graph_document(graph: NarrativeGraph, report: GraphReport) -> Dict[str, object]:
+    # Same shape as the edges written by ``export``.
+    edges = []
+    for source in range(len(graph.ids)):
+        for edge in range(graph.offsets[source], graph.offsets[source + 1]):
+            kind = EDGE_KINDS[graph.kinds[edge]]
+            target = graph.ids[graph.targets[edge]]
+            edges.append({"from": graph.ids[source], "to": target, "field": edge_field(kind), "type": kind})
+    return {
+        "nodes": [{"id": block_id, "type": block_type} for block_id, block_type in zip(graph.ids, graph.types)],
+        "edges": edges,
+        "entries": report.entries,
+        "unreachable": report.unreachable,
+        "deadEnds": report.dead_ends,
+        "orphans": report.orphans,
+        "cycles": report.cycles,
+    }
+
+
+def print_report(graph: NarrativeGraph, report: GraphReport) -> None:
+    print(f"Graph: {len(graph.ids)} nodes, {len(graph.targets)} edges")
+    sections = [
+        ("entry scenes", report.entries),
+        ("unreachable scenes", report.unreachable),
+        ("dead-end scenes", report.dead_ends),
+        ("orphan scenes", report.orphans),
+        ("cycles", [" -> ".join(cycle) for cycle in report.cycles]),
+    ]
+    for title, items in sections:
+        print(f"\t{title}: {len(items)}")
+        for item in items:
+            print(f"\t\t{item}")
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="validate_hopscotch.py graph",
+        description="Report reachability, dead ends and cycles over scenes and links.",
+    )
+    parser.add_argument("path", help="Path to .hopscotch file")
+    parser.add_argument(
+        "--entry",
+        action="append",
+        metavar="ID",
+        help="Entry scene id; may be repeated (default: the first scene in the file)",
+    )
+    parser.add_argument("--json", action="store_true", help="Write nodes, edges and findings as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.path, "r", encoding="utf-8") as f:
+            graph = build_graph(iter_blocks(f))
+    except (OSError, UnicodeDecodeError) as exc:
+        print(f"ERROR: Could not read {args.path}: {exc}", file=sys.stderr)
+        return 2
+
+    try:
+        report = analyse(graph, args.entry)
+    except GraphError as exc:
+        print(f"ERROR: {args.path}: {exc}", file=sys.stderr)
+        return 2
+    if args.json:
+        json.dump(graph_document(graph, report), sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        print_report(graph, report)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""A stdio language server for .hopscotch files.
+
+Speaks JSON-RPC with LSP framing on stdin/stdout and supports incremental
+document sync, diagnostics, go-to-definition and find-references for block
+ids. Each open document keeps its text as a list of lines, so an edit only
+re-splits the lines it touches, and an ``IncrementalFile`` from watch mode,
+so validation re-parses only the blocks whose bytes changed and patches the
+id index rather than rebuilding it. Diagnostics are debounced: a burst of
+keystrokes is validated once, shortly after the last one.
+"""
+import argparse
+import json
+import queue
+import re
+import sys
+import threading
+import time
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from hopscotch_watch import IncrementalFile
+
+DEBOUNCE_SECONDS = 0.15
+# Validations slower than this are reported to the client's log.
+LATENCY_BUDGET_MS = 50.0
+
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+SEVERITY_ERROR = 1
+SEVERITY_WARNING = 2
+LOG_WARNING = 2
+
+_LINE_RE = re.compile(r"[^\r\n]*(?:\r\n?|\n)|[^\r\n]+\Z")
+_ID_TOKEN_RE = re.compile(r"[A-Za-z][\w-]*(?:\.[\w-]+)+")
+_MESSAGE_LINE_RE = re.compile(r"Line (\d+): ")
+
+
+def split_lines(text: str) -> List[str]:
+    """Split like the validator and LSP do: on ``\\r\\n``, ``\\r`` and ``\\n`` only."""
+    return _LINE_RE.findall(text)
+
+
+def _content(line: str) -> str:
+    return line.rstrip("\r\n")
+
+
+def utf16_length(text: str) -> int:
+    if text.isascii():
+        return len(text)
+    return len(text.encode("utf-16-le")) // 2
+
+
+def to_index(line: str, character: int) -> int:
+    """Index into ``line`` of an LSP (UTF-16) character offset, clamped to the line."""
+    content = _content(line)
+    if content.isascii():
+        return min(character, len(content))
+    units = 0
+    for index, char in enumerate(content):
+        if units >= character:
+            return index
+        units += 2 if ord(char) > 0xFFFF else 1
+    return len(content)
+
+
+class Document:
+    """The text of one open document, kept as lines with their terminators."""
+
+    def __init__(self, uri: str, text: str, version: Optional[int] = None) -> None:
+        self.uri = uri
+        self.version = version
+        self.lines = split_lines(text)
+        self.state = IncrementalFile(uri)
+
+    @property
+    def text(self) -> str:
+        return "".join(self.lines)
+
+    def line(self, number: int) -> str:
+        return self.lines[number] if 0 <= number < len(self.lines) else ""
+
+    def apply(self, change: Dict[str, Any]) -> None:
+        """Apply one ``TextDocumentContentChangeEvent``."""
+        if "range" not in change:
+            self.lines = split_lines(change["text"])
+            return
+        start, end = change["range"]["start"], change["range"]["end"]
+        first, last = start["line"], end["line"]
+        if first >= len(self.lines) and self.lines and self.lines[-1] == _content(self.lines[-1]):
+            # Past an unterminated last line: that is the end of the document.
+            first = len(self.lines) - 1
+            head = self.lines[first]
+        else:
+            first = min(first, len(self.lines))
+            head = self.line(first)[: to_index(self.line(first), start["character"])]
+        # The tail keeps the terminator of the last touched line.
+        tail = self.line(last)[to_index(self.line(last), end["character"]) :]
+        text = head + change["text"] + tail
+        # A lone \r and a following \n merge into one line break.
+        if first > 0 and text.startswith("\n") and self.lines[first - 1].endswith("\r"):
+            first -= 1
+            text = self.lines[first] + text
+        if text.endswith("\r") and last + 1 < len(self.lines) and self.lines[last + 1].startswith("\n"):
+            last += 1
+            text += self.lines[last]
+        self.lines[first : last + 1] = split_lines(text)
+
+    def validate(self) -> List[Dict[str, Any]]:
+        """LSP diagnostics for the current text."""
+        result = self.state.update_bytes(self.text.encode("utf-8"))
+        return [self._diagnostic(message, SEVERITY_ERROR) for message in result.errors] + [
+            self._diagnostic(message, SEVERITY_WARNING) for message in result.warnings
+        ]
+
+    def _diagnostic(self, message: str, severity: int) -> Dict[str, Any]:
+        match = _MESSAGE_LINE_RE.match(message)
+        number = int(match.group(1)) - 1 if match else 0
+        text = message[match.end() :] if match else message
+        width = utf16_length(_content(self.line(number)))
+        return {
+            "range": {
+                "start": {"line": number, "character": 0},
+                "end": {"line": number, "character": width},
+            },
+            "severity": severity,
+            "source": "hopscotch",
+            "message": text,
+        }
+
+    def token_at(self, position: Dict[str, int]) -> str:
+        line = self.line(position["line"])
+        index = to_index(line, position["character"])
+        for match in _ID_TOKEN_RE.finditer(_content(line)):
+            if match.start() <= index <= match.end():
+                return match.group(0)
+        return ""
+
+    def token_range(self, number: int, token: str) -> Dict[str, Any]:
+        """Range of ``token`` on line ``number`` (0-based), or of the whole line."""
+        content = _content(self.line(number))
+        for match in _ID_TOKEN_RE.finditer(content):
+            if match.group(0) == token:
+                start = utf16_length(content[: match.start()])
+                return {
+                    "start": {"line": number, "character": start},
+                    "end": {"line": number, "character": start + utf16_length(token)},
+                }
+        return {
+            "start": {"line": number, "character": 0},
+            "end": {"line": number, "character": utf16_length(content)},
+        }
+
+    def declarations(self, block_id: str) -> Iterator[Dict[str, Any]]:
+        for record in self.state.declarations.get(block_id, ()):
+            number = record.block.line_start - 1
+            yield {"uri": self.uri, "range": self.token_range(number, block_id)}
+
+    def references(self, block_id: str) -> Iterator[Dict[str, Any]]:
+        records = sorted(self.state.referrers.get(block_id, ()), key=lambda record: record.span.start)
+        for record in records:
+            first = record.block.line_start
+            for offset, line in enumerate(record.block.content_lines):
+                if block_id in line and block_id in _ID_TOKEN_RE.findall(line):
+                    yield {"uri": self.uri, "range": self.token_range(first + offset, block_id)}
+
+
+def read_message(reader: BinaryIO) -> Optional[Dict[str, Any]]:
+    """Read one framed JSON-RPC message, or None at end of input."""
+    length = None
+    while True:
+        header = reader.readline()
+        if not header:
+            return None
+        header = header.strip()
+        if not header:
+            break
+        name, _, value = header.decode("ascii").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    if length is None:
+        return None
+    return json.loads(reader.read(length).decode("utf-8"))
+
+
+class LanguageServer:
+    def __init__(self, reader: BinaryIO, writer: BinaryIO, debounce: float = DEBOUNCE_SECONDS) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.debounce = debounce
+        self.documents: Dict[str, Document] = {}
+        self.pending: Dict[str, float] = {}
+        self.shutdown_requested = False
+        self.inbox: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+
+    def send(self, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.writer.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+        self.writer.flush()
+
+    def notify(self, method: str, params: Dict[str, Any]) -> None:
+        self.send({"jsonrpc": "2.0", "method": method, "params": params})
+
+    def _read_loop(self) -> None:
+        while True:
+            message = read_message(self.reader)
+            self.inbox.put(message)
+            if message is None:
+                return
+
+    def serve(self) -> int:
+        threading.Thread(target=self._read_loop, daemon=True).start()
+        while True:
+            timeout = None
+            if self.pending:
+                timeout = max(0.0, min(self.pending.values()) - time.monotonic())
+            try:
+                message = self.inbox.get(timeout=timeout)
+            except queue.Empty:
+                self.flush(due_only=True)
+                continue
+            if message is None:
+                return 1
+            if message.get("method") == "exit":
+                return 0 if self.shutdown_requested else 1
+            self.handle(message)
+            self.flush(due_only=True)
+
+    def flush(self, due_only: bool = False, uri: Optional[str] = None) -> None:
+        """Publish diagnostics for documents whose debounce delay has passed."""
+        now = time.monotonic()
+        for pending_uri, deadline in list(self.pending.items()):
+            if uri is not None and pending_uri != uri:
+                continue
+            if due_only and deadline > now:
+                continue
+            del self.pending[pending_uri]
+            self.publish(self.documents[pending_uri])
+
+    def publish(self, document: Document) -> None:
+        started = time.perf_counter()
+        diagnostics = document.validate()
+        elapsed = (time.perf_counter() - started) * 1000
+        self.notify(
+            "textDocument/publishDiagnostics",
+            {"uri": document.uri, "version": document.version, "diagnostics": diagnostics},
+        )
+        if elapsed > LATENCY_BUDGET_MS:
+            self.notify(
+                "window/logMessage",
+                {
+                    "type": LOG_WARNING,
+                    "message": f"hopscotch: validating {document.uri} took {elapsed:.1f} ms "
+                    f"({document.state.reparsed} blocks re-parsed)",
+                },
+            )
+
+    def handle(self, message: Dict[str, Any]) -> None:
+        method = message.get("method", "")
+        params = message.get("params") or {}
+        handler = getattr(self, "on_" + method.replace("/", "_"), None)
+        if "id" not in message:
+            if handler is not None:
+                try:
+                    handler(params)
+                except Exception as exc:
+                    # A notification has no reply, so a malformed one is dropped rather than ending the session.
+                    self.notify(
+                        "window/logMessage",
+                        {"type": LOG_WARNING, "message": f"hopscotch: ignored {method}: {exc!r}"},
+                    )
+            return
+        if handler is None:
+            self.reply_error(message["id"], METHOD_NOT_FOUND, f"Unsupported method: {method}")
+            return
+        try:
+            result = handler(params)
+        except (KeyError, TypeError, ValueError) as exc:
+            self.reply_error(message["id"], INVALID_PARAMS, f"Invalid params for {method}: {exc!r}")
+            return
+        except Exception as exc:
+            self.reply_error(message["id"], INTERNAL_ERROR, f"Could not handle {method}: {exc!r}")
+            return
+        self.send({"jsonrpc": "2.0", "id": message["id"], "result": result})
+
+    def reply_error(self, request_id: Any, code: int, text: str) -> None:
+        self.send({"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": text}})
+
+    def on_initialize(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "capabilities": {
+                "positionEncoding": "utf-16",
+                "textDocumentSync": {"openClose": True, "change": 2},
+                "definitionProvider": True,
+                "referencesProvider": True,
+            },
+            "serverInfo": {"name": "hopscotch-lsp"},
+        }
+
+    def on_shutdown(self, params: Dict[str, Any]) -> None:
+        self.shutdown_requested = True
+        return None
+
+    def on_textDocument_didOpen(self, params: Dict[str, Any]) -> None:
+        item = params["textDocument"]
+        document = self.documents[item["uri"]] = Document(item["uri"], item["text"], item.get("version"))
+        self.pending.pop(document.uri, None)
+        self.publish(document)
+
+    def on_textDocument_didChange(self, params: Dict[str, Any]) -> None:
+        document = self.documents.get(params["textDocument"]["uri"])
+        if document is None:
+            return
+        for change in params["contentChanges"]:
+            document.apply(change)
+        document.version = params["textDocument"].get("version")
+        self.pending[document.uri] = time.monotonic() + self.debounce
+
+    def on_textDocument_didClose(self, params: Dict[str, Any]) -> None:
+        uri = params["textDocument"]["uri"]
+        self.documents.pop(uri, None)
+        self.pending.pop(uri, None)
+        self.notify("textDocument/publishDiagnostics", {"uri": uri, "diagnostics": []})
+
+    def _lookup(self, params: Dict[str, Any]) -> Tuple[str, List[Document]]:
+        uri = params["textDocument"]["uri"]
+        document = self.documents.get(uri)
+        if document is None:
+            return "", []
+        # Answer from the current text rather than the last debounced one.
+        self.flush()
+        others = [doc for doc in self.documents.values() if doc is not document]
+        return document.token_at(params["position"]), [document] + others
+
+    def on_textDocument_definition(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        block_id, documents = self._lookup(params)
+        if not block_id:
+            return []
+        for document in documents:
+            locations = list(document.declarations(block_id))
+            if locations:
+                return locations[:1]
+        return []
+
+    def on_textDocument_references(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        block_id, documents = self._lookup(params)
+        if not block_id:
+            return []
+        locations: List[Dict[str, Any]] = []
+        for document in documents:
+            if params.get("context", {}).get("includeDeclaration"):
+                locations.extend(document.declarations(block_id))
+            locations.extend(document.references(block_id))
+        return locations
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="validate_hopscotch.py lsp",
+        description="Run a language server for .hopscotch files over stdio.",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=DEBOUNCE_SECONDS * 1000,
+        metavar="MS",
+        help="Delay after the last edit before re-validating (default: 150)",
+    )
+    args = parser.parse_args(argv)
+    return LanguageServer(sys.stdin.buffer, sys.stdout.buffer, args.debounce / 1000).serve()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,157 @@
+"""Timing instrumentation behind ``--timings`` and ``--metrics-json``.
+
+Nothing here runs unless a ``Metrics`` is passed to the validator, which then
+swaps in the wrapped callables from ``timed``, ``timed_blocks`` and
+``timed_validate`` for the plain ones, so the default path is unchanged.
+Phases record wall-clock and CPU seconds; ``validate_block`` calls are also
+totalled per block type, and the slowest blocks (parse plus validate time)
+are kept in a bounded heap.
+"""
+import heapq
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from validate_hopscotch import Block, BlockEntry, block_tree
+
+PHASES = ["read", "parse", "validate", "refs", "schema", "report"]
+DEFAULT_SLOWEST = 10
+
+# (seconds, path, line, block type, block id)
+SlowBlock = Tuple[float, str, int, str, str]
+
+
+class Metrics:
+    def __init__(self, path: str = "", slowest: int = DEFAULT_SLOWEST) -> None:
+        self.path = path
+        self.limit = slowest
+        self.files = 0
+        self.blocks = 0
+        # phase -> [wall seconds, CPU seconds]
+        self.phases: Dict[str, List[float]] = {phase: [0.0, 0.0] for phase in PHASES}
+        # block type -> [validate_block calls, wall seconds]
+        self.types: Dict[str, List[float]] = {}
+        self.slowest: List[SlowBlock] = []
+        self._parse_seconds = 0.0
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        totals = self.phases[name]
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            totals[0] += time.perf_counter() - wall
+            totals[1] += time.process_time() - cpu
+
+    def timed(self, name: str, func: Callable[..., Any]) -> Callable[..., Any]:
+        """Wrap ``func`` so every call is charged to phase ``name``."""
+        totals = self.phases[name]
+        perf_counter, process_time = time.perf_counter, time.process_time
+
+        def wrapper(*args: Any) -> Any:
+            wall, cpu = perf_counter(), process_time()
+            try:
+                return func(*args)
+            finally:
+                totals[0] += perf_counter() - wall
+                totals[1] += process_time() - cpu
+
+        return wrapper
+
+    def timed_blocks(self, entries: Iterable[BlockEntry]) -> Iterator[BlockEntry]:
+        """Charge locating, cache lookup, decoding and body parsing of each block to "parse"."""
+        totals = self.phases["parse"]
+        perf_counter, process_time = time.perf_counter, time.process_time
+        iterator = iter(entries)
+        self.files += 1
+        while True:
+            wall, cpu = perf_counter(), process_time()
+            entry = next(iterator, None)
+            if entry is not None and entry[2] is None:
+                # Bodies are otherwise parsed lazily by whichever check needs them first; cache hits never are.
+                block_tree(entry[0])
+            elapsed = perf_counter() - wall
+            totals[0] += elapsed
+            totals[1] += process_time() - cpu
+            if entry is None:
+                return
+            self.blocks += 1
+            self._parse_seconds = elapsed
+            yield entry
+
+    def timed_validate(self, func: Callable[[Block, Any], Any]) -> Callable[[Block, Any], Any]:
+        """Wrap ``validate_block`` to total time per type and track the slowest blocks."""
+        totals = self.phases["validate"]
+        perf_counter, process_time = time.perf_counter, time.process_time
+
+        def wrapper(block: Block, hopscotch_version: Any) -> Any:
+            wall, cpu = perf_counter(), process_time()
+            result = func(block, hopscotch_version)
+            elapsed = perf_counter() - wall
+            totals[0] += elapsed
+            totals[1] += process_time() - cpu
+            stats = self.types.get(block.block_type)
+            if stats is None:
+                stats = self.types[block.block_type] = [0, 0.0]
+            stats[0] += 1
+            stats[1] += elapsed
+            self._record(
+                (elapsed + self._parse_seconds, self.path, block.line_start, block.block_type, block.block_id)
+            )
+            return result
+
+        return wrapper
+
+    def _record(self, entry: SlowBlock) -> None:
+        if len(self.slowest) < self.limit:
+            heapq.heappush(self.slowest, entry)
+        elif self.limit and entry > self.slowest[0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def merge(self, other: "Metrics") -> None:
+        self.files += other.files
+        self.blocks += other.blocks
+        for name, (wall, cpu) in other.phases.items():
+            self.phases[name][0] += wall
+            self.phases[name][1] += cpu
+        for block_type, (count, seconds) in other.types.items():
+            stats = self.types.setdefault(block_type, [0, 0.0])
+            stats[0] += count
+            stats[1] += seconds
+        for entry in other.slowest:
+            self._record(entry)
+
+    def document(self, elapsed: Optional[float] = None) -> Dict[str, Any]:
+        """The metrics as a JSON-ready document; times are in seconds."""
+        return {
+            "files": self.files,
+            "blocks": self.blocks,
+            "elapsed": elapsed,
+            "phases": {name: {"wall": wall, "cpu": cpu} for name, (wall, cpu) in self.phases.items()},
+            "blockTypes": {
+                block_type: {"count": count, "seconds": seconds}
+                for block_type, (count, seconds) in sorted(self.types.items())
+            },
+            "slowest": [
+                {"path": path, "line": line, "type": block_type, "id": block_id, "seconds": seconds}
+                for seconds, path, line, block_type, block_id in sorted(self.slowest, reverse=True)
+            ],
+        }
+
+    def format_table(self) -> List[str]:
+        lines = [f"Timings ({self.files} files, {self.blocks} blocks):"]
+        lines.append(f"\t{'phase':<12}{'wall ms':>12}{'cpu ms':>12}")
+        for name, (wall, cpu) in self.phases.items():
+            lines.append(f"\t{name:<12}{wall * 1000:>12.2f}{cpu * 1000:>12.2f}")
+        lines.append(f"\t{'block type':<12}{'count':>12}{'total ms':>12}{'mean us':>12}")
+        for block_type, (count, seconds) in sorted(self.types.items(), key=lambda item: -item[1][1]):
+            lines.append(
+                f"\t{block_type:<12}{count:>12}{seconds * 1000:>12.2f}{seconds / count * 1e6:>12.1f}"
+            )
+        if self.slowest:
+            lines.append("\tslowest blocks:")
+            for seconds, path, line, block_type, block_id in sorted(self.slowest, reverse=True):
+                location = f"{path}:{line}" if path else f"line {line}"
+                lines.append(f"\t\t{seconds * 1000:8.3f} ms  {location}  {block_type} {block_id}")
+        return lines
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""Upgrade Hopscotch files to a newer SPEC version in two streaming passes.
+
+The first pass scans the fences with ``scan_spans`` and builds the rename
+map described in MIGRATION.md: a ``location`` whose parent is a
+``region.*`` becomes a ``destination`` and its id prefix changes to
+``destination.*``. The second pass copies the file line by line, keeping
+its line endings. It renames the fences of those blocks and rewrites every
+reference to a renamed id, both in block bodies (``parent``, ``scope``,
+``from``, ``to``, ``leadsTo``, ``exits`` and any other field) and in inline
+``@{id}`` references in prose. Finally it sets ``hopscotchVersion``.
+
+References are rewritten by a single compiled pattern matching anything
+shaped like an id, and each match is one dict lookup in the rename map.
+The cost per line is therefore the same for one rename as for a hundred
+thousand. Only the current line and the rename map are held in memory,
+and each file is replaced atomically once its new copy is complete.
+
+Kinds cannot be fixed mechanically, so they are reported for review (see
+MIGRATION.md step 3). These are kinds that belong to the other node type
+after the split, and renames that would collide with an existing
+destination id.
+"""
+import argparse
+import io
+import os
+import re
+import sys
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from validate_hopscotch import (
+    DESTINATION_KINDS,
+    LOCATION_KINDS,
+    _parse_fence,
+    expand_paths,
+    iter_buffer_lines,
+    map_file,
+    parse_top_level_keys,
+    read_frontmatter,
+    scan_spans,
+)
+
+if TYPE_CHECKING:
+    import mmap
+
+TARGET_VERSIONS = {"0.5.0": (0, 5, 0)}
+# Anything shaped like a dot-scoped id that is not part of a longer token.
+ID_TOKEN_RE = re.compile(r"(?<![\w.-])[A-Za-z][\w-]*(?:\.[\w-]+)+")
+INLINE_REF_RE = re.compile(r"@\{([^{}\s]+)\}")
+_VERSION_KEY_RE = re.compile(r"hopscotchVersion\s*:")
+
+
+class MigrationError(Exception):
+    """Raised when a file cannot be migrated without manual changes."""
+
+
+@dataclass
+class MigrationPlan:
+    version: Optional[Tuple[int, int, int]]
+    # Old id -> new id for every location becoming a destination.
+    renames: Dict[str, str] = field(default_factory=dict)
+    notes: List[str] = field(default_factory=list)
+    # References rewritten by ``rewrite_lines``, fence ids included.
+    rewritten: int = 0
+
+
+def plan_migration(buffer: "mmap.mmap") -> MigrationPlan:
+    """First pass: the rename map and review notes for one file.
+
+    Fences are located with ``scan_spans`` and only ``location`` bodies are
+    decoded, for their top-level ``parent`` and ``kind``.
+    """
+    _, version = read_frontmatter(iter_buffer_lines(buffer))
+    plan = MigrationPlan(version)
+    destinations: Set[str] = set()
+    for span in scan_spans(buffer):
+        if span.block_type == "destination":
+            destinations.add(span.block_id)
+        if span.block_type != "location":
+            continue
+        body = io.StringIO(buffer[span.body_start : span.body_end].decode("utf-8"), newline=None)
+        _, values = parse_top_level_keys(list(body))
+        kind = values.get("kind", "")
+        if values.get("parent", "").startswith("region."):
+            if span.block_id in plan.renames:
+                continue
+            prefix, dot, rest = span.block_id.partition(".")
+            plan.renames[span.block_id] = f"destination.{rest}" if prefix == "location" and dot else span.block_id
+            if kind in LOCATION_KINDS - DESTINATION_KINDS:
+                plan.notes.append(
+                    f"Line {span.line_start}: {span.block_id} becomes a destination but has location kind "
+                    f"'{kind}'; choose one of {', '.join(sorted(DESTINATION_KINDS))}."
+                )
+        elif kind in DESTINATION_KINDS - LOCATION_KINDS:
+            plan.notes.append(
+                f"Line {span.line_start}: {span.block_id} stays a location but has destination kind "
+                f"'{kind}'; choose one of {', '.join(sorted(LOCATION_KINDS))}."
+            )
+    collisions = sorted(old for old, new in plan.renames.items() if new in destinations)
+    if collisions:
+        raise MigrationError(
+            "Renaming would duplicate existing destination ids: "
+            + ", ".join(f"{old} -> {plan.renames[old]}" for old in collisions)
+        )
+    return plan
+
+
+def rewrite_lines(lines: Iterable[str], plan: MigrationPlan, target: str) -> Iterator[str]:
+    """Second pass: ``lines`` with renames applied and ``hopscotchVersion`` set to ``target``."""
+    renames = {old: new for old, new in plan.renames.items() if old != new}
+    prefixes = tuple({old.split(".", 1)[0] + "." for old in renames})
+
+    def rename(match: "re.Match[str]") -> str:
+        new = renames.get(match.group())
+        if new is None:
+            return match.group()
+        plan.rewritten += 1
+        return new
+
+    def rename_inline(match: "re.Match[str]") -> str:
+        new = renames.get(match.group(1))
+        if new is None:
+            return match.group()
+        plan.rewritten += 1
+        return f"@{{{new}}}"
+
+    line_no = 0
+    in_block = False
+    # None outside frontmatter; else whether hopscotchVersion has been written.
+    frontmatter_versioned: Optional[bool] = None
+    for line in lines:
+        line_no += 1
+        newline = line[len(line.rstrip("\r\n")) :] or "\n"
+        version_line = f'hopscotchVersion: "{target}"{newline}'
+        if line_no == 1:
+            if line.startswith("---"):
+                frontmatter_versioned = False
+            else:
+                yield f"---{newline}{version_line}---{newline}"
+        elif frontmatter_versioned is not None:
+            if line.startswith("---"):
+                if not frontmatter_versioned:
+                    yield version_line
+                frontmatter_versioned = None
+            elif _VERSION_KEY_RE.match(line) and not frontmatter_versioned:
+                frontmatter_versioned = True
+                yield version_line
+                continue
+        if in_block:
+            if line.startswith("```"):
+                in_block = False
+        elif line.startswith("```hopscotch:"):
+            fence = _parse_fence(line, line_no, [])
+            if fence is not None:
+                in_block = True
+                block_type, block_id = fence
+                if block_type == "location" and block_id in plan.renames:
+                    line = line.replace("```hopscotch:location", "```hopscotch:destination", 1)
+        elif "@{" in line:
+            yield INLINE_REF_RE.sub(rename_inline, line)
+            continue
+        if in_block and prefixes and any(prefix in line for prefix in prefixes):
+            line = ID_TOKEN_RE.sub(rename, line)
+        yield line
+    if line_no == 0:
+        yield f'---\nhopscotchVersion: "{target}"\n---\n'
+
+
+def migrate_file(path: str, target: str, write: bool = True) -> Tuple[MigrationPlan, bool]:
+    """Migrate ``path`` in place; returns the plan and whether the file needed changes."""
+    with open(path, "rb") as f:
+        # Empty files cannot be mapped; read them instead.
+        buffer = map_file(f) or f.read()
+        try:
+            plan = plan_migration(buffer)
+        finally:
+            if hasattr(buffer, "close"):
+                buffer.close()
+    target_version = TARGET_VERSIONS[target]
+    if plan.version is not None and plan.version > target_version:
+        raise MigrationError(f"hopscotchVersion {'.'.join(map(str, plan.version))} is newer than {target}.")
+    if plan.version == target_version and not plan.renames:
+        return plan, False
+    if not write:
+        # Run the second pass anyway so the reference count is reported.
+        with open(path, "r", encoding="utf-8", newline="") as source:
+            for _ in rewrite_lines(source, plan, target):
+                pass
+        return plan, True
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(path, "r", encoding="utf-8", newline="") as source:
+            with open(tmp_path, "w", encoding="utf-8", newline="") as out:
+                out.writelines(rewrite_lines(source, plan, target))
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return plan, True
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="validate_hopscotch.py migrate",
+        description="Upgrade files in place to a newer SPEC version, renaming ids and rewriting references.",
+        epilog="See MIGRATION.md. With --check, exit status is 1 if any file needs migrating.",
+    )
+    parser.add_argument(
+        "paths", nargs="+", metavar="path", help="Path to a .hopscotch file, a directory, or a glob"
+    )
+    parser.add_argument("--to", choices=sorted(TARGET_VERSIONS), default="0.5.0", help="Target SPEC version")
+    parser.add_argument("--check", action="store_true", help="Report what would change without writing")
+    args = parser.parse_args(argv)
+
+    exit_code = 0
+    for path in expand_paths(args.paths):
+        try:
+            plan, changed = migrate_file(path, args.to, write=not args.check)
+        except MigrationError as exc:
+            print(f"ERROR: Could not migrate {path}: {exc}", file=sys.stderr)
+            exit_code = 2
+            continue
+        except (OSError, UnicodeDecodeError) as exc:
+            print(f"ERROR: Could not read {path}: {exc}", file=sys.stderr)
+            exit_code = 2
+            continue
+        renamed = sum(old != new for old, new in plan.renames.items())
+        verb = "would migrate" if args.check else "migrated"
+        if changed:
+            print(f"{path}: {verb} to {args.to} ({renamed} ids renamed, {plan.rewritten} references rewritten)")
+            if args.check:
+                exit_code = max(exit_code, 1)
+        else:
+            print(f"{path}: already at {args.to}")
+        for note in plan.notes:
+            print(f"- {path}: {note}", file=sys.stderr)
+    return exit_code
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
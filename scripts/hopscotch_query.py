@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""Find blocks by id, type, tag or containment without validating the file.
+
+A filter is a space-separated list of terms, all of which must match; a
+term is ``field:value`` with comma-separated alternatives, any of which may
+match::
+
+    npc.elro-aldataur                         id (a bare value is an id glob)
+    type:encounter under:destination.croaker-cave
+    tag:bandits,undead id:npc.*
+
+Fields are ``id`` (a glob), ``type``, ``tag``, ``parent``, ``scope`` and
+``under``, which matches nodes below a node and blocks whose ``parent`` or
+``scope`` is that node or one of them. Terms are answered from the inverted
+index in the compiled sidecar (see ``hopscotch_compile``), which is rebuilt
+first if it is missing or stale, so no block is parsed until it matches.
+"""
+import argparse
+import json
+import re
+import sys
+from fnmatch import fnmatchcase
+from typing import Any, Iterable, List, Set, Tuple
+
+from hopscotch_compile import CompiledIndex, SidecarError, load_index
+from hopscotch_export import project_block
+from validate_hopscotch import BLOCK_REF_TARGET_TYPES, NODE_TYPES, expand_paths, format_block_label, map_file
+
+FIELDS = ["id", "type", "tag", "parent", "scope", "under"]
+# Query field -> inverted-index field
+INDEXED_FIELDS = {"type": "type", "tag": "tags", "parent": "parent", "scope": "scope"}
+_GLOB_RE = re.compile(r"[*?\[]")
+
+# (field, alternatives)
+Term = Tuple[str, List[str]]
+
+
+def parse_filter(text: str) -> List[Term]:
+    terms: List[Term] = []
+    for word in text.split():
+        field, separator, value = word.partition(":")
+        if not separator:
+            field, value = "id", word
+        if field not in FIELDS:
+            raise ValueError(f"Unknown query field '{field}' (expected one of {', '.join(FIELDS)}).")
+        alternatives = [item for item in value.split(",") if item]
+        if not alternatives:
+            raise ValueError(f"Query term '{word}' has no value.")
+        terms.append((field, alternatives))
+    return terms
+
+
+def match_ids(index: CompiledIndex, pattern: str) -> Iterable[int]:
+    """Blocks whose id matches the glob ``pattern``, scanning only ids that share its literal prefix."""
+    literal = _GLOB_RE.split(pattern, 1)[0]
+    for block_id, number in index.ids_with_prefix(literal):
+        if block_id == pattern if literal == pattern else fnmatchcase(block_id, pattern):
+            yield number
+
+
+def blocks_under(index: CompiledIndex, ancestor_id: str) -> Set[int]:
+    """Nodes placed below ``ancestor_id``, and blocks whose parent or scope is it or one of them."""
+    ancestor = index.lookup(ancestor_id)
+    if ancestor is None:
+        return set()
+    found: Set[int] = set()
+    pending = [(ancestor.block_type, ancestor_id)]
+    seen = {ancestor_id}
+    while pending:
+        parent_type, parent_id = pending.pop()
+        found.update(index.postings("scope", parent_id))
+        for number in index.postings("parent", parent_id):
+            found.add(number)
+            block_type, block_id = index.identity(number)
+            # Descend as the hierarchy does: only into nodes whose parent has an allowed type.
+            allowed = BLOCK_REF_TARGET_TYPES.get((block_type, "parent"), ())
+            if block_type in NODE_TYPES and parent_type in allowed and block_id not in seen:
+                seen.add(block_id)
+                pending.append((block_type, block_id))
+    return found
+
+
+def term_matches(index: CompiledIndex, term: Term) -> Set[int]:
+    field, alternatives = term
+    found: Set[int] = set()
+    for value in alternatives:
+        if field == "id":
+            found.update(match_ids(index, value))
+        elif field == "under":
+            found.update(blocks_under(index, value))
+        else:
+            found.update(index.postings(INDEXED_FIELDS[field], value))
+    return found
+
+
+def run_query(index: CompiledIndex, terms: List[Term]) -> List[int]:
+    """Numbers of the blocks matching every term, in file order."""
+    if not terms:
+        return list(range(len(index)))
+    matches = sorted((term_matches(index, term) for term in terms), key=len)
+    result = matches[0]
+    for other in matches[1:]:
+        if not result:
+            break
+        result &= other
+    return sorted(result)
+
+
+def write_matches(path: str, index: CompiledIndex, numbers: List[int], output: str) -> None:
+    source: Any = b""
+    if output != "text":
+        with open(path, "rb") as f:
+            source = map_file(f) or f.read()
+    try:
+        for number in numbers:
+            entry = index.block(number)
+            if output == "source":
+                sys.stdout.write(source[entry.start : entry.end].decode("utf-8"))
+            elif output == "json":
+                document = {"path": path, **project_block(entry.to_block(source))}
+                print(json.dumps(document, ensure_ascii=False))
+            else:
+                print(f"{path}:{entry.line_start}: {format_block_label(entry.to_block(source))}")
+    finally:
+        if hasattr(source, "close"):
+            source.close()
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="validate_hopscotch.py query",
+        description="Print the blocks matching FILTER, answered from each file's compiled sidecar index.",
+        epilog="Exit status is 0 if any block matched, 1 if none did and 2 on errors.",
+    )
+    parser.add_argument(
+        "filter",
+        help="Space-separated field:value[,value...] terms over id (glob), type, tag, parent, scope and under",
+    )
+    parser.add_argument(
+        "paths", nargs="+", metavar="path", help="Path to a .hopscotch file, a directory, or a glob"
+    )
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument(
+        "--json", dest="output", action="store_const", const="json", help="Print each block's JSON projection"
+    )
+    output.add_argument(
+        "--source", dest="output", action="store_const", const="source", help="Print each block's Markdown"
+    )
+    parser.set_defaults(output="text")
+    args = parser.parse_args(argv)
+    try:
+        terms = parse_filter(args.filter)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    exit_code = 1
+    for path in expand_paths(args.paths):
+        try:
+            with load_index(path) as index:
+                numbers = run_query(index, terms)
+                write_matches(path, index, numbers, args.output)
+        except (OSError, UnicodeDecodeError, SidecarError) as exc:
+            print(f"ERROR: Could not query {path}: {exc}", file=sys.stderr)
+            exit_code = 2
+            continue
+        if numbers and exit_code == 1:
+            exit_code = 0
+    return exit_code
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,392 @@
+"""Compile the v0.5 JSON Schemas in ``schemas/`` into plain Python checks.
+
+Every schema file is loaded once, ``$ref``s are resolved across files (by
+file name or ``$id``) and to local ``#/...`` pointers, and each distinct
+subschema becomes one generated function. Validating an instance is then a
+chain of ordinary calls and comparisons; the schema documents are never
+consulted again. Given a cache directory, the generated module is written
+there, named by a hash of the schema files and of this compiler, and
+imported like any other module so Python's own bytecode cache applies on
+later runs; otherwise it is compiled in memory and nothing is written.
+
+Only the keywords the shipped schemas use are supported: ``type``,
+``const``, ``enum``, ``required``, ``properties``, ``additionalProperties``,
+``items``, ``minLength``, ``minItems``, ``minimum``, ``pattern``,
+``allOf``, ``anyOf``, ``oneOf``, ``not``, ``if``/``then`` and ``$ref``.
+Anything else is rejected at compile time rather than silently ignored.
+"""
+import glob
+import hashlib
+import importlib.util
+import json
+import os
+from types import ModuleType
+from typing import Any, Dict, List, Optional, Tuple
+
+from validate_hopscotch import DEFAULT_SCHEMA_DIR, Block, Message, block_tree
+
+# Annotations that carry no validation meaning.
+IGNORED_KEYWORDS = {"$schema", "$id", "$defs", "title", "description", "$comment"}
+SUPPORTED_KEYWORDS = {
+    "type",
+    "const",
+    "enum",
+    "required",
+    "properties",
+    "additionalProperties",
+    "items",
+    "minLength",
+    "minItems",
+    "minimum",
+    "pattern",
+    "allOf",
+    "anyOf",
+    "oneOf",
+    "not",
+    "if",
+    "then",
+    "$ref",
+}
+
+# Generated expressions testing a value against each JSON type.
+TYPE_TESTS = {
+    "object": "isinstance(value, dict)",
+    "array": "isinstance(value, list)",
+    "string": "isinstance(value, str)",
+    "boolean": "isinstance(value, bool)",
+    "null": "value is None",
+    "number": "(isinstance(value, (int, float)) and not isinstance(value, bool))",
+    "integer": "(isinstance(value, int) and not isinstance(value, bool))",
+}
+
+_PRELUDE = '''\
+import re
+
+
+def _type_name(value):
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, list):
+        return "array"
+    return "object"
+
+
+def _matches(check, value):
+    errors = []
+    check(value, "", errors)
+    return not errors
+'''
+
+
+class SchemaError(Exception):
+    """Raised when the schema set cannot be loaded or compiled."""
+
+
+def load_schema_files(schema_dir: str) -> Dict[str, Tuple[bytes, Dict[str, Any]]]:
+    """Map each ``*.schema.json`` file name to its raw bytes and parsed document."""
+    documents: Dict[str, Tuple[bytes, Dict[str, Any]]] = {}
+    for path in sorted(glob.glob(os.path.join(schema_dir, "*.schema.json"))):
+        with open(path, "rb") as f:
+            raw = f.read()
+        try:
+            documents[os.path.basename(path)] = (raw, json.loads(raw))
+        except ValueError as exc:
+            raise SchemaError(f"{path}: {exc}") from exc
+    if not documents:
+        raise SchemaError(f"No *.schema.json files found in {schema_dir}")
+    return documents
+
+
+class SchemaCompiler:
+    """Translate a set of schema documents into the source of one module."""
+
+    def __init__(self, documents: Dict[str, Dict[str, Any]]) -> None:
+        self.documents = documents
+        self.by_id = {doc["$id"]: name for name, doc in documents.items() if "$id" in doc}
+        self.functions: Dict[Tuple[str, str], str] = {}
+        self.pending: List[Tuple[str, str, Any]] = []
+        self.constants: List[str] = []
+        self.chunks: List[str] = []
+
+    def compile(self) -> str:
+        roots = {name: self.function_for(name, "") for name in self.documents}
+        while self.pending:
+            self.chunks.append(self.emit(*self.pending.pop()))
+        table = "".join(f"    {name!r}: {func},\n" for name, func in sorted(roots.items()))
+        return (
+            _PRELUDE
+            + "\n\n"
+            + "\n\n".join(self.chunks)
+            # Constants come last: tables of check functions need them defined.
+            + "\n\n"
+            + "".join(f"{line}\n" for line in self.constants)
+            + "\nVALIDATORS = {\n"
+            + table
+            + "}\n"
+        )
+
+    def function_for(self, document: str, pointer: str) -> str:
+        """Name of the function checking ``document#pointer``, queued on first use."""
+        key = (document, pointer)
+        name = self.functions.get(key)
+        if name is None:
+            name = self.functions[key] = f"_check_{len(self.functions)}"
+            self.pending.append((name, document, self.resolve_pointer(document, pointer)))
+        return name
+
+    def resolve_pointer(self, document: str, pointer: str) -> Any:
+        node: Any = self.documents[document]
+        for part in filter(None, pointer.split("/")):
+            part = part.replace("~1", "/").replace("~0", "~")
+            try:
+                node = node[int(part)] if isinstance(node, list) else node[part]
+            except (KeyError, IndexError, ValueError):
+                raise SchemaError(f"{document}: unresolvable pointer '#{pointer}'") from None
+        return node
+
+    def resolve_ref(self, document: str, ref: str) -> str:
+        target, _, pointer = ref.partition("#")
+        if target:
+            target = self.by_id.get(target, target.rsplit("/", 1)[-1])
+            if target not in self.documents:
+                raise SchemaError(f"{document}: unresolvable $ref '{ref}'")
+        return self.function_for(target or document, pointer)
+
+    def constant(self, value: str) -> str:
+        name = f"_const_{len(self.constants)}"
+        self.constants.append(f"{name} = {value}")
+        return name
+
+    def subschema(self, document: str, schema: Any) -> str:
+        """Name of a function for an inline subschema (anyOf branches, if, not)."""
+        name = f"_check_{len(self.functions)}"
+        self.functions[(document, f"<inline {name}>")] = name
+        self.pending.append((name, document, schema))
+        return name
+
+    def emit(self, name: str, document: str, schema: Any) -> str:
+        lines = [f"def {name}(value, path, errors):"]
+        body = self.emit_body(document, schema)
+        lines.extend("    " + line for line in (body or ["pass"]))
+        return "\n".join(lines) + "\n"
+
+    def emit_body(self, document: str, schema: Any) -> List[str]:
+        if schema is True or schema == {}:
+            return []
+        if schema is False:
+            return ['errors.append(path + ": no value is allowed")']
+        if not isinstance(schema, dict):
+            raise SchemaError(f"{document}: schema must be an object or boolean, not {schema!r}")
+        unknown = set(schema) - SUPPORTED_KEYWORDS - IGNORED_KEYWORDS
+        if unknown:
+            raise SchemaError(f"{document}: unsupported keyword(s) {', '.join(sorted(unknown))}")
+
+        out: List[str] = []
+        if "$ref" in schema:
+            out.append(f"{self.resolve_ref(document, schema['$ref'])}(value, path, errors)")
+        if "type" in schema:
+            types = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+            test = " or ".join(TYPE_TESTS[t] for t in types)
+            expected = " or ".join(types)
+            out.append(f"if not ({test}):")
+            out.append(f'    errors.append(path + ": expected {expected}, got " + _type_name(value))')
+            # Later keywords would only pile up noise on a value of the wrong type.
+            out.append("    return")
+        if "const" in schema:
+            const = self.constant(repr(schema["const"]))
+            shown = json.dumps(schema["const"])
+            out.append(f"if value != {const}:")
+            out.append(f"    errors.append(path + {': must be ' + shown!r})")
+        if "enum" in schema:
+            values = self.constant(repr(tuple(schema["enum"])))
+            shown = ", ".join(json.dumps(v) for v in schema["enum"])
+            out.append(f"if value not in {values}:")
+            out.append(f"    errors.append(path + {': must be one of ' + shown!r})")
+        if "minLength" in schema:
+            out.append(f"if isinstance(value, str) and len(value) < {int(schema['minLength'])}:")
+            out.append(f"    errors.append(path + {': must be at least %d character(s)' % schema['minLength']!r})")
+        if "pattern" in schema:
+            regex = self.constant(f"re.compile({schema['pattern']!r})")
+            out.append(f"if isinstance(value, str) and not {regex}.search(value):")
+            out.append(f"    errors.append(path + {': must match ' + schema['pattern']!r})")
+        if "minimum" in schema:
+            minimum = schema["minimum"]
+            out.append(
+                "if isinstance(value, (int, float)) and not isinstance(value, bool)"
+                f" and value < {minimum!r}:"
+            )
+            out.append(f"    errors.append(path + {': must be >= ' + json.dumps(minimum)!r})")
+        if "minItems" in schema:
+            out.append(f"if isinstance(value, list) and len(value) < {int(schema['minItems'])}:")
+            out.append(f"    errors.append(path + {': must have at least %d item(s)' % schema['minItems']!r})")
+        if "items" in schema:
+            item = self.subschema(document, schema["items"])
+            out.append("if isinstance(value, list):")
+            out.append("    for index, item in enumerate(value):")
+            out.append(f'        {item}(item, path + "/" + str(index), errors)')
+        out.extend(self.emit_object(document, schema))
+        for key in ("allOf", "anyOf", "oneOf"):
+            if key in schema:
+                branches = [self.subschema(document, sub) for sub in schema[key]]
+                if key == "allOf":
+                    out.extend(f"{branch}(value, path, errors)" for branch in branches)
+                    continue
+                names = self.constant("(" + "".join(f"{b}, " for b in branches) + ")")
+                if key == "anyOf":
+                    out.append(f"if not any(_matches(branch, value) for branch in {names}):")
+                    out.append('    errors.append(path + ": does not match any allowed form")')
+                else:
+                    out.append(f"matched = sum(_matches(branch, value) for branch in {names})")
+                    out.append("if matched != 1:")
+                    out.append(
+                        '    errors.append(path + ": must match exactly one allowed form, matched " + str(matched))'
+                    )
+        if "not" in schema:
+            negated = self.subschema(document, schema["not"])
+            out.append(f"if _matches({negated}, value):")
+            out.append('    errors.append(path + ": matches a disallowed form")')
+        if "if" in schema and "then" in schema:
+            condition = self.subschema(document, schema["if"])
+            then = self.subschema(document, schema["then"])
+            out.append(f"if _matches({condition}, value):")
+            out.append(f"    {then}(value, path, errors)")
+        return out
+
+    def emit_object(self, document: str, schema: Dict[str, Any]) -> List[str]:
+        properties = schema.get("properties", {})
+        required = schema.get("required", [])
+        additional = schema.get("additionalProperties", True)
+        if not properties and not required and additional is True:
+            return []
+        out = ["if isinstance(value, dict):"]
+        for field in required:
+            out.append(f"    if {field!r} not in value:")
+            out.append(f"        errors.append(path + {': missing required property ' + repr(field)!r})")
+        if properties:
+            checks = {field: self.subschema(document, sub) for field, sub in properties.items()}
+            table = self.constant("{" + "".join(f"{f!r}: {c}, " for f, c in checks.items()) + "}")
+            out.append("    for key, item in value.items():")
+            out.append(f"        check = {table}.get(key)")
+            out.append("        if check is not None:")
+            out.append('            check(item, path + "/" + key, errors)')
+            if additional is False:
+                out.append("        else:")
+                out.append('            errors.append(path + ": unexpected property " + repr(key))')
+            elif additional is not True:
+                extra = self.subschema(document, additional)
+                out.append("        else:")
+                out.append(f'            {extra}(item, path + "/" + key, errors)')
+        elif additional is False:
+            out.append("    for key in value:")
+            out.append('        errors.append(path + ": unexpected property " + repr(key))')
+        elif additional is not True:
+            extra = self.subschema(document, additional)
+            out.append("    for key, item in value.items():")
+            out.append(f'        {extra}(item, path + "/" + key, errors)')
+        return out
+
+
+def compile_schemas(documents: Dict[str, Dict[str, Any]]) -> str:
+    """Return Python source defining ``VALIDATORS``: file name -> check function."""
+    return SchemaCompiler(documents).compile()
+
+
+def _fingerprint(documents: Dict[str, Tuple[bytes, Dict[str, Any]]]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(__file__, "rb") as f:
+        digest.update(f.read())
+    for name, (raw, _) in sorted(documents.items()):
+        digest.update(name.encode("utf-8") + b"\0" + hashlib.blake2b(raw).digest())
+    return digest.hexdigest()
+
+
+def _file_digest(path: str) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.blake2b(f.read()).digest()
+    except FileNotFoundError:
+        return None
+
+
+def _import_source(path: str) -> ModuleType:
+    spec = importlib.util.spec_from_file_location("hopscotch_schema_compiled", path)
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class CompiledSchemas:
+    """Per-type validators for block projections.
+
+    ``fingerprint`` identifies the schema files and compiler they came from;
+    the block cache includes it in its keys.
+    """
+
+    def __init__(self, validators: Dict[str, Any], source_path: Optional[str] = None, fingerprint: str = "") -> None:
+        self.validators = validators
+        self.source_path = source_path
+        self.fingerprint = fingerprint
+
+    def validate(self, schema_name: str, instance: Any) -> List[str]:
+        errors: List[str] = []
+        self.validators[schema_name](instance, "", errors)
+        return errors
+
+    def validate_block(self, block: Block) -> List[str]:
+        """Check ``{"type", "id", **fields}`` against ``<type>.schema.json``."""
+        check = self.validators.get(f"{block.block_type}.schema.json")
+        if check is None:
+            return []
+        instance: Dict[str, Any] = {"type": block.block_type, "id": block.block_id}
+        instance.update(block_tree(block))
+        errors: List[str] = []
+        check(instance, "", errors)
+        prefix = f"Line {block.line_start}: {block.block_type} schema: "
+        # Root-level messages start with ": " since their path is empty.
+        return [Message("HS401", prefix + (message[2:] if message.startswith(": ") else message)) for message in errors]
+
+
+_LOADED: Dict[Tuple[str, str], CompiledSchemas] = {}
+
+
+def load_schemas(schema_dir: str = DEFAULT_SCHEMA_DIR, cache_dir: Optional[str] = None) -> CompiledSchemas:
+    """Load the compiled validators, compiling and caching them on first use.
+
+    The generated module is stored as ``<cache_dir>/schemas/<hash>.py``; the
+    hash covers every schema file and this compiler, so editing either yields
+    a fresh module. A cached module is only imported when its digest matches
+    the freshly generated source, so a planted or damaged file is rewritten
+    rather than run. Without ``cache_dir`` the source is compiled in memory.
+    """
+    key = (os.path.abspath(schema_dir), os.path.abspath(cache_dir) if cache_dir else "")
+    loaded = _LOADED.get(key)
+    if loaded is not None:
+        return loaded
+    documents = load_schema_files(schema_dir)
+    fingerprint = _fingerprint(documents)
+    source = compile_schemas({n: d for n, (_, d) in documents.items()})
+    if cache_dir is None:
+        namespace: Dict[str, Any] = {}
+        exec(compile(source, "<schemas>", "exec"), namespace)
+        loaded = CompiledSchemas(namespace["VALIDATORS"], fingerprint=fingerprint)
+    else:
+        directory = os.path.join(cache_dir, "schemas")
+        path = os.path.join(directory, f"compiled_{fingerprint}.py")
+        data = source.encode("utf-8")
+        if _file_digest(path) != hashlib.blake2b(data).digest():
+            os.makedirs(directory, exist_ok=True)
+            partial_path = f"{path}.{os.getpid()}.tmp"
+            with open(partial_path, "wb") as f:
+                f.write(data)
+            # Concurrent workers may race here; replace() keeps the file whole.
+            os.replace(partial_path, path)
+        loaded = CompiledSchemas(_import_source(path).VALIDATORS, path, fingerprint)
+    _LOADED[key] = loaded
+    return loaded
@@ -0,0 +1,208 @@
+"""Validate one large file across a process pool by splitting it at block fences.
+
+The parent maps the file and runs ``scan_spans`` once, which only decodes
+fence lines, to cut it into shards of roughly equal size that each begin at
+an opening fence. That scan also yields every parse diagnostic, exactly as a
+serial run reports them. Each worker maps the file itself, re-scans its
+shard from the recorded offset and line number, and parses and validates
+its blocks; only per-block results travel back.
+
+The parent then runs the cross-shard checks as a reduce step over the shards
+in file order: duplicate ids are detected against one id table, each
+block's own diagnostics are placed after its duplicate-id error, and
+references are resolved against every declared id. Diagnostics therefore
+match a serial run line for line.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import takewhile
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from validate_hopscotch import (
+    ALL_TYPES,
+    NODE_TYPES,
+    Block,
+    FileResult,
+    Message,
+    PendingRef,
+    ValidationResult,
+    check_entry,
+    iter_buffer_lines,
+    load_schemas,
+    map_file,
+    open_cache,
+    read_frontmatter,
+    resolve_refs,
+    scan_entries,
+    scan_spans,
+    validate_file,
+)
+
+if TYPE_CHECKING:
+    import mmap
+
+    from hopscotch_cache import BlockCache
+    from hopscotch_schema import CompiledSchemas
+
+# Shards per worker, so a slow shard does not leave the others idle.
+SHARDS_PER_JOB = 4
+# Files smaller than two shards of this size are validated serially.
+MIN_SHARD_BYTES = 256 * 1024
+
+# (offset of the shard's first opening fence, offset where the next shard begins, line number at the start)
+Shard = Tuple[int, int, int]
+
+
+@dataclass
+class ShardResult:
+    # (id, type, line) of every block in the shard, in order.
+    blocks: List[Tuple[str, str, int]] = field(default_factory=list)
+    # Index into ``blocks`` -> that block's validation and schema errors.
+    errors: Dict[int, List[str]] = field(default_factory=dict)
+    warnings: List[str] = field(default_factory=list)
+    refs: List[PendingRef] = field(default_factory=list)
+    nodes: List[Block] = field(default_factory=list)
+    counts: Dict[str, int] = field(default_factory=lambda: {block_type: 0 for block_type in ALL_TYPES})
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+
+def plan_shards(buffer: "mmap.mmap", count: int) -> Tuple[List[Shard], List[str]]:
+    """Split ``buffer`` into at most ``count`` shards at opening fences, and collect parse errors."""
+    targets = [len(buffer) * number // count for number in range(1, count)]
+    starts = [(0, 1)]
+    parse_errors: List[str] = []
+    for span in scan_spans(buffer, parse_errors):
+        if targets and span.start >= targets[0]:
+            starts.append((span.start, span.line_start))
+            while targets and targets[0] <= span.start:
+                targets.pop(0)
+    ends = [start for start, _ in starts[1:]] + [len(buffer)]
+    return [(start, end, line_no) for (start, line_no), end in zip(starts, ends)], parse_errors
+
+
+def _validate_spans(
+    buffer: "mmap.mmap",
+    shard: Shard,
+    hopscotch_version: Optional[Tuple[int, int, int]],
+    cache: Optional["BlockCache"],
+    schemas: Optional["CompiledSchemas"],
+) -> ShardResult:
+    start, end, line_no = shard
+    result = ShardResult()
+    bodies = bytearray()
+    check_schema = schemas.validate_block if schemas is not None else None
+    # Fence errors are ignored here: the parent's scan already reported them.
+    spans = takewhile(lambda span: span.start < end, scan_spans(buffer, None, start, line_no))
+    for entry in scan_entries(buffer, spans, cache, hopscotch_version, schemas):
+        block = entry[0]
+        result.blocks.append((block.block_id, block.block_type, block.line_start))
+        block_errors, block_warnings = check_entry(
+            entry, hopscotch_version, result.refs, cache, check_schema=check_schema
+        )
+        if block_errors:
+            result.errors[len(result.blocks) - 1] = block_errors
+        result.warnings.extend(block_warnings)
+        if block.block_type in result.counts:
+            result.counts[block.block_type] += 1
+        if block.block_type in NODE_TYPES and block.block_id:
+            block.compact(bodies)
+            result.nodes.append(block)
+    if cache is not None:
+        result.cache_hits = cache.hits
+        result.cache_misses = cache.misses
+    return result
+
+
+def validate_shard(
+    path: str,
+    shard: Shard,
+    hopscotch_version: Optional[Tuple[int, int, int]],
+    cache_dir: Optional[str] = None,
+    schema_dir: Optional[str] = None,
+) -> ShardResult:
+    """Parse and validate the blocks of one shard; run in a worker process."""
+    schemas = load_schemas(schema_dir, cache_dir) if schema_dir else None
+    with open(path, "rb") as f:
+        buffer = map_file(f)
+        if buffer is None:
+            raise OSError(f"Could not map {path}")
+        with buffer:
+            if cache_dir is None:
+                return _validate_spans(buffer, shard, hopscotch_version, None, schemas)
+            with open_cache(cache_dir) as cache:
+                return _validate_spans(buffer, shard, hopscotch_version, cache, schemas)
+
+
+def merge_shards(parse_errors: List[str], shards: Iterable[ShardResult]) -> ValidationResult:
+    """Combine shard results in file order as they arrive, running the cross-shard checks."""
+    errors: List[str] = []
+    warnings: List[str] = []
+    nodes: List[Block] = []
+    refs: List[PendingRef] = []
+    counts = {block_type: 0 for block_type in ALL_TYPES}
+    id_types: Dict[str, str] = {}
+    block_count = cache_hits = cache_misses = 0
+    for shard in shards:
+        for index, (block_id, block_type, line_start) in enumerate(shard.blocks):
+            if block_id:
+                if block_id in id_types:
+                    errors.append(Message("HS301", f"Line {line_start}: Duplicate id '{block_id}'."))
+                else:
+                    id_types[block_id] = block_type
+            block_errors = shard.errors.get(index)
+            if block_errors:
+                errors.extend(block_errors)
+        warnings.extend(shard.warnings)
+        nodes.extend(shard.nodes)
+        refs.extend(shard.refs)
+        for block_type, count in shard.counts.items():
+            counts[block_type] += count
+        block_count += len(shard.blocks)
+        cache_hits += shard.cache_hits
+        cache_misses += shard.cache_misses
+    errors.extend(resolve_refs(refs, id_types))
+    return ValidationResult(parse_errors + errors, warnings, nodes, counts, block_count, cache_hits, cache_misses)
+
+
+def validate_sharded(
+    path: str,
+    jobs: int,
+    cache_dir: Optional[str] = None,
+    schema_dir: Optional[str] = None,
+    slowest: Optional[int] = None,
+    max_errors: Optional[int] = None,
+    shards: Optional[int] = None,
+) -> FileResult:
+    """Validate one file across ``jobs`` processes; the result matches ``validate_file``.
+
+    ``shards`` overrides the number of pieces. Small files, timings and
+    ``max_errors`` (which stops at the first blocks anyway) use the serial path.
+    """
+    if jobs <= 1 or slowest is not None or max_errors is not None:
+        return validate_file(path, cache_dir, schema_dir, slowest, max_errors)
+    try:
+        with open(path, "rb") as f:
+            buffer = map_file(f)
+            if buffer is None:
+                return validate_file(path, cache_dir, schema_dir)
+            with buffer:
+                count = shards or min(jobs * SHARDS_PER_JOB, len(buffer) // MIN_SHARD_BYTES)
+                if count < 2:
+                    return validate_file(path, cache_dir, schema_dir)
+                _, hopscotch_version = read_frontmatter(iter_buffer_lines(buffer))
+                plan, parse_errors = plan_shards(buffer, count)
+    except (OSError, UnicodeDecodeError) as exc:
+        return FileResult(path, None, str(exc))
+    if schema_dir:
+        # Compile once here so workers only import the cached module (with a cache).
+        load_schemas(schema_dir, cache_dir)
+    worker = partial(
+        validate_shard, path, hopscotch_version=hopscotch_version, cache_dir=cache_dir, schema_dir=schema_dir
+    )
+    try:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(plan))) as executor:
+            return FileResult(path, merge_shards(parse_errors, executor.map(worker, plan)))
+    except (OSError, UnicodeDecodeError) as exc:
+        return FileResult(path, None, str(exc))
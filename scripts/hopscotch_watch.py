@@ -0,0 +1,405 @@
+"""Watch mode for validate_hopscotch.py: re-validate files as they are saved.
+
+Each watched file keeps its previous bytes and the span of every block. On a
+change the new bytes are compared with the old ones to find the edited
+region; blocks wholly before it are kept, blocks after it are kept and shifted
+once the scanner re-synchronises with an old block boundary, and only the
+spans in between are re-scanned. A re-scanned block is re-parsed and
+re-validated only if its raw bytes were not seen before, so moving a block
+costs a dictionary lookup.
+
+Per-block results are stored without line numbers, and the cross-block state
+(first declaration of each id, referrers of each id, records with something to
+report) is patched for the replaced blocks only; see ``IncrementalFile``.
+"""
+import os
+import sys
+import time
+from bisect import bisect_left, bisect_right, insort
+from copy import copy
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+from validate_hopscotch import (
+    ALL_TYPES,
+    NODE_TYPES,
+    Block,
+    BlockSpan,
+    FileResult,
+    Message,
+    PendingRef,
+    ValidationResult,
+    check_ref,
+    collect_refs,
+    decode_span,
+    diagnostic_code,
+    expand_paths,
+    iter_buffer_lines,
+    read_frontmatter,
+    report_file,
+    scan_spans,
+    validate_block,
+)
+
+if TYPE_CHECKING:
+    from hopscotch_schema import CompiledSchemas
+
+POLL_INTERVAL = 0.2
+_CHUNK = 1 << 16
+
+
+def _split_line(message: str) -> Tuple[int, str]:
+    """Split ``"Line N: text"`` into ``(N, "text")``, keeping the message's code."""
+    head, _, text = message.partition(": ")
+    return int(head[len("Line ") :]), Message(diagnostic_code(message), text)
+
+
+def _at_line(line: int, message: str) -> str:
+    """Inverse of ``_split_line``."""
+    return Message(diagnostic_code(message), f"Line {line}: {message}")
+
+
+def common_prefix(old: bytes, new: bytes) -> int:
+    """Length of the longest common prefix, compared a chunk at a time."""
+    limit = min(len(old), len(new))
+    lo = 0
+    while lo < limit and old[lo : lo + _CHUNK] == new[lo : lo + _CHUNK]:
+        lo += _CHUNK
+    hi = min(lo + _CHUNK, limit)
+    lo = min(lo, limit)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if old[lo:mid] == new[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def common_suffix(old: bytes, new: bytes, limit: int) -> int:
+    """Length of the longest common suffix, at most ``limit`` bytes."""
+    old_end = len(old)
+    new_end = len(new)
+    lo = 0
+    while lo < limit:
+        step = min(_CHUNK, limit - lo)
+        if old[old_end - lo - step : old_end - lo] != new[new_end - lo - step : new_end - lo]:
+            break
+        lo += step
+    hi = min(lo + _CHUNK, limit)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if old[old_end - mid : old_end - lo] == new[new_end - mid : new_end - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+@dataclass
+class CheckedBlock:
+    """Position-independent results for one block body."""
+
+    block: Block
+    errors: List[str]
+    warnings: List[str]
+    refs: List[Tuple[str, str, str]]
+
+
+@dataclass(eq=False)
+class _Record:
+    span: BlockSpan
+    key: bytes
+    checked: CheckedBlock
+    block: Block
+    duplicate: bool = False
+    ref_errors: List[str] = field(default_factory=list)
+
+
+def _start(record: _Record) -> int:
+    return record.span.start
+
+
+def _end(record: _Record) -> int:
+    return record.span.end
+
+
+class IncrementalFile:
+    """Validation state for one file, updated from its previous contents.
+
+    Besides the per-block results, the cross-block state is kept up to date
+    rather than rebuilt: which record declares each id first, which records
+    reference each id, and the set of records that have anything to report.
+    An edit only revisits the ids declared or referenced by the blocks it
+    replaced, so producing diagnostics costs time proportional to the edit
+    and to the number of diagnostics, not to the size of the file.
+    """
+
+    def __init__(self, path: str, schemas: Optional["CompiledSchemas"] = None) -> None:
+        self.path = path
+        self.schemas = schemas
+        self.result: Optional[ValidationResult] = None
+        self.reparsed = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self.data = b""
+        self.hopscotch_version: Optional[Tuple[int, int, int]] = None
+        self.records: List[_Record] = []
+        self.parse_errors: List[Tuple[int, str]] = []
+        self.checked: Dict[bytes, CheckedBlock] = {}
+        self.declarations: Dict[str, List[_Record]] = {}
+        self.id_types: Dict[str, str] = {}
+        self.referrers: Dict[str, Set[_Record]] = {}
+        self.flagged: Set[_Record] = set()
+        self.nodes: Set[_Record] = set()
+        self.counts = {block_type: 0 for block_type in ALL_TYPES}
+
+    def update(self) -> ValidationResult:
+        """Re-read the file and return its diagnostics, reusing unchanged blocks."""
+        with open(self.path, "rb") as f:
+            return self.update_bytes(f.read())
+
+    def update_bytes(self, data: bytes) -> ValidationResult:
+        """Diagnostics for ``data`` as the file's new contents."""
+        self.reparsed = 0
+        if self.result is not None and data == self.data:
+            return self.result
+        _, hopscotch_version = read_frontmatter(iter_buffer_lines(data))
+        if self.result is None or hopscotch_version != self.hopscotch_version:
+            # Every block's checks depend on the version, so start from scratch.
+            self._reset()
+        self.hopscotch_version = hopscotch_version
+        removed, added = self._splice(data)
+        self.data = data
+        self._relink(removed, added)
+        if len(self.checked) > 2 * len(self.records) + 64:
+            self.checked = {record.key: record.checked for record in self.records}
+        self.result = self._collect()
+        return self.result
+
+    def _splice(self, data: bytes) -> Tuple[List[_Record], List[_Record]]:
+        """Re-scan the edited region; return the records it removed and added."""
+        old = self.data
+        records = self.records
+        prefix = common_prefix(old, data)
+        suffix = common_suffix(old, data, min(len(old), len(data)) - prefix)
+
+        # Keep blocks whose closing line ends strictly inside the common prefix:
+        # the scanner may have peeked one byte past the line break.
+        kept = bisect_right(records, prefix - 1, key=_end)
+        if kept:
+            pos, line_no = records[kept - 1].span.end, records[kept - 1].span.end_line
+        else:
+            pos, line_no = 0, 1
+
+        delta = len(data) - len(old)
+        suffix_start = len(data) - suffix
+        scan_errors: List[str] = []
+        added: List[_Record] = []
+        resume = len(records)
+        tail_errors: List[Tuple[int, str]] = []
+        for span in scan_spans(data, scan_errors, pos, line_no):
+            added.append(self._record(data, span))
+            if span.end - 1 < suffix_start:
+                continue
+            # Inside the common suffix, landing on an old block boundary means
+            # the rest of the scan would repeat the old one, shifted.
+            index = bisect_left(records, span.end - delta, lo=kept, key=_end)
+            if index < len(records) and records[index].span.end == span.end - delta:
+                old_line = records[index].span.end_line
+                line_shift = span.end_line - old_line
+                resume = index + 1
+                for record in records[resume:]:
+                    self._shift(record, delta, line_shift)
+                tail_errors = [
+                    (line + line_shift, text) for line, text in self.parse_errors if line >= old_line
+                ]
+                break
+
+        self.parse_errors = (
+            [(line, text) for line, text in self.parse_errors if line < line_no]
+            + [_split_line(message) for message in scan_errors]
+            + tail_errors
+        )
+        removed = records[kept:resume]
+        self.records = records[:kept] + added + records[resume:]
+        return removed, added
+
+    @staticmethod
+    def _shift(record: _Record, delta: int, line_shift: int) -> None:
+        span = record.span
+        span.start += delta
+        span.body_start += delta
+        span.body_end += delta
+        span.end += delta
+        span.line_start += line_shift
+        span.end_line += line_shift
+        record.block.line_start = span.line_start
+
+    def _record(self, data: bytes, span: BlockSpan) -> _Record:
+        key = data[span.start : span.body_end]
+        checked = self.checked.get(key)
+        if checked is None:
+            checked = self.checked[key] = self._check(data, span)
+        block = copy(checked.block)
+        block.line_start = span.line_start
+        return _Record(span, key, checked, block)
+
+    def _check(self, data: bytes, span: BlockSpan) -> CheckedBlock:
+        self.reparsed += 1
+        block = decode_span(data, span)
+        errors, warnings = validate_block(block, self.hopscotch_version)
+        if self.schemas is not None:
+            errors += self.schemas.validate_block(block)
+        refs: List[PendingRef] = []
+        collect_refs(block, refs)
+        # Checked blocks outlive this edit's buffer; keep only their own body bytes.
+        block.compact()
+        return CheckedBlock(
+            block,
+            [_split_line(message)[1] for message in errors],
+            [_split_line(message)[1] for message in warnings],
+            [ref[1:] for ref in refs],
+        )
+
+    def _relink(self, removed: List[_Record], added: List[_Record]) -> None:
+        """Update declarations, references and flags for a splice."""
+        touched: Set[str] = set()
+        for record in removed:
+            block = record.block
+            if block.block_id:
+                self.declarations[block.block_id].remove(record)
+                touched.add(block.block_id)
+            for _, _, target in record.checked.refs:
+                self.referrers[target].discard(record)
+            self.flagged.discard(record)
+            self.nodes.discard(record)
+            if block.block_type in self.counts:
+                self.counts[block.block_type] -= 1
+        for record in added:
+            block = record.block
+            if block.block_id:
+                insort(self.declarations.setdefault(block.block_id, []), record, key=_start)
+                touched.add(block.block_id)
+            for _, _, target in record.checked.refs:
+                self.referrers.setdefault(target, set()).add(record)
+            if block.block_type in NODE_TYPES and block.block_id:
+                self.nodes.add(record)
+            if block.block_type in self.counts:
+                self.counts[block.block_type] += 1
+
+        stale: Set[_Record] = set(added)
+        for block_id in touched:
+            declared = self.declarations[block_id]
+            if not declared:
+                del self.declarations[block_id]
+            for position, record in enumerate(declared):
+                if record.duplicate != (position > 0):
+                    record.duplicate = position > 0
+                    stale.add(record)
+            block_type = declared[0].block.block_type if declared else None
+            if block_type != self.id_types.get(block_id):
+                if block_type is None:
+                    del self.id_types[block_id]
+                else:
+                    self.id_types[block_id] = block_type
+                stale.update(self.referrers.get(block_id, ()))
+        for record in stale:
+            record.ref_errors = [
+                message
+                for message in (
+                    check_ref(block_type, ref_field, target, self.id_types)
+                    for block_type, ref_field, target in record.checked.refs
+                )
+                if message
+            ]
+            checked = record.checked
+            if record.duplicate or record.ref_errors or checked.errors or checked.warnings:
+                self.flagged.add(record)
+            else:
+                self.flagged.discard(record)
+
+    def _collect(self) -> ValidationResult:
+        errors: List[str] = []
+        warnings: List[str] = []
+        ref_errors: List[str] = []
+        for record in sorted(self.flagged, key=_start):
+            block = record.block
+            line = block.line_start
+            if record.duplicate:
+                errors.append(Message("HS301", f"Line {line}: Duplicate id '{block.block_id}'."))
+            errors.extend(_at_line(line, message) for message in record.checked.errors)
+            warnings.extend(_at_line(line, message) for message in record.checked.warnings)
+            ref_errors.extend(_at_line(line, message) for message in record.ref_errors)
+        parse_errors = [_at_line(line, text) for line, text in self.parse_errors]
+        nodes = [record.block for record in sorted(self.nodes, key=_start)]
+        return ValidationResult(
+            parse_errors + errors + ref_errors, warnings, nodes, dict(self.counts), len(self.records)
+        )
+
+
+def _stamp(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _directory_stamps(patterns: List[str]) -> Dict[str, Optional[Tuple[int, int]]]:
+    """Modification stamps of the directories whose listings decide the watched paths."""
+    stamps: Dict[str, Optional[Tuple[int, int]]] = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, _ in os.walk(pattern):
+                stamps[root] = _stamp(root)
+        else:
+            directory = os.path.dirname(pattern.split("*", 1)[0].split("?", 1)[0].split("[", 1)[0])
+            stamps[directory or "."] = _stamp(directory or ".")
+    return stamps
+
+
+def watch(
+    patterns: List[str],
+    schemas: Optional["CompiledSchemas"] = None,
+    interval: float = POLL_INTERVAL,
+) -> int:
+    """Validate ``patterns``, then poll and re-report each file when it changes."""
+    files: Dict[str, IncrementalFile] = {}
+    stamps: Dict[str, Optional[Tuple[int, int]]] = {}
+    directories = _directory_stamps(patterns)
+    paths = expand_paths(patterns)
+    exit_codes: Dict[str, int] = {}
+    try:
+        while True:
+            for path in paths:
+                stamp = _stamp(path)
+                if path in stamps and stamp == stamps[path]:
+                    continue
+                stamps[path] = stamp
+                state = files.setdefault(path, IncrementalFile(path, schemas))
+                started = time.perf_counter()
+                try:
+                    file_result = FileResult(path, state.update())
+                except (OSError, UnicodeDecodeError) as exc:
+                    file_result = FileResult(path, None, str(exc))
+                    del files[path]
+                elapsed = (time.perf_counter() - started) * 1000
+                print(f"==> {path} <== [{time.strftime('%H:%M:%S')}]")
+                exit_codes[path] = report_file(file_result)
+                if file_result.result is not None:
+                    print(
+                        f"Re-validated {state.reparsed} of {file_result.result.block_count} blocks "
+                        f"in {elapsed:.1f} ms"
+                    )
+                print()
+                sys.stdout.flush()
+                sys.stderr.flush()
+            time.sleep(interval)
+            current = _directory_stamps(patterns)
+            if current != directories:
+                directories = current
+                paths = expand_paths(patterns)
+    except KeyboardInterrupt:
+        return max((exit_codes.get(path, 0) for path in paths), default=0)
@@ -1,9 +1,36 @@
 #!/usr/bin/env python3
-import argparse
+import importlib
+import io
+import json
+import mmap
+import os
 import re
 import sys
+import time
+from bisect import bisect_left, bisect_right
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Set, Tuple
+from functools import partial
+from itertools import chain
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    AbstractSet,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+if TYPE_CHECKING:
+    from hopscotch_cache import BlockCache, CachedBlock
+    from hopscotch_metrics import Metrics
+    from hopscotch_schema import CompiledSchemas
 
 
 NODE_TYPES = {"world", "continent", "region", "destination", "location", "area"}
@@ -40,6 +67,96 @@ RULE_SOURCES = {"srd", "phb", "dmg", "custom", "other"}
 GATE_TYPES = {"passive", "active"}
 ASSET_KINDS = {"image"}
 NPC_DISPOSITIONS = {"enemy", "neutral", "ally"}
+DIALOGUE_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "read_aloud": ("text",),
+    "dm_guidance": ("text",),
+    "conditional": ("conditions",),
+    "likely_actions": ("action", "response"),
+    "mechanics": ("text",),
+}
+# Attachment fields (SPEC §4.5) hold lists of ref objects to ids with these prefixes.
+ATTACHMENT_PREFIXES = {
+    "rules": "rule.",
+    "assets": "asset.",
+    "gates": "gate.",
+    "devices": "device.",
+    "tables": "table.",
+}
+# Fields whose string values are ids of other blocks (SPEC §4.3).
+REF_FIELDS = {
+    "parent",
+    "scope",
+    "location",
+    "from",
+    "to",
+    "leadsTo",
+    "unlocks",
+    "blocks",
+    "participants",
+    "features",
+    "exits",
+    "linkedNPCs",
+    "linkedSecrets",
+    "linkedLoot",
+    "linkedChecks",
+    "linkedCreatures",
+    "linkedPuzzles",
+    "foundInScenes",
+    "linkedEntityId",
+    "reveal",
+    "hasSecret",
+    "checkRef",
+    "gateRef",
+    "hazardRef",
+    "disarm",
+    "navCheck",
+    "toEncounter",
+    "onExpire",
+    "trigger",
+    "when",
+    "onSuccess",
+    "onFail",
+}
+_ID_RE = re.compile(r"[A-Za-z][\w-]*(?:\.[\w-]+)+\Z")
+# Fields that hold either prose or a ref; bare strings only count as refs when
+# their prefix is one of ID_PREFIXES.
+AMBIGUOUS_REF_FIELDS = {"trigger", "when", "onSuccess", "onFail"}
+ID_PREFIXES = NODE_TYPES | ENTITY_TYPES | {"rule"}
+# Block types a reference field may point at; fields not listed accept any type.
+REF_TARGET_TYPES: Dict[str, Set[str]] = {
+    "scope": NODE_TYPES,
+    "location": {"location", "area"},
+    "rules": {"ruleRef"},
+    "assets": {"asset"},
+    "gates": {"gate"},
+    "devices": {"device"},
+    "tables": {"table"},
+    "hasSecret": {"secret"},
+    "checkRef": {"check"},
+    "gateRef": {"gate"},
+    "hazardRef": {"hazard"},
+    "disarm": {"check"},
+    "navCheck": {"check"},
+    "toEncounter": {"encounter"},
+    "onExpire": {"scene", "encounter", "milestone"},
+    "linkedNPCs": {"npc"},
+    "linkedSecrets": {"secret"},
+    "linkedLoot": {"loot"},
+    "linkedChecks": {"check"},
+    "linkedCreatures": {"creature"},
+    "linkedPuzzles": {"puzzle"},
+    "foundInScenes": {"scene"},
+}
+# Per-type overrides of REF_TARGET_TYPES.
+BLOCK_REF_TARGET_TYPES: Dict[Tuple[str, str], Set[str]] = {
+    ("continent", "parent"): {"world"},
+    ("region", "parent"): {"continent"},
+    ("destination", "parent"): {"region"},
+    ("location", "parent"): {"destination"},
+    ("area", "parent"): {"destination", "location"},
+    ("travel", "from"): NODE_TYPES,
+    ("travel", "to"): NODE_TYPES,
+}
 
 ALLOWED_FIELDS: Dict[str, Set[str]] = {
     "world": {"name", "summary", "tags"},
@@ -156,73 +273,1028 @@ ALLOWED_FIELDS: Dict[str, Set[str]] = {
 }
 
 
-@dataclass
+# Minimum hopscotchVersion for block types introduced after v0.2.
+MIN_VERSIONS: Dict[str, Tuple[int, int, int]] = {
+    "scene": (0, 3, 0),
+    "link": (0, 3, 0),
+    "ruleRef": (0, 4, 0),
+    "gate": (0, 4, 0),
+    "table": (0, 4, 0),
+    "device": (0, 4, 0),
+    "asset": (0, 4, 0),
+}
+
+# Per-type validation rules, applied in order. Rule kinds:
+#   ("required", field)                  field key must be present
+#   ("enum", field, values[, required])  non-empty value must be in values
+#   ("ref", field, prefixes[, required]) non-empty value must start with a prefix
+#   ("id", prefix)                       block id must start with prefix
+#   ("refs", field, prefix)              field is a list of ref objects to prefix ids
+#   ("check", func)                      func(block) returns extra errors
+# A truthy ``required`` on enum/ref rules also reports an empty value as missing.
+# "refs" rules for the attachment fields in ALLOWED_FIELDS are appended on compile.
+VALIDATION_RULES: Dict[str, List[tuple]] = {
+    "world": [("required", "name")],
+    "continent": [("required", "name"), ("required", "parent"), ("ref", "parent", ("world.",))],
+    "region": [("required", "name"), ("required", "parent"), ("ref", "parent", ("continent.",))],
+    "destination": [
+        ("required", "name"),
+        ("required", "parent"),
+        ("enum", "kind", DESTINATION_KINDS, True),
+        ("ref", "parent", ("region.",)),
+    ],
+    "location": [
+        ("required", "name"),
+        ("required", "parent"),
+        ("enum", "kind", LOCATION_KINDS, True),
+        ("ref", "parent", ("destination.",)),
+    ],
+    "area": [
+        ("required", "name"),
+        ("required", "parent"),
+        ("ref", "parent", ("destination.", "location."), True),
+    ],
+    "scene": [
+        ("required", "title"),
+        ("required", "summary"),
+        ("ref", "location", ("location.", "area.")),
+        ("check", lambda block: validate_scene_dialogue(block)),
+    ],
+    "link": [
+        ("required", "from"),
+        ("required", "to"),
+        ("required", "linkType"),
+        ("enum", "linkType", LINK_TYPES),
+    ],
+    "encounter": [
+        ("required", "name"),
+        ("required", "scope"),
+        ("required", "encounterType"),
+        ("required", "trigger"),
+        ("enum", "encounterType", ENCOUNTER_TYPES),
+    ],
+    "check": [("required", "skill"), ("required", "dc"), ("required", "onSuccess"), ("required", "onFail")],
+    "hazard": [("required", "name"), ("required", "scope"), ("required", "trigger"), ("required", "effect")],
+    "secret": [("required", "name"), ("required", "scope"), ("required", "text")],
+    "loot": [("required", "name"), ("required", "scope"), ("required", "items")],
+    "creature": [("required", "name"), ("required", "scope"), ("required", "baseRef")],
+    "clock": [
+        ("required", "name"),
+        ("required", "scope"),
+        ("required", "unit"),
+        ("enum", "unit", CLOCK_UNITS),
+    ],
+    "travel": [
+        ("required", "name"),
+        ("required", "from"),
+        ("required", "to"),
+        ("required", "distanceOrDuration"),
+    ],
+    "milestone": [("required", "name"), ("required", "when"), ("required", "effect")],
+    "npc": [("required", "name"), ("required", "scope")],
+    "map": [("required", "name"), ("required", "scope"), ("required", "keys")],
+    "ruleRef": [
+        ("required", "source"),
+        ("required", "name"),
+        ("id", "rule."),
+        ("enum", "source", RULE_SOURCES),
+    ],
+    "gate": [
+        ("required", "type"),
+        ("required", "skill"),
+        ("required", "threshold"),
+        ("id", "gate."),
+        ("enum", "type", GATE_TYPES),
+    ],
+    "table": [("required", "headers"), ("required", "rows"), ("id", "table.")],
+    "device": [("required", "name"), ("id", "device.")],
+    "asset": [
+        ("required", "kind"),
+        ("required", "uri"),
+        ("id", "asset."),
+        ("enum", "kind", ASSET_KINDS),
+    ],
+    "guide": [],
+    "puzzle": [("required", "name"), ("required", "scope")],
+}
+
+# Block type names by type code; types not in the spec are added as they are met.
+_TYPE_NAMES: List[str] = sorted(ALL_TYPES)
+_TYPE_CODES: Dict[str, int] = {name: code for code, name in enumerate(_TYPE_NAMES)}
+
+
+def _type_code(block_type: str) -> int:
+    code = _TYPE_CODES.get(block_type)
+    if code is None:
+        block_type = sys.intern(block_type)
+        code = _TYPE_CODES[block_type] = len(_TYPE_NAMES)
+        _TYPE_NAMES.append(block_type)
+    return code
+
+
+def _block_keys(keys: AbstractSet[str], values: Dict[str, str]) -> AbstractSet[str]:
+    """A view of ``values`` when ``keys`` are exactly its keys, as parsed bodies always are."""
+    view = values.keys()
+    return view if keys == view else set(keys)
+
+
 class Block:
+    """One parsed block, laid out to stay small when whole adventures are held.
+
+    ``block_type`` is the interned name for ``type_code``, ``keys`` is a view
+    of ``values`` unless a different set was given, and the body is a
+    ``[start, end)`` slice of a source buffer (the file's bytes, or the joined
+    body text) that ``content_lines`` decodes on each access. ``compact``
+    empties the ``values`` and ``keys`` slots; they are parsed back from the
+    body the first time they are read.
+    """
+
+    __slots__ = (
+        "block_type",
+        "type_code",
+        "block_id",
+        "keys",
+        "values",
+        "line_start",
+        "tree",
+        "_source",
+        "_start",
+        "_end",
+    )
+
+    def __init__(
+        self,
+        block_type: str,
+        block_id: str,
+        keys: Optional[AbstractSet[str]],
+        values: Optional[Dict[str, str]],
+        line_start: int,
+        content_lines: List[str],
+        tree: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.type_code = code = _type_code(block_type)
+        self.block_type = _TYPE_NAMES[code]
+        self.block_id = block_id
+        if values is not None:
+            self.keys = values.keys() if keys is None else _block_keys(keys, values)
+            self.values = values
+        self.line_start = line_start
+        self.tree = tree
+        text = "".join(content_lines)
+        if text.count("\n") == len(content_lines) and all(line.endswith("\n") for line in content_lines):
+            self._source: Any = text
+            self._start, self._end = 0, len(text)
+        else:
+            # Lines that are not newline-terminated cannot be split back out of one string.
+            self._source = content_lines
+            self._start = self._end = 0
+
+    @classmethod
+    def from_buffer(
+        cls,
+        block_type: str,
+        block_id: str,
+        values: Optional[Dict[str, str]],
+        line_start: int,
+        buffer: Any,
+        start: int,
+        end: int,
+        tree: Optional[Dict[str, Any]] = None,
+        keys: Optional[AbstractSet[str]] = None,
+    ) -> "Block":
+        """A block whose body is ``buffer[start:end]``, UTF-8 bytes or text, without copying it.
+
+        With ``values`` None they are parsed from the body when first read.
+        """
+        block = cls.__new__(cls)
+        block.type_code = code = _type_code(block_type)
+        block.block_type = _TYPE_NAMES[code]
+        block.block_id = block_id
+        if values is not None:
+            block.keys = values.keys() if keys is None else _block_keys(keys, values)
+            block.values = values
+        elif keys is not None:
+            block.keys = keys
+        block.line_start = line_start
+        block.tree = tree
+        block._source = buffer
+        block._start = start
+        block._end = end
+        return block
+
+    def __getattr__(self, name: str) -> Any:
+        # Only reached for a slot that is empty, which for these two means compacted.
+        if name == "values":
+            source = self._source
+            if isinstance(source, list):
+                values = parse_top_level_keys(source)[1]
+            else:
+                body = source[self._start : self._end]
+                values = _top_level_values(body if isinstance(body, str) else body.decode("utf-8"))
+            self.values = values
+            return values
+        if name == "keys":
+            self.keys = keys = self.values.keys()
+            return keys
+        raise AttributeError(f"'Block' object has no attribute '{name}'")
+
+    def _slot(self, name: str) -> Any:
+        """The value in slot ``name``, or None if it is empty, without parsing anything."""
+        try:
+            return object.__getattribute__(self, name)
+        except AttributeError:
+            return None
+
+    @property
+    def content_lines(self) -> List[str]:
+        source = self._source
+        if isinstance(source, list):
+            return source
+        if isinstance(source, str):
+            lines = source[self._start : self._end].split("\n")
+            lines.pop()
+            return [line + "\n" for line in lines]
+        return list(io.StringIO(source[self._start : self._end].decode("utf-8"), newline=None))
+
+    def compact(self, buffer: Optional[Union[bytes, bytearray]] = None) -> None:
+        """Drop the parsed tree and values, and keep the body in ``buffer``.
+
+        For blocks kept once checked: both are parsed back from the body on
+        demand, so they must be what the body parses to, as they are for
+        every block the parsers yield. A body in any other byte buffer (an
+        mmap that is about to close, say) is appended to ``buffer``, a
+        bytearray shared by the blocks of one parse, or without one is
+        copied out on its own.
+        """
+        self.tree = None
+        values = self._slot("values")
+        if values is not None:
+            del self.values
+            if self._slot("keys") == values.keys():
+                del self.keys
+        source = self._source
+        if source is buffer or isinstance(source, (str, list)):
+            return
+        body = source[self._start : self._end]
+        if buffer is None:
+            if type(source) is not bytes or len(body) != len(source):
+                self._source, self._start, self._end = bytes(body), 0, len(body)
+            return
+        self._start = len(buffer)
+        buffer += body
+        self._source = buffer
+        self._end = len(buffer)
+
+    def __copy__(self) -> "Block":
+        block = Block.__new__(Block)
+        for name in Block.__slots__:
+            value = self._slot(name)
+            if value is not None:
+                setattr(block, name, value)
+        return block
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # Type codes are per process and mmaps cannot be pickled: send the name and the body alone.
+        source, start, end = self._source, self._start, self._end
+        if not isinstance(source, (str, list)):
+            source, start, end = bytes(source[start:end]), 0, end - start
+        values = self._slot("values")
+        keys = self._slot("keys")
+        if values is not None and keys == values.keys():
+            keys = None
+        return (
+            Block.from_buffer,
+            (self.block_type, self.block_id, values, self.line_start, source, start, end, self.tree, keys),
+        )
+
+    def __repr__(self) -> str:
+        return f"Block({self.block_type!r}, {self.block_id!r}, line_start={self.line_start})"
+
+
+def block_tree(block: Block) -> Dict[str, Any]:
+    """Return the parsed body of ``block``, parsing it on first use."""
+    if block.tree is None:
+        block.tree = parse_body(block.content_lines)[2]
+    return block.tree
+
+
+def iter_refs(value: Any, field: str = "") -> Iterator[Tuple[str, str]]:
+    """Yield ``(field, id)`` for every reference in a parsed block body.
+
+    References are ``ref`` members of ref objects and id-shaped strings under
+    one of ``REF_FIELDS``; ``field`` is the nearest enclosing field name.
+    """
+    refs: List[Tuple[str, str]] = []
+    if isinstance(value, (dict, list)):
+        _collect_tree_refs(value, field, refs)
+    elif isinstance(value, str) and field in REF_FIELDS and _ID_RE.match(value):
+        refs.append((field, value))
+    return iter(refs)
+
+
+def _collect_tree_refs(value: Any, field: str, refs: List[Tuple[str, str]]) -> None:
+    """``iter_refs`` for a dict or list, checking scalar members in place rather than recursing into them."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key == "ref":
+                if isinstance(item, str) and item:
+                    refs.append((field or key, item))
+            elif isinstance(item, str):
+                if key in REF_FIELDS and _ID_RE.match(item):
+                    refs.append((key, item))
+            elif isinstance(item, (dict, list)):
+                _collect_tree_refs(item, key, refs)
+        return
+    is_ref_field = field in REF_FIELDS
+    for item in value:
+        if isinstance(item, str):
+            if is_ref_field and _ID_RE.match(item):
+                refs.append((field, item))
+        elif isinstance(item, (dict, list)):
+            _collect_tree_refs(item, field, refs)
+
+
+def iter_blocks(lines: Iterable[str], errors: Optional[List[str]] = None) -> Iterator[Block]:
+    """Yield blocks as each closing fence is reached.
+
+    ``lines`` may be any iterable of lines, including an open file, so only the
+    body of the block currently being read is held in memory. Parse errors are
+    appended to ``errors`` when it is given.
+    """
+    for block_type, block_id, line_start, content_lines in _iter_bodies(lines, errors):
+        keys, values, tree = parse_body(content_lines)
+        yield Block(block_type, block_id, keys, values, line_start, content_lines, tree)
+
+
+def _iter_bodies(lines: Iterable[str], errors: Optional[List[str]]) -> Iterator[Tuple[str, str, int, List[str]]]:
+    """Type, id, first line and unparsed body lines of each block, for ``iter_blocks``."""
+    if errors is None:
+        errors = []
+    line_no = 0
+    block_type = ""
+    block_id = ""
+    block_start_line = 0
+    content_lines: Optional[List[str]] = None
+    for line in lines:
+        line_no += 1
+        if content_lines is not None:
+            if not line.startswith("```"):
+                content_lines.append(line)
+                continue
+            yield block_type, block_id, block_start_line, content_lines
+            content_lines = None
+            continue
+        if not line.startswith("```hopscotch:"):
+            continue
+        fence = _parse_fence(line, line_no, errors)
+        if fence is None:
+            continue
+        block_type, block_id = fence
+        block_start_line = line_no
+        content_lines = []
+    if content_lines is not None:
+        errors.append(Message("HS101", f"Line {line_no + 1}: Unterminated hopscotch block for id {block_id}."))
+
+
+_FENCE_ID_RE = re.compile(r"\bid=([^\s]+)")
+
+
+def _parse_fence(line: str, line_no: int, errors: List[str]) -> Optional[Tuple[str, str]]:
+    """Type and id from a ```` ```hopscotch: ```` opener, or None if it opens no block."""
+    info = line.strip()[len("```hopscotch:") :]
+    info_parts = info.split()
+    if not info_parts:
+        errors.append(Message("HS102", f"Line {line_no}: Missing type in hopscotch block info string."))
+        return None
+    match = _FENCE_ID_RE.search(info)
+    if not match:
+        errors.append(Message("HS103", f"Line {line_no}: Missing id in hopscotch block info string."))
+        return info_parts[0], ""
+    return info_parts[0], match.group(1)
+
+
+_OPENER = b"```hopscotch:"
+_FENCE = b"```"
+# A ``\r`` that ends a line by itself; without one, every line break holds exactly one ``\n``.
+_BARE_CR_RE = re.compile(rb"\r(?!\n)")
+
+
+def _find_fence(buffer: "mmap.mmap", fence: bytes, start: int) -> int:
+    """Offset of the next ``fence`` at the start of a line, or -1.
+
+    Like text-mode files, ``\\r``, ``\\n`` and ``\\r\\n`` all end a line (SPEC §3.1).
+    """
+    while True:
+        found = buffer.find(fence, start)
+        if found <= 0 or buffer[found - 1] in b"\r\n":
+            return found
+        start = found + 1
+
+
+def _count_line_breaks(buffer: "mmap.mmap", start: int, end: int, bare_cr: bool) -> int:
+    """Line breaks in ``buffer[start:end]``, counting only ``\\n`` unless the buffer has a bare ``\\r``."""
+    if isinstance(buffer, bytes):
+        # Counted in place; an mmap has no count, so its span is copied once.
+        count = buffer.count(b"\n", start, end)
+        if bare_cr:
+            count += buffer.count(b"\r", start, end) - buffer.count(b"\r\n", start, end)
+        return count
+    data = buffer[start:end]
+    if bare_cr:
+        return data.count(b"\n") + data.count(b"\r") - data.count(b"\r\n")
+    return data.count(b"\n")
+
+
+# Bytes searched at a time for a line break, so a file without ``\n`` is not searched to its end for every line.
+_LINE_WINDOW = 4096
+
+
+def _line_end(buffer: "mmap.mmap", start: int) -> int:
+    """Offset just past the line starting at ``start``, including its line break."""
+    while True:
+        stop = start + _LINE_WINDOW
+        newline = buffer.find(b"\n", start, stop)
+        carriage = buffer.find(b"\r", start, stop if newline < 0 else newline)
+        if carriage >= 0:
+            return carriage + 2 if buffer[carriage + 1 : carriage + 2] == b"\n" else carriage + 1
+        if newline >= 0:
+            return newline + 1
+        if stop >= len(buffer):
+            return len(buffer)
+        start = stop
+
+
+def iter_buffer_lines(buffer: "mmap.mmap") -> Iterator[str]:
+    """Decode ``buffer`` line by line with universal newlines, on demand."""
+    start = 0
+    while start < len(buffer):
+        end = _line_end(buffer, start)
+        yield buffer[start:end].decode("utf-8").rstrip("\r\n") + ("\n" if buffer[end - 1] in b"\r\n" else "")
+        start = end
+
+
+@dataclass
+class BlockSpan:
+    """Where a block sits in a raw buffer: fence, body and the end of its closing line."""
+
     block_type: str
     block_id: str
-    keys: Set[str]
-    values: Dict[str, str]
     line_start: int
-    content_lines: List[str]
+    start: int
+    body_start: int
+    body_end: int
+    end: int
+    end_line: int
+
+
+def scan_spans(
+    buffer: "mmap.mmap", errors: Optional[List[str]] = None, pos: int = 0, line_no: int = 1
+) -> Iterator[BlockSpan]:
+    """Yield the span of each block in ``buffer`` without decoding anything but fences.
+
+    The scanner jumps from one opening fence to the next with ``find`` over
+    the raw UTF-8 bytes, keeping line numbers by counting line breaks in the
+    skipped spans. ``pos`` and ``line_no`` let a caller resume at the start
+    of a line outside any block.
+    """
+    if errors is None:
+        errors = []
+    bare_cr = _BARE_CR_RE.search(buffer, pos) is not None
+    while True:
+        opener = _find_fence(buffer, _OPENER, pos)
+        if opener < 0:
+            return
+        line_no += _count_line_breaks(buffer, pos, opener, bare_cr)
+        body_start = _line_end(buffer, opener)
+        fence = _parse_fence(buffer[opener:body_start].decode("utf-8"), line_no, errors)
+        block_start_line = line_no
+        pos = body_start
+        line_no += 1
+        if fence is None:
+            continue
+        block_type, block_id = fence
+        closer = _find_fence(buffer, _FENCE, body_start)
+        if closer < 0:
+            total = line_no - 1 + _count_line_breaks(buffer, body_start, len(buffer), bare_cr)
+            if body_start < len(buffer) and buffer[-1] not in b"\r\n":
+                total += 1
+            errors.append(Message("HS101", f"Line {total + 1}: Unterminated hopscotch block for id {block_id}."))
+            return
+        line_no += _count_line_breaks(buffer, body_start, closer, bare_cr) + 1
+        pos = _line_end(buffer, closer)
+        yield BlockSpan(block_type, block_id, block_start_line, opener, body_start, closer, pos, line_no)
+
+
+def decode_span(buffer: "mmap.mmap", span: BlockSpan) -> Block:
+    content_lines = list(io.StringIO(buffer[span.body_start : span.body_end].decode("utf-8"), newline=None))
+    keys, values, tree = parse_body(content_lines)
+    return Block.from_buffer(
+        span.block_type, span.block_id, values, span.line_start, buffer, span.body_start, span.body_end, tree, keys
+    )
+
+
+def scan_blocks(buffer: "mmap.mmap", errors: Optional[List[str]] = None) -> Iterator[Block]:
+    """Yield the same blocks as ``iter_blocks`` without walking prose line by line.
+
+    ``buffer`` is the raw UTF-8 file (typically an mmap); only fence lines and
+    block bodies are decoded, and diagnostics and ``line_start`` match the
+    line-based parser exactly.
+    """
+    for span in scan_spans(buffer, errors):
+        yield decode_span(buffer, span)
 
 
 def parse_blocks(lines: List[str]) -> Tuple[List[Block], List[str]]:
-    blocks: List[Block] = []
+    """Every block in ``lines``, as read from a text file, compacted since all of them are held at once.
+
+    The lines are joined into one UTF-8 buffer that every block's body points into.
+    """
     errors: List[str] = []
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-        if line.startswith("```hopscotch:"):
-            block_start_line = i + 1
-            info = line.strip()[len("```hopscotch:") :]
-            info_parts = info.split()
-            if not info_parts:
-                errors.append(f"Line {i+1}: Missing type in hopscotch block info string.")
-                i += 1
-                continue
-            block_type = info_parts[0]
-            match = re.search(r"\bid=([^\s]+)", info)
-            if not match:
-                errors.append(f"Line {i+1}: Missing id in hopscotch block info string.")
-                block_id = ""
-            else:
-                block_id = match.group(1)
-            i += 1
-            content_lines = []
-            while i < len(lines) and not lines[i].startswith("```"):
-                content_lines.append(lines[i])
-                i += 1
-            if i >= len(lines):
-                errors.append(f"Line {i+1}: Unterminated hopscotch block for id {block_id}.")
-                break
-            keys, values = parse_top_level_keys(content_lines)
-            blocks.append(Block(block_type, block_id, keys, values, block_start_line, content_lines))
-        i += 1
+    buffer = "".join(lines).encode("utf-8")
+    blocks: List[Block] = []
+    for block in scan_blocks(buffer, errors):
+        block.compact(buffer)
+        blocks.append(block)
     return blocks, errors
 
 
+def _top_level_entry(line: str) -> Optional[Tuple[str, str]]:
+    if not line.strip():
+        return None
+    if line.startswith(" ") or line.startswith("\t"):
+        return None
+    if ":" not in line:
+        return None
+    key, rest = line.split(":", 1)
+    key = key.strip()
+    if not key:
+        return None
+    # Field names recur in every block; interning keeps one copy of each.
+    return sys.intern(key), _top_level_value(rest)
+
+
+def _top_level_value(rest: str) -> str:
+    value = rest.strip()
+    if value.startswith(("'", '"')) and value.endswith(("'", '"')) and len(value) >= 2:
+        value = value[1:-1]
+    return value
+
+
+# "key: value" on a line that is not indented, as ``_top_level_entry`` reads it.
+_TOP_LEVEL_RE = re.compile(r"^(?![ \t\n])([^:\n]*):(.*)", re.MULTILINE)
+
+
+def _top_level_values(text: str) -> Dict[str, str]:
+    """``parse_top_level_keys(...)[1]`` for a whole body, skipping nested lines in one regex pass."""
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    values: Dict[str, str] = {}
+    for key, rest in _TOP_LEVEL_RE.findall(text):
+        key = key.strip()
+        if key:
+            values[sys.intern(key)] = _top_level_value(rest)
+    return values
+
+
 def parse_top_level_keys(lines: List[str]) -> Tuple[Set[str], Dict[str, str]]:
     keys: Set[str] = set()
     values: Dict[str, str] = {}
     for line in lines:
-        if not line.strip():
-            continue
-        if line.startswith(" ") or line.startswith("\t"):
-            continue
-        if ":" not in line:
-            continue
-        key, rest = line.split(":", 1)
-        key = key.strip()
-        if not key:
-            continue
-        keys.add(key)
-        value = rest.strip()
-        if value.startswith(("'", '"')) and value.endswith(("'", '"')) and len(value) >= 2:
-            value = value[1:-1]
-        values[key] = value
+        entry = _top_level_entry(line)
+        if entry is not None:
+            keys.add(entry[0])
+            values[entry[0]] = entry[1]
     return keys, values
 
 
+_INT_RE = re.compile(r"[-+]?[0-9]+\Z")
+_FLOAT_RE = re.compile(r"[-+]?(?:\.[0-9]+|[0-9]+\.[0-9]*|[0-9]+(?:\.[0-9]*)?[eE][-+]?[0-9]+)\Z")
+_NULLS = {"", "~", "null", "Null", "NULL"}
+_BOOLS = {"true": True, "True": True, "TRUE": True, "false": False, "False": False, "FALSE": False}
+
+
+def _resolve_plain(text: str) -> Any:
+    if text in _NULLS:
+        return None
+    if text in _BOOLS:
+        return _BOOLS[text]
+    if text[0] in "0123456789+-.":
+        if _INT_RE.match(text):
+            return int(text)
+        if _FLOAT_RE.match(text):
+            return float(text)
+    return text
+
+
+def _strip_comment(text: str) -> str:
+    idx = text.find(" #")
+    return text if idx < 0 else text[:idx].rstrip()
+
+
+def _quote_end(text: str, start: int = 0) -> int:
+    """Index of the quote closing the scalar opened at ``text[start]``, or -1."""
+    quote = text[start]
+    i = start
+    while True:
+        i = text.find(quote, i + 1)
+        if i < 0:
+            return -1
+        if quote == "'":
+            if text.startswith("''", i):
+                i += 1
+                continue
+            return i
+        backslash = i
+        while text[backslash - 1] == "\\" and backslash - 1 > start:
+            backslash -= 1
+        if (i - backslash) % 2 == 0:
+            return i
+
+
+def _unquote(text: str) -> str:
+    if text[0] == "'":
+        return text[1:-1].replace("''", "'")
+    if "\\" not in text:
+        # Nothing to decode (and json.loads would only return the same or reject a control character).
+        return text[1:-1]
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text[1:-1]
+
+
+def _is_seq_item(text: str) -> bool:
+    return text == "-" or text.startswith("- ")
+
+
+def _split_key(text: str) -> Optional[Tuple[str, str]]:
+    first = text[0]
+    if first in "\"'":
+        end = _quote_end(text)
+        if end < 0:
+            return None
+        after = text[end + 1 :].lstrip()
+        if not after.startswith(":") or (len(after) > 1 and after[1] not in " \t"):
+            return None
+        return _unquote(text[: end + 1]), after[1:].strip()
+    if first in "[{#":
+        return None
+    idx = text.find(": ")
+    if idx < 0:
+        if text.endswith(":"):
+            return text[:-1].rstrip(), ""
+        return None
+    return text[:idx].rstrip(), text[idx + 2 :].strip()
+
+
+def _flow_value(text: str, i: int, stops: str) -> Tuple[Any, int]:
+    while text[i] == " ":
+        i += 1
+    ch = text[i]
+    if ch == "[":
+        items: List[Any] = []
+        i += 1
+        while True:
+            while text[i] in " ,":
+                i += 1
+            if text[i] == "]":
+                return items, i + 1
+            value, i = _flow_value(text, i, ",]")
+            items.append(value)
+    if ch == "{":
+        mapping: Dict[str, Any] = {}
+        i += 1
+        while True:
+            while text[i] in " ,":
+                i += 1
+            if text[i] == "}":
+                return mapping, i + 1
+            key, i = _flow_value(text, i, ":,}")
+            while text[i] == " ":
+                i += 1
+            value = None
+            if text[i] == ":":
+                value, i = _flow_value(text, i + 1, ",}")
+            mapping[str(key)] = value
+    if ch in "\"'":
+        end = _quote_end(text, i)
+        if end < 0:
+            raise ValueError("unterminated quoted scalar")
+        return _unquote(text[i : end + 1]), end + 1
+    start = i
+    while i < len(text) and text[i] not in stops:
+        i += 1
+    return _resolve_plain(text[start:i].strip()), i
+
+
+class _BodyParser:
+    """Indentation-driven parser for the YAML subset used in block bodies.
+
+    Supports block mappings and sequences, plain/quoted scalars, flow
+    collections, ``|``/``>`` block scalars and comments. Malformed lines are
+    skipped rather than reported; structural rules belong to the validators.
+
+    ``indents`` holds -1 for blank and comment lines and ends with a -2
+    sentinel, so loops stop at the end of the body without a bounds check.
+    """
+
+    def __init__(self, raw: List[str], indents: List[int], texts: List[str]) -> None:
+        self.raw = raw
+        self.indents = indents
+        self.texts = texts
+        self.pos = 0
+        # Unindented lines read by parse_root.
+        self.top_level_lines = 0
+
+    def parse_node(self, indent: int) -> Any:
+        text = self.texts[self.pos]
+        if _is_seq_item(text):
+            return self.parse_seq(indent)
+        split = _split_key(text)
+        if split is not None:
+            return self.parse_map(indent, split)
+        self.pos += 1
+        return self.parse_scalar(text, indent - 1)
+
+    def parse_root(self, values: Dict[str, str]) -> Dict[str, Any]:
+        """``parse_map(0, ...)`` for the root mapping, also putting each top-level key's raw value in ``values``.
+
+        Counts the unindented lines it reads in ``top_level_lines``.
+        """
+        result: Dict[str, Any] = {}
+        indents = self.indents
+        texts = self.texts
+        pos = self.pos
+        while True:
+            while indents[pos] == -1:
+                pos += 1
+            line_indent = indents[pos]
+            if line_indent < 0:
+                self.pos = pos
+                return result
+            self.pos = pos + 1
+            if line_indent == 0:
+                self.top_level_lines += 1
+                text = texts[pos]
+                key, colon, rest = text.partition(":")
+                if key and colon and text[0] not in "-\"'[{" and (not rest or rest[0] == " "):
+                    # "key: value", which _split_key and _top_level_entry read alike.
+                    key = sys.intern(key.rstrip())
+                    rest = rest.strip()
+                    if len(rest) >= 2 and rest[0] in "\"'" and rest[-1] in "\"'":
+                        values[key] = rest[1:-1]
+                    else:
+                        values[key] = rest
+                    if rest and rest[0] not in "#|>\"'[{" and -1 != indents[pos + 1] <= 0:
+                        # A plain scalar on a single line, parse_scalar's common case inline.
+                        idx = rest.find(" #")
+                        result[key] = _resolve_plain(rest if idx < 0 else rest[:idx].rstrip())
+                    else:
+                        result[key] = self.parse_value(rest, 0)
+                else:
+                    entry = _top_level_entry(self.raw[pos])
+                    if entry is not None:
+                        values[entry[0]] = entry[1]
+                    split = None if _is_seq_item(text) else _split_key(text)
+                    if split is not None:
+                        result[split[0]] = self.parse_value(split[1], 0)
+            pos = self.pos
+
+    def parse_map(self, indent: int, split: Optional[Tuple[str, str]]) -> Dict[str, Any]:
+        """The mapping at ``indent`` whose first line splits into ``split``."""
+        result: Dict[str, Any] = {}
+        indents = self.indents
+        texts = self.texts
+        pos = self.pos
+        while True:
+            while indents[pos] == -1:
+                pos += 1
+            line_indent = indents[pos]
+            if line_indent < indent:
+                self.pos = pos
+                return result
+            self.pos = pos + 1
+            if line_indent == indent:
+                if split is None:
+                    text = texts[pos]
+                    if not _is_seq_item(text):
+                        split = _split_key(text)
+                if split is not None:
+                    rest = split[1]
+                    if rest and rest[0] not in "#|>\"'[{" and -1 != indents[pos + 1] <= indent:
+                        # A plain scalar on a single line, parse_scalar's common case inline.
+                        idx = rest.find(" #")
+                        result[split[0]] = _resolve_plain(rest if idx < 0 else rest[:idx].rstrip())
+                    else:
+                        result[split[0]] = self.parse_value(rest, indent)
+                    split = None
+            pos = self.pos
+
+    def parse_seq(self, indent: int) -> List[Any]:
+        items: List[Any] = []
+        indents = self.indents
+        texts = self.texts
+        while True:
+            pos = self.pos
+            while indents[pos] == -1:
+                pos += 1
+            self.pos = pos
+            if indents[pos] < indent:
+                return items
+            text = texts[pos]
+            if indents[pos] > indent:
+                self.pos += 1
+                continue
+            if not _is_seq_item(text):
+                return items
+            after = text[1:].lstrip(" ")
+            if not after:
+                self.pos += 1
+                items.append(self.parse_value("", indent))
+                continue
+            nested_seq = _is_seq_item(after)
+            split = None if nested_seq else _split_key(after)
+            if split is None and not nested_seq:
+                self.pos += 1
+                items.append(self.parse_value(after, indent))
+                continue
+            # Re-read the rest of the line as the first line of a nested node.
+            column = indent + len(text) - len(after)
+            indents[pos] = column
+            texts[pos] = after
+            items.append(self.parse_seq(column) if nested_seq else self.parse_map(column, split))
+
+    def parse_value(self, rest: str, indent: int) -> Any:
+        first = rest[:1]
+        if not first or first == "#":
+            indents = self.indents
+            nxt = self.pos
+            while indents[nxt] == -1:
+                nxt += 1
+            self.pos = nxt
+            if indents[nxt] > indent or (indents[nxt] == indent and _is_seq_item(self.texts[nxt])):
+                return self.parse_node(indents[nxt])
+            return None
+        if first in "|>":
+            return self.parse_block_scalar(rest, indent)
+        if first in "\"'":
+            # A quoted scalar that is the whole value and holds no quotes or escapes reads as its content.
+            if len(rest) >= 2 and rest[-1] == first and rest.count(first) == 2 and "\\" not in rest:
+                return rest[1:-1]
+        return self.parse_scalar(rest, indent)
+
+    def parse_scalar(self, text: str, indent: int) -> Any:
+        first = text[0]
+        if first in "\"'[{":
+            blank_lines = 0
+            while True:
+                if first in "\"'":
+                    end = _quote_end(text)
+                    if end >= 0:
+                        return _unquote(text[: end + 1])
+                else:
+                    try:
+                        return _flow_value(text, 0, "")[0]
+                    except (IndexError, ValueError):
+                        pass
+                if self.pos >= len(self.raw) or 0 <= self.indents[self.pos] <= indent:
+                    return text
+                line = self.raw[self.pos].strip()
+                self.pos += 1
+                if not line:
+                    blank_lines += 1
+                    continue
+                if first == '"' and not blank_lines and text.endswith("\\"):
+                    # Escaped line break: join without folding in a space.
+                    text = text[:-1] + (line[1:] if line.startswith("\\ ") else line)
+                else:
+                    text += ("\n" * blank_lines or " ") + line
+                blank_lines = 0
+        idx = text.find(" #")
+        if idx >= 0:
+            text = text[:idx].rstrip()
+        indents = self.indents
+        pos = self.pos
+        while indents[pos] == -1:
+            pos += 1
+        if indents[pos] <= indent:
+            # The common case: a scalar on a single line.
+            self.pos = pos
+            return _resolve_plain(text)
+        parts = [text]
+        while True:
+            while indents[pos] == -1:
+                pos += 1
+            if indents[pos] <= indent:
+                break
+            parts.append(_strip_comment(self.texts[pos]))
+            pos += 1
+        self.pos = pos
+        return _resolve_plain(" ".join(parts))
+
+    def parse_block_scalar(self, header: str, indent: int) -> str:
+        chomp = ""
+        content_indent = None
+        for ch in header[1:]:
+            if ch in "+-":
+                chomp = ch
+            elif ch.isdigit():
+                content_indent = indent + int(ch)
+            else:
+                break
+        lines: List[str] = []
+        pos = self.pos
+        raw = self.raw
+        while pos < len(raw):
+            line = raw[pos].rstrip("\r\n")
+            stripped = line.lstrip(" ")
+            if not stripped.strip():
+                lines.append("")
+                pos += 1
+                continue
+            line_indent = len(line) - len(stripped)
+            if content_indent is None:
+                if line_indent <= indent:
+                    break
+                content_indent = line_indent
+            elif line_indent < content_indent:
+                break
+            lines.append(line[content_indent:])
+            pos += 1
+        self.pos = pos
+        trailing = 0
+        while lines and not lines[-1]:
+            lines.pop()
+            trailing += 1
+        if header[0] == ">":
+            text = lines[0] if lines else ""
+            for prev, line in zip(lines, lines[1:]):
+                if not line:
+                    text += "\n"
+                elif not prev:
+                    text += line
+                elif prev[0] == " " or line[0] == " ":
+                    text += "\n" + line
+                else:
+                    text += " " + line
+        else:
+            text = "\n".join(lines)
+        if chomp == "-" or not lines:
+            return text
+        if chomp == "+":
+            return text + "\n" * (trailing + 1)
+        return text + "\n"
+
+
+def parse_body(lines: List[str]) -> Tuple[AbstractSet[str], Dict[str, str], Dict[str, Any]]:
+    """Parse a block body in one pass.
+
+    Returns the top-level keys and their raw scalar values (as used by the
+    field rules) together with the body as a tree of dicts, lists and scalars.
+    The keys and values come from the root mapping as it is parsed; only a
+    body whose unindented lines are not all read there (an indented first
+    line, a top-level sequence, a commented-out field) is scanned again.
+    """
+    indents: List[int] = []
+    texts: List[str] = []
+    top_level = 0
+    rescan = False
+    for line in lines:
+        stripped = line.lstrip(" \t")
+        text = stripped.rstrip()
+        if text and text[0] != "#":
+            indent = len(line) - len(stripped)
+            indents.append(indent)
+            texts.append(text)
+            if not indent:
+                top_level += 1
+            continue
+        indents.append(-1)
+        texts.append("")
+        if text and len(line) == len(stripped) and ":" in line:
+            rescan = True
+    indents.append(-2)
+    texts.append("")
+    first = 0
+    while indents[first] == -1:
+        first += 1
+    parser = _BodyParser(lines, indents, texts)
+    parser.pos = first
+    values: Dict[str, str] = {}
+    if indents[first] == 0 and not _is_seq_item(texts[first]) and _split_key(texts[first]) is not None:
+        tree: Any = parser.parse_root(values)
+        rescan = rescan or parser.top_level_lines != top_level
+    else:
+        tree = parser.parse_node(indents[first]) if indents[first] >= 0 else None
+        rescan = rescan or top_level > 0
+    if rescan:
+        return (*parse_top_level_keys(lines), tree if isinstance(tree, dict) else {})
+    return values.keys(), values, tree if isinstance(tree, dict) else {}
+
+
+_VERSION_RE = re.compile(r"(\d+)\.(\d+)\.(\d+)")
+
+
 def parse_frontmatter_version(lines: List[str]) -> Optional[Tuple[int, int, int]]:
     if not lines or not lines[0].startswith("---"):
         return None
@@ -238,104 +1310,210 @@ def parse_frontmatter_version(lines: List[str]) -> Optional[Tuple[int, int, int]
         if key.strip() != "hopscotchVersion":
             continue
         raw = value.strip().strip("'\"")
-        match = re.match(r"^(\d+)\.(\d+)\.(\d+)", raw)
+        match = _VERSION_RE.match(raw)
         if not match:
             return None
         return (int(match.group(1)), int(match.group(2)), int(match.group(3)))
     return None
 
 
+def read_frontmatter(lines: Iterator[str]) -> Tuple[List[str], Optional[Tuple[int, int, int]]]:
+    """Consume the frontmatter from the head of ``lines``.
+
+    Returns the consumed lines, which the caller must still feed to the block
+    parser, along with the declared ``hopscotchVersion``.
+    """
+    head: List[str] = []
+    for line in lines:
+        head.append(line)
+        if len(head) == 1 and not line.startswith("---"):
+            break
+        if len(head) > 1 and line.startswith("---"):
+            break
+    return head, parse_frontmatter_version(head)
+
+
 def validate_scene_dialogue(block: Block) -> List[str]:
     errors: List[str] = []
-    dialogue_indent = None
-    start_idx = 0
-    for idx, raw in enumerate(block.content_lines):
-        line = raw.rstrip("\n")
-        if not line.strip():
+    dialogue = block_tree(block).get("dialogue")
+    if not isinstance(dialogue, list):
+        return errors
+    for item in dialogue:
+        if not isinstance(item, dict):
+            errors.append(Message("HS204", f"Line {block.line_start}: dialogue entries must be mappings."))
             continue
-        indent = len(line) - len(line.lstrip(" "))
-        if line.strip() == "dialogue:":
-            dialogue_indent = indent
-            start_idx = idx + 1
-            break
+        item_type = item.get("type")
+        if item_type is None:
+            errors.append(Message("HS204", f"Line {block.line_start}: dialogue missing required field 'type'."))
+        elif item_type == "conditional":
+            conditions = item.get("conditions")
+            if "conditions" not in item:
+                errors.append(
+                    Message("HS204", f"Line {block.line_start}: conditional dialogue missing conditions.")
+                )
+            elif not (
+                isinstance(conditions, list)
+                and conditions
+                and all(isinstance(c, dict) and "if" in c and "says" in c for c in conditions)
+            ):
+                errors.append(
+                    Message("HS204", f"Line {block.line_start}: conditional dialogue missing if/says.")
+                )
+        elif item_type not in DIALOGUE_FIELDS:
+            errors.append(Message("HS204", f"Line {block.line_start}: dialogue type '{item_type}' is not valid."))
+        else:
+            for field in DIALOGUE_FIELDS[item_type]:
+                if field not in item:
+                    errors.append(
+                        Message(
+                            "HS204", f"Line {block.line_start}: {item_type} dialogue missing required field '{field}'."
+                        )
+                    )
+    return errors
+
+
+BlockCheck = Callable[[Block, List[str]], None]
 
-    if dialogue_indent is None:
-        return errors
 
-    item_indent = None
-    item_type = None
-    conditions_seen = False
-    conditions_indent = None
-    has_if = False
-    has_says = False
-
-    def finalize_item() -> None:
-        nonlocal item_type, conditions_seen, conditions_indent, has_if, has_says
-        if item_type == "conditional":
-            if not conditions_seen:
+def _compile_rule(block_type: str, rule: tuple) -> BlockCheck:
+    kind, *params = rule
+    if kind == "id":
+        (prefix,) = params
+
+        def check_id(block: Block, errors: List[str]) -> None:
+            if not block.block_id.startswith(prefix):
+                message = f"Line {block.line_start}: {block_type} id '{block.block_id}' must start with {prefix}"
+                errors.append(Message("HS206", message))
+
+        return check_id
+    if kind == "check":
+        (func,) = params
+
+        def check_func(block: Block, errors: List[str]) -> None:
+            errors.extend(func(block))
+
+        return check_func
+
+    if kind == "refs":
+        field, prefix = params
+
+        def check_refs(block: Block, errors: List[str]) -> None:
+            if field not in block.keys:
+                return
+            entries = block_tree(block).get(field)
+            if entries is None:
+                return
+            if not isinstance(entries, list):
                 errors.append(
-                    f"Line {block.line_start}: conditional dialogue missing conditions."
+                    Message("HS207", f"Line {block.line_start}: {block_type} {field} must be a list of ref objects.")
                 )
-            elif not (has_if and has_says):
+                return
+            for entry in entries:
+                ref = entry.get("ref") if isinstance(entry, dict) else None
+                if not isinstance(ref, str) or not ref:
+                    message = (
+                        f"Line {block.line_start}: {block_type} {field} entries must be ref objects with a 'ref' id."
+                    )
+                    errors.append(Message("HS207", message))
+                elif not ref.startswith(prefix):
+                    message = f"Line {block.line_start}: {block_type} {field} ref '{ref}' must start with {prefix}"
+                    errors.append(Message("HS207", message))
+
+        return check_refs
+
+    field, allowed, *flags = params
+    required = bool(flags and flags[0])
+    if kind == "enum":
+        # Qualified field names such as linkType already say which type they belong to.
+        label = field if field.startswith(block_type) else f"{block_type} {field}"
+        allowed = frozenset(allowed)
+
+        def check_enum(block: Block, errors: List[str]) -> None:
+            value = block.values.get(field, "")
+            if not value:
+                if required:
+                    errors.append(
+                        Message("HS205", f"Line {block.line_start}: {block_type} missing required field '{field}'.")
+                    )
+            elif value not in allowed:
+                errors.append(Message("HS209", f"Line {block.line_start}: {label} '{value}' is not valid."))
+
+        return check_enum
+    if kind == "ref":
+        prefixes = tuple(allowed)
+        if len(prefixes) == 1:
+            expected = f"must start with {prefixes[0]}"
+        else:
+            expected = "must be a " + " or ".join(f"{prefix}*" for prefix in prefixes) + " id."
+
+        def check_ref(block: Block, errors: List[str]) -> None:
+            value = block.values.get(field, "")
+            if not value:
+                if required:
+                    errors.append(
+                        Message("HS205", f"Line {block.line_start}: {block_type} missing required field '{field}'.")
+                    )
+            elif not value.startswith(prefixes):
+                errors.append(Message("HS208", f"Line {block.line_start}: {block_type} {field} '{value}' {expected}"))
+
+        return check_ref
+    raise ValueError(f"Unknown validation rule kind '{kind}' for type '{block_type}'.")
+
+
+def _compile_required(block_type: str, fields: List[str]) -> BlockCheck:
+    required = frozenset(fields)
+
+    def check_required(block: Block, errors: List[str]) -> None:
+        if required <= block.keys:
+            return
+        for field in fields:
+            if field not in block.keys:
                 errors.append(
-                    f"Line {block.line_start}: conditional dialogue missing if/says."
+                    Message("HS205", f"Line {block.line_start}: {block_type} missing required field '{field}'.")
                 )
-        item_type = None
-        conditions_seen = False
-        conditions_indent = None
-        has_if = False
-        has_says = False
-
-    for idx in range(start_idx, len(block.content_lines)):
-        raw = block.content_lines[idx]
-        line = raw.rstrip("\n")
-        if not line.strip():
-            continue
-        indent = len(line) - len(line.lstrip(" "))
-        stripped = line.strip()
 
-        if indent <= dialogue_indent:
-            finalize_item()
-            break
+    return check_required
 
-        if stripped.startswith("- "):
-            if item_indent is None or indent == item_indent:
-                finalize_item()
-                item_indent = indent
-                item_type = None
-                conditions_seen = False
-                conditions_indent = None
-                has_if = False
-                has_says = False
-                after_dash = stripped[2:].strip()
-                if after_dash.startswith("type:"):
-                    value = after_dash[len("type:") :].strip()
-                    if value == "conditional":
-                        item_type = "conditional"
-                continue
 
-        if item_indent is None:
+def compile_validator(block_type: str, rules: List[tuple]) -> BlockCheck:
+    """Compile a rule list into a single check function for ``block_type``."""
+    checks: List[BlockCheck] = []
+    index = 0
+    while index < len(rules):
+        if rules[index][0] == "required":
+            fields = []
+            while index < len(rules) and rules[index][0] == "required":
+                fields.append(rules[index][1])
+                index += 1
+            checks.append(_compile_required(block_type, fields))
             continue
+        checks.append(_compile_rule(block_type, rules[index]))
+        index += 1
+    if len(checks) == 1:
+        return checks[0]
 
-        if stripped.startswith("type:"):
-            value = stripped[len("type:") :].strip()
-            if value == "conditional":
-                item_type = "conditional"
-            continue
+    def check_all(block: Block, errors: List[str]) -> None:
+        for check in checks:
+            check(block, errors)
 
-        if item_type == "conditional":
-            if stripped == "conditions:":
-                conditions_seen = True
-                conditions_indent = indent
-                continue
-            if conditions_seen and conditions_indent is not None and indent > conditions_indent:
-                if stripped.startswith("- if:") or stripped.startswith("if:"):
-                    has_if = True
-                if stripped.startswith("says:"):
-                    has_says = True
+    return check_all
 
-    finalize_item()
-    return errors
+
+BLOCK_VALIDATORS: Dict[str, BlockCheck] = {
+    block_type: compile_validator(
+        block_type,
+        rules
+        + [
+            ("refs", field, prefix)
+            for field, prefix in ATTACHMENT_PREFIXES.items()
+            if field in ALLOWED_FIELDS[block_type]
+        ],
+    )
+    for block_type, rules in VALIDATION_RULES.items()
+}
+MIN_VERSION_LABELS = {
+    block_type: ".".join(map(str, version)) for block_type, version in MIN_VERSIONS.items()
+}
 
 
 def validate_block(
@@ -343,249 +1521,578 @@ def validate_block(
 ) -> Tuple[List[str], List[str]]:
     errors: List[str] = []
     warnings: List[str] = []
-    if block.block_type not in ALL_TYPES:
-        errors.append(f"Line {block.line_start}: Unknown block type '{block.block_type}'.")
+    block_type = block.block_type
+    validator = BLOCK_VALIDATORS.get(block_type)
+    if validator is None:
+        errors.append(Message("HS201", f"Line {block.line_start}: Unknown block type '{block_type}'."))
         return errors, warnings
-    if hopscotch_version and hopscotch_version < (0, 3, 0):
-        if block.block_type in {"scene", "link"}:
-            errors.append(
-                f"Line {block.line_start}: {block.block_type} blocks require hopscotchVersion >= 0.3.0."
-            )
-    if hopscotch_version and hopscotch_version < (0, 4, 0):
-        if block.block_type in {"ruleRef", "gate", "table", "device", "asset"}:
-            errors.append(
-                f"Line {block.line_start}: {block.block_type} blocks require hopscotchVersion >= 0.4.0."
+    min_version = MIN_VERSIONS.get(block_type)
+    if hopscotch_version and min_version and hopscotch_version < min_version:
+        errors.append(
+            Message(
+                "HS202",
+                f"Line {block.line_start}: {block_type} blocks require hopscotchVersion >= "
+                f"{MIN_VERSION_LABELS[block_type]}.",
             )
+        )
     if not block.block_id:
-        errors.append(f"Line {block.line_start}: Block missing id.")
+        errors.append(Message("HS203", f"Line {block.line_start}: Block missing id."))
 
-    allowed_fields = ALLOWED_FIELDS.get(block.block_type)
+    allowed_fields = ALLOWED_FIELDS.get(block_type)
     if allowed_fields is None:
-        warnings.append(
-            f"Line {block.line_start}: No SPEC field list for type '{block.block_type}'."
-        )
-    else:
-        unknown_keys = sorted(block.keys - allowed_fields)
-        for key in unknown_keys:
+        warnings.append(Message("HS501", f"Line {block.line_start}: No SPEC field list for type '{block_type}'."))
+    elif not block.keys <= allowed_fields:
+        for key in sorted(block.keys - allowed_fields):
             warnings.append(
-                f"Line {block.line_start}: Field '{key}' is not defined in SPEC for "
-                f"type '{block.block_type}'."
-            )
-
-    if block.block_type in NODE_TYPES:
-        if "name" not in block.keys:
-            errors.append(f"Line {block.line_start}: {block.block_type} missing required field 'name'.")
-        if block.block_type != "world" and "parent" not in block.keys:
-            errors.append(
-                f"Line {block.line_start}: {block.block_type} missing required field 'parent'."
-            )
-        if block.block_type == "destination":
-            kind = block.values.get("kind", "")
-            if not kind:
-                errors.append(f"Line {block.line_start}: destination missing required field 'kind'.")
-            elif kind not in DESTINATION_KINDS:
-                errors.append(
-                    f"Line {block.line_start}: destination kind '{kind}' is not valid."
-                )
-        if block.block_type == "location":
-            kind = block.values.get("kind", "")
-            if not kind:
-                errors.append(f"Line {block.line_start}: location missing required field 'kind'.")
-            elif kind not in LOCATION_KINDS:
-                errors.append(
-                    f"Line {block.line_start}: location kind '{kind}' is not valid."
-                )
-        if block.block_type == "area":
-            parent = block.values.get("parent", "")
-            if not parent:
-                errors.append(f"Line {block.line_start}: area missing required field 'parent'.")
-            elif not (parent.startswith("destination.") or parent.startswith("location.")):
-                errors.append(
-                    f"Line {block.line_start}: area parent '{parent}' must be a destination.* or location.* id."
-                )
-        parent_prefixes = {
-            "continent": "world",
-            "region": "continent",
-            "destination": "region",
-            "location": "destination",
-        }
-        expected_parent_prefix = parent_prefixes.get(block.block_type)
-        if expected_parent_prefix:
-            parent = block.values.get("parent", "")
-            if parent and not parent.startswith(f"{expected_parent_prefix}."):
-                errors.append(
-                    f"Line {block.line_start}: {block.block_type} parent '{parent}' must start with "
-                    f"{expected_parent_prefix}."
-                )
-    if block.block_type == "scene":
-        for field in ("title", "summary"):
-            if field not in block.keys:
-                errors.append(
-                    f"Line {block.line_start}: scene missing required field '{field}'."
-                )
-        location = block.values.get("location", "")
-        if location and not (location.startswith("location.") or location.startswith("area.")):
-            errors.append(
-                f"Line {block.line_start}: scene location '{location}' must be a location.* or area.* id."
-            )
-        errors.extend(validate_scene_dialogue(block))
-    if block.block_type == "link":
-        for field in ("from", "to", "linkType"):
-            if field not in block.keys:
-                errors.append(
-                    f"Line {block.line_start}: link missing required field '{field}'."
-                )
-        link_type = block.values.get("linkType", "")
-        if link_type and link_type not in LINK_TYPES:
-            errors.append(
-                f"Line {block.line_start}: linkType '{link_type}' is not valid."
-            )
-    if block.block_type == "encounter":
-        for field in ("name", "scope", "encounterType", "trigger"):
-            if field not in block.keys:
-                errors.append(
-                    f"Line {block.line_start}: encounter missing required field '{field}'."
+                Message(
+                    "HS502",
+                    f"Line {block.line_start}: Field '{key}' is not defined in SPEC for type '{block_type}'.",
                 )
-        enc_type = block.values.get("encounterType", "")
-        if enc_type and enc_type not in ENCOUNTER_TYPES:
-            errors.append(
-                f"Line {block.line_start}: encounterType '{enc_type}' is not valid."
             )
-    if block.block_type == "check":
-        for field in ("skill", "dc", "onSuccess", "onFail"):
-            if field not in block.keys:
-                errors.append(
-                    f"Line {block.line_start}: check missing required field '{field}'."
-                )
-    if block.block_type == "hazard":
-        for field in ("name", "scope", "trigger", "effect"):
-            if field not in block.keys:
-                errors.append(
-                    f"Line {block.line_start}: hazard missing required field '{field}'."
-                )
-    if block.block_type == "secret":
-        for field in ("name", "scope", "text"):
-            if field not in block.keys:
-                errors.append(
-                    f"Line {block.line_start}: secret missing required field '{field}'."
-                )
-    if block.block_type == "loot":
-        for field in ("name", "scope", "items"):
-            if field not in block.keys:
-                errors.append(
-                    f"Line {block.line_start}: loot missing required field '{field}'."
-                )
-    if block.block_type == "creature":
-        for field in ("name", "scope", "baseRef"):
-            if field not in block.keys:
-                errors.append(
-                    f"Line {block.line_start}: creature missing required field '{field}'."
-                )
-    if block.block_type == "clock":
-        for field in ("name", "scope", "unit"):
-            if field not in block.keys:
-                errors.append(
-                    f"Line {block.line_start}: clock missing required field '{field}'."
-                )
-        unit = block.values.get("unit", "")
-        if unit and unit not in CLOCK_UNITS:
-            errors.append(f"Line {block.line_start}: clock unit '{unit}' is not valid.")
-    if block.block_type == "travel":
-        for field in ("name", "from", "to", "distanceOrDuration"):
-            if field not in block.keys:
-                errors.append(
-                    f"Line {block.line_start}: travel missing required field '{field}'."
-                )
-    if block.block_type == "milestone":
-        for field in ("name", "when", "effect"):
-            if field not in block.keys:
-                errors.append(
-                    f"Line {block.line_start}: milestone missing required field '{field}'."
-                )
-    if block.block_type == "npc":
-        for field in ("name", "scope"):
-            if field not in block.keys:
-                errors.append(
-                    f"Line {block.line_start}: npc missing required field '{field}'."
-                )
-    if block.block_type == "map":
-        for field in ("name", "scope", "keys"):
-            if field not in block.keys:
-                errors.append(
-                    f"Line {block.line_start}: map missing required field '{field}'."
-                )
-    if block.block_type == "ruleRef":
-        for field in ("source", "name"):
-            if field not in block.keys:
-                errors.append(
-                    f"Line {block.line_start}: ruleRef missing required field '{field}'."
-                )
-        if not block.block_id.startswith("rule."):
-            errors.append(
-                f"Line {block.line_start}: ruleRef id '{block.block_id}' must start with rule."
-            )
-        source = block.values.get("source", "")
-        if source and source not in RULE_SOURCES:
-            errors.append(
-                f"Line {block.line_start}: ruleRef source '{source}' is not valid."
-            )
-    if block.block_type == "gate":
-        for field in ("type", "skill", "threshold"):
-            if field not in block.keys:
-                errors.append(
-                    f"Line {block.line_start}: gate missing required field '{field}'."
-                )
-        if not block.block_id.startswith("gate."):
-            errors.append(
-                f"Line {block.line_start}: gate id '{block.block_id}' must start with gate."
-            )
-        gate_type = block.values.get("type", "")
-        if gate_type and gate_type not in GATE_TYPES:
-            errors.append(
-                f"Line {block.line_start}: gate type '{gate_type}' is not valid."
-            )
-    if block.block_type == "table":
-        for field in ("headers", "rows"):
-            if field not in block.keys:
-                errors.append(
-                    f"Line {block.line_start}: table missing required field '{field}'."
-                )
-        if not block.block_id.startswith("table."):
-            errors.append(
-                f"Line {block.line_start}: table id '{block.block_id}' must start with table."
-            )
-    if block.block_type == "device":
-        for field in ("name",):
-            if field not in block.keys:
-                errors.append(
-                    f"Line {block.line_start}: device missing required field '{field}'."
-                )
-        if not block.block_id.startswith("device."):
-            errors.append(
-                f"Line {block.line_start}: device id '{block.block_id}' must start with device."
+
+    validator(block, errors)
+    return errors, warnings
+
+
+# (line, block type, field, target id) for one reference awaiting resolution.
+PendingRef = Tuple[int, str, str, str]
+
+
+def collect_refs(block: Block, refs: List[PendingRef]) -> None:
+    """Append the references made by ``block`` to ``refs``."""
+    for field, target in iter_refs(block_tree(block)):
+        if field in AMBIGUOUS_REF_FIELDS and target.split(".", 1)[0] not in ID_PREFIXES:
+            continue
+        refs.append((block.line_start, block.block_type, field, target))
+
+
+def _describe_types(types: Set[str]) -> str:
+    if types == NODE_TYPES:
+        return "a node"
+    return " or ".join(sorted(types))
+
+
+def resolve_refs(refs: Iterable[PendingRef], id_types: Dict[str, str]) -> List[str]:
+    """Report references to missing ids or to blocks of the wrong type.
+
+    ``id_types`` maps every declared id to its block type. Each reference
+    costs one dict lookup, so the pass is linear in the number of refs.
+    """
+    errors: List[str] = []
+    for line, block_type, field, target in refs:
+        message = check_ref(block_type, field, target, id_types)
+        if message:
+            errors.append(Message(message.code, f"Line {line}: {message}"))
+    return errors
+
+
+def check_ref(block_type: str, field: str, target: str, id_types: Dict[str, str]) -> str:
+    """Problem with one reference, without its ``Line N:`` prefix, or ``""``."""
+    target_type = id_types.get(target)
+    if target_type is None:
+        return Message("HS302", f"{block_type} {field} '{target}' does not match any block id.")
+    expected = BLOCK_REF_TARGET_TYPES.get((block_type, field)) or REF_TARGET_TYPES.get(field)
+    if expected is not None and target_type not in expected:
+        return Message(
+            "HS303",
+            f"{block_type} {field} '{target}' has type {target_type}, expected {_describe_types(expected)}.",
+        )
+    return ""
+
+
+def build_id_index(blocks: Iterable[Block]) -> Dict[str, Block]:
+    """Map each id to the first block declaring it."""
+    index: Dict[str, Block] = {}
+    for block in blocks:
+        if block.block_id:
+            index.setdefault(block.block_id, block)
+    return index
+
+
+@dataclass
+class ValidationResult:
+    errors: List[str]
+    warnings: List[str]
+    nodes: List[Block]
+    counts: Dict[str, int]
+    block_count: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    metrics: Optional["Metrics"] = None
+    # Set when validation stopped early at ``max_errors``.
+    truncated: bool = False
+
+
+def validate_stream(
+    lines: Iterable[str],
+    cache: Optional["BlockCache"] = None,
+    schemas: Optional["CompiledSchemas"] = None,
+    metrics: Optional["Metrics"] = None,
+    max_errors: Optional[int] = None,
+    on_diagnostic: Optional[Callable[[str, str], None]] = None,
+) -> ValidationResult:
+    """Parse and validate ``lines`` in a single pass.
+
+    Only node blocks are retained (for the hierarchy summary), so peak memory
+    depends on the largest block rather than on the size of the file; only ids
+    and pending references are kept for the final resolution pass. When a
+    ``cache`` is given, each block's errors, warnings and references are
+    looked up by a hash of its raw body, and only misses are parsed. When
+    ``schemas`` is given, each block's projection is also checked against its
+    JSON Schema. When ``metrics`` is given, time spent in each phase is
+    recorded on it. With ``max_errors``, parsing stops as soon as that many
+    errors are found; references are then left unresolved, since their
+    targets may lie beyond the point where reading stopped.
+    ``on_diagnostic(message, severity)`` is called for each error and warning
+    as soon as it is found, in file order except that reference errors come
+    last, instead of waiting for the result.
+    """
+    line_iter = iter(lines)
+    head, hopscotch_version = read_frontmatter(line_iter)
+    parse_errors: List[str] = []
+    lines = chain(head, line_iter)
+    if cache is None:
+        entries: Iterable[BlockEntry] = ((block, None, None) for block in iter_blocks(lines, parse_errors))
+    else:
+        entries = _stream_entries(lines, parse_errors, cache, hopscotch_version, schemas)
+    return _validate_blocks(
+        entries, parse_errors, hopscotch_version, cache, schemas, metrics, max_errors, on_diagnostic
+    )
+
+
+def validate_buffer(
+    buffer: "mmap.mmap",
+    cache: Optional["BlockCache"] = None,
+    schemas: Optional["CompiledSchemas"] = None,
+    metrics: Optional["Metrics"] = None,
+    max_errors: Optional[int] = None,
+    on_diagnostic: Optional[Callable[[str, str], None]] = None,
+) -> ValidationResult:
+    """Like ``validate_stream`` over a raw UTF-8 buffer, located with ``scan_blocks``."""
+    _, hopscotch_version = read_frontmatter(iter_buffer_lines(buffer))
+    parse_errors: List[str] = []
+    spans = scan_spans(buffer, parse_errors)
+    entries = scan_entries(buffer, spans, cache, hopscotch_version, schemas)
+    return _validate_blocks(
+        entries, parse_errors, hopscotch_version, cache, schemas, metrics, max_errors, on_diagnostic
+    )
+
+
+# A block with its cache key and cached results; both are None without a cache, and the results on a miss.
+BlockEntry = Tuple[Block, Optional[bytes], Optional["CachedBlock"]]
+
+
+def scan_entries(
+    buffer: "mmap.mmap",
+    spans: Iterable[BlockSpan],
+    cache: Optional["BlockCache"],
+    hopscotch_version: Optional[Tuple[int, int, int]],
+    schemas: Optional["CompiledSchemas"] = None,
+) -> Iterator[BlockEntry]:
+    """Look each span up in ``cache`` by its raw bytes and decode only the misses.
+
+    Blocks for cache hits are left unparsed; nothing reads their bodies
+    unless they are kept as hierarchy nodes.
+    """
+    fingerprint = schemas.fingerprint if schemas is not None else ""
+    for span in spans:
+        if cache is None:
+            yield decode_span(buffer, span), None, None
+            continue
+        body = buffer[span.body_start : span.body_end]
+        key = cache.key(span.block_type, span.block_id, body, hopscotch_version, fingerprint)
+        cached = cache.get(key, span.line_start)
+        if cached is None:
+            yield decode_span(buffer, span), key, None
+        else:
+            block = Block.from_buffer(
+                span.block_type, span.block_id, None, span.line_start, buffer, span.body_start, span.body_end
             )
-    if block.block_type == "asset":
-        for field in ("kind", "uri"):
-            if field not in block.keys:
-                errors.append(
-                    f"Line {block.line_start}: asset missing required field '{field}'."
+            yield block, key, cached
+
+
+def _stream_entries(
+    lines: Iterable[str],
+    errors: List[str],
+    cache: "BlockCache",
+    hopscotch_version: Optional[Tuple[int, int, int]],
+    schemas: Optional["CompiledSchemas"],
+) -> Iterator[BlockEntry]:
+    """``scan_entries`` for the line-based parser."""
+    fingerprint = schemas.fingerprint if schemas is not None else ""
+    for block_type, block_id, line_start, content_lines in _iter_bodies(lines, errors):
+        key = cache.key(block_type, block_id, "".join(content_lines).encode("utf-8"), hopscotch_version, fingerprint)
+        cached = cache.get(key, line_start)
+        if cached is None:
+            keys, values, tree = parse_body(content_lines)
+            yield Block(block_type, block_id, keys, values, line_start, content_lines, tree), key, None
+        else:
+            yield Block(block_type, block_id, None, None, line_start, content_lines), key, cached
+
+
+def check_entry(
+    entry: BlockEntry,
+    hopscotch_version: Optional[Tuple[int, int, int]],
+    refs: List[PendingRef],
+    cache: Optional["BlockCache"] = None,
+    check: Callable[..., Tuple[List[str], List[str]]] = validate_block,
+    add_refs: Callable[[Block, List[PendingRef]], None] = collect_refs,
+    check_schema: Optional[Callable[[Block], List[str]]] = None,
+) -> Tuple[List[str], List[str]]:
+    """Errors (schema errors last) and warnings of one block, appending its references to ``refs``.
+
+    Cached results are used as they are; on a miss the block is checked and
+    the results are stored under the entry's key.
+    """
+    block, key, cached = entry
+    if cached is not None:
+        errors, warnings, block_refs = cached
+        refs.extend((block.line_start, block.block_type, field, target) for field, target in block_refs)
+        return errors, warnings
+    first = len(refs)
+    add_refs(block, refs)
+    errors, warnings = check(block, hopscotch_version)
+    if check_schema is not None:
+        errors = errors + check_schema(block)
+    if cache is not None and key is not None:
+        cache.put(key, block.line_start, errors, warnings, [ref[2:] for ref in refs[first:]])
+    return errors, warnings
+
+
+def _validate_blocks(
+    entries: Iterable[BlockEntry],
+    parse_errors: List[str],
+    hopscotch_version: Optional[Tuple[int, int, int]],
+    cache: Optional["BlockCache"],
+    schemas: Optional["CompiledSchemas"],
+    metrics: Optional["Metrics"] = None,
+    max_errors: Optional[int] = None,
+    on_diagnostic: Optional[Callable[[str, str], None]] = None,
+) -> ValidationResult:
+    errors: List[str] = []
+    warnings: List[str] = []
+    nodes: List[Block] = []
+    counts = {block_type: 0 for block_type in ALL_TYPES}
+    id_types: Dict[str, str] = {}
+    refs: List[PendingRef] = []
+    block_count = 0
+    truncated = False
+    # Bodies of the node blocks kept, so they outlive the file's buffer.
+    bodies = bytearray()
+    check: Callable[..., Tuple[List[str], List[str]]] = validate_block
+    add_refs: Callable[[Block, List[PendingRef]], None] = collect_refs
+    check_schema = schemas.validate_block if schemas is not None else None
+    resolve: Callable[..., List[str]] = resolve_refs
+    if metrics is not None:
+        # Instrumented stand-ins; the uninstrumented loop below is unchanged.
+        entries = metrics.timed_blocks(entries)
+        check = metrics.timed_validate(validate_block)
+        add_refs = metrics.timed("refs", collect_refs)
+        resolve = metrics.timed("refs", resolve_refs)
+        if check_schema is not None:
+            check_schema = metrics.timed("schema", check_schema)
+    parse_seen = error_seen = streamed = 0
+
+    def stream(new_warnings: List[str]) -> None:
+        """Pass the errors found since the last call, then ``new_warnings``, to ``on_diagnostic``."""
+        nonlocal parse_seen, error_seen, streamed
+        for message in parse_errors[parse_seen:] + errors[error_seen:]:
+            if max_errors is None or streamed < max_errors:
+                streamed += 1
+                on_diagnostic(message, "error")
+        parse_seen, error_seen = len(parse_errors), len(errors)
+        for message in new_warnings:
+            on_diagnostic(message, "warning")
+
+    for entry in entries:
+        block = entry[0]
+        block_count += 1
+        if block.block_id:
+            if block.block_id in id_types:
+                errors.append(Message("HS301", f"Line {block.line_start}: Duplicate id '{block.block_id}'."))
+            else:
+                id_types[block.block_id] = block.block_type
+        block_errors, block_warnings = check_entry(entry, hopscotch_version, refs, cache, check, add_refs, check_schema)
+        errors.extend(block_errors)
+        warnings.extend(block_warnings)
+        if on_diagnostic is not None:
+            stream(block_warnings)
+        if block.block_type in counts:
+            counts[block.block_type] += 1
+        if block.block_type in NODE_TYPES and block.block_id:
+            block.compact(bodies)
+            nodes.append(block)
+        if max_errors is not None and len(parse_errors) + len(errors) >= max_errors:
+            truncated = True
+            break
+    if not truncated:
+        errors.extend(resolve(refs, id_types))
+    if on_diagnostic is not None:
+        stream([])
+    all_errors = parse_errors + errors
+    if max_errors is not None and len(all_errors) > max_errors:
+        truncated = True
+        del all_errors[max_errors:]
+    result = ValidationResult(all_errors, warnings, nodes, counts, block_count, metrics=metrics, truncated=truncated)
+    if cache is not None:
+        result.cache_hits = cache.hits
+        result.cache_misses = cache.misses
+    return result
+
+
+@dataclass
+class FileResult:
+    path: str
+    result: Optional[ValidationResult]
+    read_error: str = ""
+    # Set when the result's diagnostics were already passed to an ``on_diagnostic`` callback.
+    streamed: bool = False
+
+
+def open_cache(cache_dir: str) -> "BlockCache":
+    """Open the block cache, salted with this file so rule changes invalidate it."""
+    import hashlib
+
+    from hopscotch_cache import BlockCache
+
+    with open(__file__, "rb") as f:
+        salt = hashlib.blake2b(f.read(), digest_size=16).digest()
+    return BlockCache(cache_dir, salt)
+
+
+def load_schemas(schema_dir: str, cache_dir: Optional[str] = None) -> "CompiledSchemas":
+    """Compiled JSON Schema validators, kept under ``cache_dir`` when one is given."""
+    from hopscotch_schema import load_schemas as load_compiled
+
+    return load_compiled(schema_dir, cache_dir)
+
+
+def map_file(f: IO[bytes]) -> Optional["mmap.mmap"]:
+    """Map an open binary file read-only, or return None if it cannot be mapped."""
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+
+def validate_file(
+    path: str,
+    cache_dir: Optional[str] = None,
+    schema_dir: Optional[str] = None,
+    slowest: Optional[int] = None,
+    max_errors: Optional[int] = None,
+    on_diagnostic: Optional[Callable[[str, str], None]] = None,
+) -> FileResult:
+    """Validate one file; ``slowest`` enables timings, keeping that many slow blocks.
+
+    ``on_diagnostic`` is passed on to ``validate_stream``; read errors are only returned.
+    """
+    metrics = None
+    if slowest is not None:
+        from hopscotch_metrics import Metrics
+
+        metrics = Metrics(path, slowest)
+    schemas = load_schemas(schema_dir, cache_dir) if schema_dir else None
+    try:
+        with open(path, "rb") as f:
+            buffer = map_file(f) if metrics is None else metrics.timed("read", map_file)(f)
+            if buffer is None:
+                # Empty files and pipes cannot be mapped; read them as text instead.
+                with open(path, "r", encoding="utf-8") as text:
+                    return _validate_file_contents(
+                        path, text, validate_stream, cache_dir, schemas, metrics, max_errors, on_diagnostic
+                    )
+            with buffer:
+                return _validate_file_contents(
+                    path, buffer, validate_buffer, cache_dir, schemas, metrics, max_errors, on_diagnostic
                 )
-        if not block.block_id.startswith("asset."):
-            errors.append(
-                f"Line {block.line_start}: asset id '{block.block_id}' must start with asset."
-            )
-        kind = block.values.get("kind", "")
-        if kind and kind not in ASSET_KINDS:
-            errors.append(
-                f"Line {block.line_start}: asset kind '{kind}' is not valid."
+    except (OSError, UnicodeDecodeError) as exc:
+        return FileResult(path, None, str(exc))
+
+
+def _validate_file_contents(
+    path: str,
+    contents: Any,
+    validate: Callable[..., ValidationResult],
+    cache_dir: Optional[str],
+    schemas: Optional["CompiledSchemas"],
+    metrics: Optional["Metrics"],
+    max_errors: Optional[int],
+    on_diagnostic: Optional[Callable[[str, str], None]] = None,
+) -> FileResult:
+    streamed = on_diagnostic is not None
+    if cache_dir is None:
+        result = validate(contents, None, schemas, metrics, max_errors, on_diagnostic)
+        return FileResult(path, result, streamed=streamed)
+    with open_cache(cache_dir) as cache:
+        result = validate(contents, cache, schemas, metrics, max_errors, on_diagnostic)
+        return FileResult(path, result, streamed=streamed)
+
+
+# Stable diagnostic codes and what each one means; every check tags the
+# messages it emits with one of these.
+DIAGNOSTIC_CODES: Dict[str, str] = {
+    "HS001": "File could not be read",
+    "HS101": "Unterminated hopscotch block",
+    "HS102": "Missing type in block info string",
+    "HS103": "Missing id in block info string",
+    "HS201": "Unknown block type",
+    "HS202": "Block type requires a newer hopscotchVersion",
+    "HS203": "Block missing id",
+    "HS204": "Invalid scene dialogue entry",
+    "HS205": "Missing required field",
+    "HS206": "Block id has the wrong prefix",
+    "HS207": "Invalid attachment list",
+    "HS208": "Reference field has the wrong prefix",
+    "HS209": "Value is not one of the allowed values",
+    "HS301": "Duplicate id",
+    "HS302": "Reference to an undeclared id",
+    "HS303": "Reference to a block of the wrong type",
+    "HS401": "JSON Schema violation",
+    "HS501": "No SPEC field list for block type",
+    "HS502": "Field not defined in SPEC",
+}
+UNKNOWN_CODE = "HS000"
+_LINE_PREFIX_RE = re.compile(r"Line (\d+): ")
+
+
+class Message(str):
+    """The text of one diagnostic, tagged with the code of the check that emitted it.
+
+    Being a ``str``, it goes wherever messages always went; slicing or
+    concatenating it gives a plain ``str``, so code that rewrites a message
+    builds a new ``Message`` with the same ``code``.
+    """
+
+    code: str
+
+    def __new__(cls, code: str, text: str) -> "Message":
+        message = super().__new__(cls, text)
+        message.code = code
+        return message
+
+    def __getnewargs__(self) -> Tuple[str, str]:  # type: ignore[override]
+        return self.code, str(self)
+
+
+def diagnostic_code(message: str) -> str:
+    """The code ``message`` was emitted with, or ``UNKNOWN_CODE`` for a plain string."""
+    return getattr(message, "code", UNKNOWN_CODE)
+
+
+@dataclass(frozen=True)
+class Diagnostic:
+    """One finding; ``message`` omits the ``Line N:`` prefix that ``str()`` adds back."""
+
+    line: int
+    code: str
+    severity: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"Line {self.line}: {self.message}"
+
+    @classmethod
+    def from_message(cls, text: str, severity: str = "error") -> "Diagnostic":
+        match = _LINE_PREFIX_RE.match(text)
+        line, message = (int(match.group(1)), text[match.end() :]) if match else (0, text)
+        return cls(line, diagnostic_code(text), severity, message)
+
+
+def result_diagnostics(result: ValidationResult) -> List[Diagnostic]:
+    """Errors then warnings of ``result``, in report order."""
+    return [Diagnostic.from_message(text) for text in result.errors] + [
+        Diagnostic.from_message(text, "warning") for text in result.warnings
+    ]
+
+
+def validate_text(
+    text: str, schema_dir: Optional[str] = None, max_errors: Optional[int] = None
+) -> List[Diagnostic]:
+    """Validate a whole document held in memory; newlines may be LF, CRLF or CR."""
+    schemas = load_schemas(schema_dir) if schema_dir else None
+    return result_diagnostics(validate_buffer(text.encode("utf-8"), schemas=schemas, max_errors=max_errors))
+
+
+def validate_path(
+    path: str,
+    cache_dir: Optional[str] = None,
+    schema_dir: Optional[str] = None,
+    max_errors: Optional[int] = None,
+) -> List[Diagnostic]:
+    """Validate one file in-process; raises ``OSError`` if it cannot be read."""
+    file_result = validate_file(path, cache_dir, schema_dir, max_errors=max_errors)
+    if file_result.result is None:
+        raise OSError(f"Could not read {path}: {file_result.read_error}")
+    return result_diagnostics(file_result.result)
+
+
+def expand_paths(patterns: List[str]) -> List[str]:
+    """Expand files, directories and globs into a sorted, de-duplicated list.
+
+    Directories contribute every ``*.hopscotch`` file beneath them. Arguments
+    that match nothing are passed through so the read error is reported.
+    """
+    import glob
+
+    paths: List[str] = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(
+                os.path.join(root, name)
+                for root, _, names in os.walk(pattern)
+                for name in names
+                if name.endswith(".hopscotch")
             )
-    if block.block_type == "puzzle":
-        for field in ("name", "scope"):
-            if field not in block.keys:
-                errors.append(
-                    f"Line {block.line_start}: puzzle missing required field '{field}'."
-                )
-    return errors, warnings
+        elif os.path.exists(pattern) or not glob.has_magic(pattern):
+            matches = [pattern]
+        else:
+            matches = sorted(glob.glob(pattern, recursive=True))
+            if not matches:
+                matches = [pattern]
+        paths.extend(matches)
+    return list(dict.fromkeys(paths))
+
+
+def iter_file_results(
+    paths: List[str],
+    jobs: int,
+    cache_dir: Optional[str] = None,
+    schema_dir: Optional[str] = None,
+    slowest: Optional[int] = None,
+    max_errors: Optional[int] = None,
+    shard: bool = False,
+    on_diagnostic: Optional[Callable[[str, str, str], None]] = None,
+) -> Iterator[FileResult]:
+    """Validate ``paths`` across ``jobs`` processes, yielding results in input order.
+
+    With ``shard``, files are taken one at a time and each is split at block
+    fences across the pool instead. Closing the iterator early cancels files
+    that have not started yet. Files validated in this process call
+    ``on_diagnostic(path, message, severity)`` as each diagnostic is found and
+    are marked ``streamed``; results from worker processes are not.
+    """
+    if shard:
+        from hopscotch_shard import validate_sharded
+
+        for path in paths:
+            yield validate_sharded(path, jobs, cache_dir, schema_dir, slowest, max_errors)
+        return
+    worker = partial(
+        validate_file, cache_dir=cache_dir, schema_dir=schema_dir, slowest=slowest, max_errors=max_errors
+    )
+    if jobs <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield worker(path, on_diagnostic=partial(on_diagnostic, path) if on_diagnostic else None)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunksize = max(1, len(paths) // (jobs * 4))
+    executor = ProcessPoolExecutor(max_workers=jobs)
+    try:
+        yield from executor.map(worker, paths, chunksize=chunksize)
+    finally:
+        executor.shutdown(cancel_futures=True)
 
 
 def summarize_blocks(blocks: List[Block]) -> Dict[str, int]:
@@ -614,84 +2121,174 @@ def build_node_index(blocks: List[Block]) -> Tuple[List[Block], Dict[str, Block]
     return nodes, by_id, children
 
 
-def print_node_hierarchy(blocks: List[Block]) -> Set[str]:
-    nodes, _, children = build_node_index(blocks)
-    printed_ids: Set[str] = set()
+# Node type -> the types its parent may have; worlds are the roots.
+_PARENT_TYPES = {
+    block_type: BLOCK_REF_TARGET_TYPES[(block_type, "parent")] for block_type in NODE_TYPES if block_type != "world"
+}
+# Siblings are listed shallowest type first, so a destination's locations precede its areas.
+_NODE_RANK = {"world": 0, "continent": 1, "region": 2, "destination": 3, "location": 4, "area": 5}
+
+
+def _node_rank(block: Block) -> int:
+    return _NODE_RANK[block.block_type]
+
+
+class HierarchyIndex:
+    """The world > continent > region > destination > location > area tree.
 
-    def print_level(parent_id: str, expected_type: str, indent: int) -> None:
-        for child in children.get(parent_id, []):
-            if child.block_type != expected_type:
+    Placed nodes are numbered in preorder (an Euler tour), and each position
+    records where its subtree ends, so "is X inside Y" is two comparisons and
+    "all areas under Y" is a bisected slice of the area positions. Nodes that
+    cannot be placed are kept in ``orphans`` in file order; those whose parent
+    has the wrong type are also in ``wrong_level``, and parent loops are in
+    ``cycles``. Where an id is declared twice, its children hang off the first
+    declaration that was placed.
+    """
+
+    def __init__(self, blocks: Iterable[Block]) -> None:
+        nodes = [block for block in blocks if block.block_type in NODE_TYPES and block.block_id]
+        first = build_id_index(nodes)
+        children: Dict[str, List[Block]] = {}
+        roots: List[Block] = []
+        self.wrong_level: List[Block] = []
+        # Visiting shallower types first leaves every child list in display order.
+        for block in sorted(nodes, key=_node_rank):
+            if block.block_type == "world":
+                roots.append(block)
                 continue
-            print("\t" * indent + format_block_label(child))
-            printed_ids.add(child.block_id)
-            if expected_type == "continent":
-                print_level(child.block_id, "region", indent + 1)
-            elif expected_type == "region":
-                print_level(child.block_id, "destination", indent + 1)
-            elif expected_type == "destination":
-                print_level(child.block_id, "location", indent + 1)
-                print_level(child.block_id, "area", indent + 1)
-            elif expected_type == "location":
-                print_level(child.block_id, "area", indent + 1)
-
-    worlds = [block for block in nodes if block.block_type == "world"]
-    for world in worlds:
-        print(format_block_label(world))
-        printed_ids.add(world.block_id)
-        print_level(world.block_id, "continent", 1)
-
-    return printed_ids
-
-
-def main() -> int:
-    parser = argparse.ArgumentParser(
-        description="Validate a Hopscotch file against core SPEC requirements."
-    )
-    parser.add_argument("path", help="Path to .hopscotch file")
-    args = parser.parse_args()
+            parent_id = block.values.get("parent", "")
+            parent = first.get(parent_id)
+            if parent is None:
+                continue
+            if parent.block_type in _PARENT_TYPES[block.block_type]:
+                children.setdefault(parent_id, []).append(block)
+            else:
+                self.wrong_level.append(block)
+        self.wrong_level.sort(key=lambda block: block.line_start)
 
-    try:
-        with open(args.path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-    except OSError as exc:
-        print(f"ERROR: Could not read {args.path}: {exc}", file=sys.stderr)
-        return 2
+        # Preorder positions: block, depth, parent position and end of subtree.
+        self.blocks: List[Block] = []
+        self.depths: List[int] = []
+        self._parents: List[int] = []
+        self._end: List[int] = []
+        self._enter: Dict[str, int] = {}
+        self._typed: Optional[Dict[str, Tuple[List[int], List[Block]]]] = None
+        add_block, add_depth, add_parent, add_end = (
+            self.blocks.append,
+            self.depths.append,
+            self._parents.append,
+            self._end.append,
+        )
+        blocks_seen, enter, end = self.blocks, self._enter, self._end
 
-    hopscotch_version = parse_frontmatter_version(lines)
-    blocks, parse_errors = parse_blocks(lines)
-    errors = list(parse_errors)
-    warnings: List[str] = []
+        # Parent types are strictly shallower, so this recurses at most six levels.
+        def visit(block: Block, depth: int, parent: int) -> None:
+            position = len(blocks_seen)
+            add_block(block)
+            add_depth(depth)
+            add_parent(parent)
+            add_end(0)
+            if block.block_id not in enter:
+                enter[block.block_id] = position
+                kids = children.get(block.block_id)
+                if kids:
+                    depth += 1
+                    for child in kids:
+                        visit(child, depth, position)
+            end[position] = len(blocks_seen)
 
-    seen_ids: Set[str] = set()
-    for block in blocks:
-        if block.block_id:
-            if block.block_id in seen_ids:
-                errors.append(
-                    f"Line {block.line_start}: Duplicate id '{block.block_id}'."
-                )
-            seen_ids.add(block.block_id)
-        block_errors, block_warnings = validate_block(block, hopscotch_version)
-        errors.extend(block_errors)
-        warnings.extend(block_warnings)
+        for root in roots:
+            visit(root, 0, -1)
 
-    print("Summary:")
-    printed_ids = print_node_hierarchy(blocks)
-    counts = summarize_blocks(blocks)
-    print("\tentities:")
-    for block_type in sorted(ENTITY_TYPES):
-        print(f"\t\t{block_type}: {counts[block_type]}")
-
-    orphaned = [
-        block
-        for block in blocks
-        if block.block_type in NODE_TYPES
-        and block.block_id
-        and block.block_id not in printed_ids
-    ]
-    if orphaned:
-        print("\torphaned nodes:")
-        for block in orphaned:
-            print("\t\t" + format_block_label(block))
+        self.orphans: List[Block] = []
+        if len(self.blocks) < len(nodes):
+            placed = set(map(id, self.blocks))
+            self.orphans = [block for block in nodes if id(block) not in placed]
+        self.cycles: List[List[Block]] = []
+        # Follow parent links up from each orphan; 1 marks the current walk, 2 a finished one.
+        state: Dict[str, int] = {}
+        for orphan in self.orphans:
+            path: List[Block] = []
+            current: Optional[Block] = first[orphan.block_id]
+            while current is not None and current.block_type != "world" and current.block_id not in state:
+                state[current.block_id] = 1
+                path.append(current)
+                current = first.get(current.values.get("parent", ""))
+            if current is not None and state.get(current.block_id) == 1:
+                self.cycles.append(path[path.index(current) :])
+            for block in path:
+                state[block.block_id] = 2
+
+    def contains(self, ancestor_id: str, block_id: str) -> bool:
+        """Whether ``block_id`` is placed somewhere below ``ancestor_id``."""
+        ancestor = self._enter.get(ancestor_id)
+        position = self._enter.get(block_id)
+        if ancestor is None or position is None:
+            return False
+        return ancestor < position < self._end[ancestor]
+
+    def descendants(self, ancestor_id: str, block_type: Optional[str] = None) -> List[Block]:
+        """Nodes below ``ancestor_id`` in preorder, optionally only those of ``block_type``."""
+        ancestor = self._enter.get(ancestor_id)
+        if ancestor is None:
+            return []
+        end = self._end[ancestor]
+        if block_type is None:
+            return self.blocks[ancestor + 1 : end]
+        if self._typed is None:
+            # block type -> (preorder positions, blocks), built on the first typed query.
+            self._typed = {}
+            for position, block in enumerate(self.blocks):
+                positions, typed = self._typed.setdefault(block.block_type, ([], []))
+                positions.append(position)
+                typed.append(block)
+        positions, typed = self._typed.get(block_type, ([], []))
+        return typed[bisect_right(positions, ancestor) : bisect_left(positions, end)]
+
+    def ancestor(self, block_id: str, block_type: str) -> Optional[Block]:
+        """The enclosing node of ``block_type`` for ``block_id``, if it is placed under one."""
+        position = self._enter.get(block_id)
+        if position is None:
+            return None
+        position = self._parents[position]
+        while position >= 0:
+            block = self.blocks[position]
+            if block.block_type == block_type:
+                return block
+            position = self._parents[position]
+        return None
+
+    def format_lines(self) -> List[str]:
+        return ["\t" * depth + format_block_label(block) for block, depth in zip(self.blocks, self.depths)]
+
+
+def print_node_hierarchy(blocks: List[Block]) -> Set[str]:
+    index = HierarchyIndex(blocks)
+    lines = index.format_lines()
+    if lines:
+        sys.stdout.write("\n".join(lines) + "\n")
+    return {block.block_id for block in index.blocks}
+
+
+def report_file(file_result: FileResult) -> int:
+    if file_result.result is None:
+        print(f"ERROR: Could not read {file_result.path}: {file_result.read_error}", file=sys.stderr)
+        return 2
+    result = file_result.result
+    errors = result.errors
+    warnings = result.warnings
+
+    index = HierarchyIndex(result.nodes)
+    summary = ["Summary:"] + index.format_lines() + ["\tentities:"]
+    summary += [f"\t\t{block_type}: {result.counts[block_type]}" for block_type in sorted(ENTITY_TYPES)]
+    if index.orphans:
+        summary.append("\torphaned nodes:")
+        summary += ["\t\t" + format_block_label(block) for block in index.orphans]
+    if index.cycles:
+        summary.append("\tparent cycles:")
+        for cycle in index.cycles:
+            summary.append("\t\t" + " -> ".join([block.block_id for block in cycle] + [cycle[0].block_id]))
+    sys.stdout.write("\n".join(summary) + "\n")
 
     if errors:
         print("\nValidation errors:", file=sys.stderr)
@@ -712,5 +2309,243 @@ def main() -> int:
     return 0
 
 
+# The v0.5 JSON Schemas shipped alongside this script, used by --schema.
+DEFAULT_SCHEMA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "schemas")
+
+# Subcommands live in sibling modules and are imported only when used.
+SUBCOMMANDS = {
+    "assets": "hopscotch_assets",
+    "bench": "hopscotch_bench",
+    "compile": "hopscotch_compile",
+    "diff": "hopscotch_diff",
+    "export": "hopscotch_export",
+    "generate": "hopscotch_generate",
+    "graph": "hopscotch_graph",
+    "lsp": "hopscotch_lsp",
+    "migrate": "hopscotch_migrate",
+    "query": "hopscotch_query",
+}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in SUBCOMMANDS:
+        return importlib.import_module(SUBCOMMANDS[argv[0]]).main(argv[1:])
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Validate Hopscotch files against core SPEC requirements.",
+        epilog="Subcommands: " + ", ".join(SUBCOMMANDS) + " (run '<subcommand> -h' for help).",
+    )
+    parser.add_argument(
+        "paths", nargs="+", metavar="path", help="Path to a .hopscotch file, a directory, or a glob"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes for batch validation (default: CPU count)",
+    )
+    parser.add_argument(
+        "--shard",
+        action="store_true",
+        help="Split each large file at block fences and validate the pieces across the --jobs processes",
+    )
+    parser.add_argument(
+        "--cache", action="store_true", help="Reuse per-block results from a content-hash cache"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        metavar="DIR",
+        help="Directory of the --cache, which it implies (default: .hopscotch-cache)",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=64,
+        metavar="MB",
+        help="Evict least recently used cache entries beyond this size (default: 64)",
+    )
+    parser.add_argument(
+        "--schema", action="store_true", help="Also check each block against the bundled JSON Schemas"
+    )
+    parser.add_argument(
+        "--schema-dir",
+        metavar="DIR",
+        help="Check against the JSON Schemas in DIR instead of the bundled schemas/; implies --schema",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and re-validate files as they change, re-parsing only edited blocks",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Print wall and CPU time per phase, time per block type and the slowest blocks",
+    )
+    parser.add_argument(
+        "--metrics-json", metavar="PATH", help="Write the timing metrics as a JSON document to PATH"
+    )
+    parser.add_argument(
+        "--slowest", type=int, default=10, metavar="N", help="Slowest blocks to report with timings (default: 10)"
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="Run validation serially under cProfile and dump the stats to PATH (see pstats)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["text", "jsonl", "sarif"],
+        default="text",
+        help="Write diagnostics as text (default), JSON Lines or SARIF 2.1.0 to stdout",
+    )
+    parser.add_argument(
+        "--max-errors",
+        type=int,
+        metavar="N",
+        help="Stop parsing and validating once N errors have been found across all files",
+    )
+    parser.add_argument("--fail-fast", action="store_true", help="Stop at the first error (--max-errors 1)")
+    args = parser.parse_args(argv)
+    cache_dir = args.cache_dir or (".hopscotch-cache" if args.cache else None)
+    schema_dir = args.schema_dir or (DEFAULT_SCHEMA_DIR if args.schema else None)
+    max_errors = 1 if args.fail_fast else args.max_errors
+    if max_errors is not None and max_errors < 1:
+        parser.error("--max-errors must be at least 1")
+
+    schemas = None
+    if schema_dir:
+        from hopscotch_schema import SchemaError
+
+        try:
+            # Compile once up front so workers only import the cached module (with --cache).
+            schemas = load_schemas(schema_dir, cache_dir)
+        except (OSError, SchemaError) as exc:
+            print(f"ERROR: Could not load schemas from {schema_dir}: {exc}", file=sys.stderr)
+            return 2
+
+    if args.watch:
+        from hopscotch_watch import watch
+
+        return watch(args.paths, schemas)
+
+    paths = expand_paths(args.paths)
+    text = args.format == "text"
+    # Human-oriented extras go to stderr when stdout carries JSON.
+    info = sys.stdout if text else sys.stderr
+    writer = None
+    report = report_file
+    on_diagnostic = None
+    streamed_errors = 0
+    if not text:
+        from hopscotch_formats import JsonLinesWriter, SarifWriter
+
+        writer = (JsonLinesWriter if args.format == "jsonl" else SarifWriter)(sys.stdout)
+        report = writer.write_file
+
+        def on_diagnostic(path: str, message: str, severity: str) -> None:
+            # Files validated in this process write each record as it is found, within the error budget.
+            nonlocal streamed_errors
+            if severity == "error":
+                if max_errors is not None and streamed_errors >= max_errors:
+                    return
+                streamed_errors += 1
+            writer.write(path, message, severity)
+    metrics = None
+    slowest = None
+    if args.timings or args.metrics_json:
+        from hopscotch_metrics import Metrics
+
+        metrics = Metrics(slowest=args.slowest)
+        slowest = args.slowest
+        report = metrics.timed("report", report)
+    profiler = None
+    if args.profile:
+        import cProfile
+
+        # Worker processes are invisible to the profiler, so stay in-process.
+        args.jobs = 1
+        profiler = cProfile.Profile()
+        profiler.enable()
+    started = time.perf_counter()
+    exit_code = 0
+    file_count = 0
+    block_count = 0
+    cache_hits = 0
+    cache_misses = 0
+    error_count = 0
+    sys.stdout.flush()
+    results = iter_file_results(
+        paths, args.jobs, cache_dir, schema_dir, slowest, max_errors, args.shard, on_diagnostic
+    )
+    for file_result in results:
+        result = file_result.result
+        if max_errors is not None and result is not None and len(result.errors) > max_errors - error_count:
+            # Each file stops at max_errors on its own; trim to what is left of the budget.
+            del result.errors[max_errors - error_count :]
+            result.truncated = True
+        if len(paths) > 1 and text:
+            print(f"==> {file_result.path} <==")
+        exit_code = max(exit_code, report(file_result))
+        file_count += 1
+        if result is not None:
+            block_count += result.block_count
+            cache_hits += result.cache_hits
+            cache_misses += result.cache_misses
+            error_count += len(result.errors)
+            if metrics is not None and result.metrics is not None:
+                metrics.merge(result.metrics)
+        else:
+            error_count += 1
+        if len(paths) > 1 and text:
+            print()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        if max_errors is not None and error_count >= max_errors:
+            break
+    results.close()
+    if writer is not None:
+        writer.close()
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    if max_errors is not None and error_count >= max_errors:
+        skipped = len(paths) - file_count
+        print(
+            f"Stopped at the --max-errors limit of {max_errors}"
+            + (f"; {skipped} files were not checked." if skipped else "."),
+            file=sys.stderr,
+        )
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+    if cache_dir:
+        with open_cache(cache_dir) as cache:
+            cache.evict(args.cache_size * 1024 * 1024)
+        print(f"Cache: {cache_hits} hits, {cache_misses} misses", file=info)
+    if len(paths) > 1:
+        print(
+            f"Validated {file_count} files ({block_count} blocks) in {elapsed:.2f}s: "
+            f"{file_count / elapsed:.1f} files/sec, {block_count / elapsed:.1f} blocks/sec",
+            file=info,
+        )
+    if metrics is not None:
+        if args.timings:
+            print("\n".join(metrics.format_table()), file=info)
+        if args.metrics_json:
+            try:
+                with open(args.metrics_json, "w", encoding="utf-8") as f:
+                    json.dump(metrics.document(elapsed), f, indent=2)
+                    f.write("\n")
+            except OSError as exc:
+                print(f"ERROR: Could not write {args.metrics_json}: {exc}", file=sys.stderr)
+                return 2
+    return exit_code
+
+
 if __name__ == "__main__":
+    # Let subcommand modules share this module instead of importing a second copy.
+    sys.modules.setdefault("validate_hopscotch", sys.modules[__name__])
     raise SystemExit(main())
@@ -0,0 +1,117 @@
+import io
+import json
+import os
+import sys
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+import unittest
+
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+import hopscotch_assets  # noqa: E402
+
+ADVENTURE = """\
+```hopscotch:asset id=asset.map.cave
+kind: image
+uri: assets/maps/cave.png
+```
+
+```hopscotch:asset id=asset.map.cave-copy
+kind: image
+uri: ./assets/maps/../maps/cave.png
+```
+
+```hopscotch:asset id=asset.token
+kind: image
+uri: assets/token.png
+```
+
+```hopscotch:asset id=asset.remote
+kind: image
+uri: https://example.com/map.png
+```
+
+```hopscotch:scene id=scene.s
+title: S
+assets:
+  - ref: asset.map.cave
+  - ref: asset.map.cave-copy
+  - ref: asset.missing
+```
+
+```hopscotch:npc id=npc.n
+name: N
+assets: [{ref: asset.token}]
+```
+"""
+
+
+class AssetTests(unittest.TestCase):
+    def test_collector_dedupes_by_resolved_path(self) -> None:
+        collector = hopscotch_assets.AssetCollector()
+        path = os.path.join("adv", "a.hopscotch")
+        collector.add_file(path, ADVENTURE.encode("utf-8"))
+        entries = list(collector.entries.values())
+        uris = [entry.uri for entry in entries]
+        self.assertEqual(uris, ["assets/maps/cave.png", "assets/token.png", "https://example.com/map.png"])
+        cave = entries[0]
+        self.assertEqual(cave.path, os.path.join("adv", "assets", "maps", "cave.png"))
+        self.assertEqual([item["id"] for item in cave.declarations], ["asset.map.cave", "asset.map.cave-copy"])
+        self.assertEqual([item["id"] for item in cave.referrers], ["scene.s"])
+        self.assertIsNone(entries[2].path)
+        self.assertEqual(len(collector.problems), 1)
+        self.assertIn("undeclared asset 'asset.missing'", collector.problems[0])
+
+    def test_resolve_uri(self) -> None:
+        self.assertIsNone(hopscotch_assets.resolve_uri("https://example.com/a.png", "adv"))
+        self.assertEqual(hopscotch_assets.resolve_uri("a%20b.png", "adv"), os.path.join("adv", "a b.png"))
+        self.assertEqual(hopscotch_assets.resolve_uri("file:///tmp/a.png", "adv"), os.path.normpath("/tmp/a.png"))
+
+    def test_main_reuses_hashes_of_unchanged_files(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            adventure = Path(tmp) / "a.hopscotch"
+            adventure.write_text(ADVENTURE, encoding="utf-8")
+            (Path(tmp) / "assets" / "maps").mkdir(parents=True)
+            (Path(tmp) / "assets" / "maps" / "cave.png").write_bytes(b"cave")
+            token = Path(tmp) / "assets" / "token.png"
+            token.write_bytes(b"token")
+            manifest = str(Path(tmp) / "manifest.json")
+
+            def run() -> str:
+                out = io.StringIO()
+                with redirect_stdout(out):
+                    self.assertEqual(hopscotch_assets.main(["-o", manifest, str(adventure)]), 1)
+                return out.getvalue().splitlines()[-1]
+
+            self.assertIn("3 assets (2 local, 0 missing, 1 remote); 2 hashed, 0 unchanged.", run())
+            self.assertIn("0 hashed, 2 unchanged.", run())
+            first = json.loads(Path(manifest).read_text(encoding="utf-8"))
+            token.write_bytes(b"new token")
+            os.utime(token, ns=(0, 1))
+            self.assertIn("1 hashed, 1 unchanged.", run())
+            second = json.loads(Path(manifest).read_text(encoding="utf-8"))
+            self.assertEqual(first["assets"][0]["blake2b"], second["assets"][0]["blake2b"])
+            self.assertNotEqual(first["assets"][1]["blake2b"], second["assets"][1]["blake2b"])
+            self.assertEqual(second["assets"][1]["size"], len(b"new token"))
+
+            token.unlink()
+            out = io.StringIO()
+            with redirect_stdout(out):
+                self.assertEqual(hopscotch_assets.main(["-o", manifest, str(adventure)]), 1)
+            self.assertIn("asset.token uri 'assets/token.png' does not name a readable file", out.getvalue())
+            self.assertIn("(1 local, 1 missing, 1 remote)", out.getvalue())
+
+    def test_main_reports_undecodable_file(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            bad = Path(tmp) / "bad.hopscotch"
+            bad.write_bytes(b"```hopscotch:asset id=asset.a\nuri: \xff.png\n```\n")
+            err = io.StringIO()
+            with redirect_stderr(err):
+                self.assertEqual(hopscotch_assets.main(["-o", str(Path(tmp) / "m.json"), str(bad)]), 2)
+            self.assertIn(f"ERROR: Could not read {bad}: 'utf-8' codec", err.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
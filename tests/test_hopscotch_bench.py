@@ -0,0 +1,37 @@
+import copy
+import sys
+from pathlib import Path
+import unittest
+
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+import hopscotch_bench  # noqa: E402
+
+
+class BenchTests(unittest.TestCase):
+    def test_measure_times_every_phase(self) -> None:
+        run = hopscotch_bench.measure(200, seed=0, repeat=1)
+        self.assertEqual(list(run["phases"]), hopscotch_bench.PHASES)
+        self.assertEqual(run["phases"]["parse_blocks"]["items"], 200)
+        self.assertTrue(all(stats["opsPerSec"] > 0 for stats in run["phases"].values()))
+
+    def test_regressions_beyond_threshold_are_reported(self) -> None:
+        phases = {phase: {"items": 100, "seconds": 0.1, "opsPerSec": 1000.0} for phase in hopscotch_bench.PHASES}
+        baseline = {"seed": 0, "sizes": {"1000": {"peakRssKb": 10240, "phases": phases}}}
+        current = copy.deepcopy(baseline)
+        current["sizes"]["1000"]["phases"]["validate_block"]["opsPerSec"] = 870.0
+        self.assertEqual(hopscotch_bench.compare_results(current, baseline, 0.15), [])
+        current["sizes"]["1000"]["phases"]["validate_block"]["opsPerSec"] = 800.0
+        current["sizes"]["1000"]["peakRssKb"] = 20480
+        self.assertEqual(
+            hopscotch_bench.compare_results(current, baseline, 0.15),
+            [
+                "1000 blocks: validate_block 800.0 ops/sec is 20.0% below baseline 1000.0.",
+                "1000 blocks: peak RSS 20.0 MB is 100.0% above baseline 10.0 MB.",
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
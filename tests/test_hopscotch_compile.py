@@ -0,0 +1,94 @@
+import io
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+import unittest
+from unittest import mock
+
+
+ROOT = Path(__file__).resolve().parents[1]
+EXAMPLE = ROOT / "examples" / "frozen-sick.hopscotch"
+sys.path.insert(0, str(ROOT / "scripts"))
+import hopscotch_compile  # noqa: E402
+import validate_hopscotch  # noqa: E402
+
+
+class CompileTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name) / EXAMPLE.name
+        shutil.copyfile(EXAMPLE, self.path)
+        self.sidecar = Path(hopscotch_compile.sidecar_path(str(self.path)))
+
+    def test_lookup_matches_parsed_blocks(self) -> None:
+        self.assertEqual(hopscotch_compile.main([str(self.path)]), 0)
+        source = self.path.read_bytes()
+        blocks = list(validate_hopscotch.scan_blocks(source))
+        with hopscotch_compile.CompiledIndex(str(self.sidecar)) as index:
+            self.assertEqual(len(index), len(blocks))
+            for block in blocks:
+                entry = index.lookup(block.block_id)
+                self.assertEqual(
+                    (entry.block_type, entry.block_id, entry.line_start, entry.values),
+                    (block.block_type, block.block_id, block.line_start, block.values),
+                )
+                self.assertEqual(entry.to_block(source).content_lines, block.content_lines)
+            self.assertIsNone(index.lookup("scene.nowhere"))
+            world = index.lookup("world.exandria")
+            self.assertTrue(source[world.start : world.body_start].startswith(b"```hopscotch:world id=world.exandria"))
+
+    def test_stale_and_corrupt_sidecars_are_rebuilt(self) -> None:
+        self.assertEqual(hopscotch_compile.compile_file(str(self.path))[0], True)
+        self.assertEqual(hopscotch_compile.compile_file(str(self.path))[0], False)
+
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write("\n```hopscotch:npc id=npc.late\nname: Late\nscope: world.exandria\n```\n")
+        with hopscotch_compile.load_index(str(self.path)) as index:
+            self.assertEqual(index.lookup("npc.late").values, {"name": "Late", "scope": "world.exandria"})
+
+        self.sidecar.write_bytes(self.sidecar.read_bytes()[:100])
+        with self.assertRaises(hopscotch_compile.SidecarError):
+            hopscotch_compile.CompiledIndex(str(self.sidecar))
+        with hopscotch_compile.load_index(str(self.path)) as index:
+            self.assertEqual(index.lookup("npc.late").block_type, "npc")
+
+    def test_unchanged_stamp_skips_hashing_the_source(self) -> None:
+        hopscotch_compile.compile_file(str(self.path))
+        digest = hopscotch_compile.source_digest
+        with mock.patch.object(hopscotch_compile, "source_digest", side_effect=digest) as hashed:
+            self.assertEqual(hopscotch_compile.compile_file(str(self.path))[0], False)
+            self.assertEqual(hashed.call_count, 0)
+
+            mtime_ns = self.path.stat().st_mtime_ns + 10**9
+            os.utime(self.path, ns=(mtime_ns, mtime_ns))
+            self.assertEqual(hopscotch_compile.compile_file(str(self.path))[0], False)
+            self.assertEqual(hashed.call_count, 1)
+            self.assertEqual(hopscotch_compile.compile_file(str(self.path))[0], False)
+            self.assertEqual(hashed.call_count, 1)
+        with hopscotch_compile.CompiledIndex(str(self.sidecar)) as index:
+            self.assertEqual(index.source_mtime_ns, mtime_ns)
+
+    def test_parse_errors_are_reported_while_sidecar_is_current(self) -> None:
+        self.path.write_text("```hopscotch:npc id=npc.a\nname: A\n```\n```hopscotch:npc\nname: B\n", encoding="utf-8")
+        first = hopscotch_compile.compile_file(str(self.path))
+        second = hopscotch_compile.compile_file(str(self.path))
+        self.assertEqual((first[0], second[0]), (True, False))
+        self.assertTrue(first[2])
+        self.assertEqual(second[2], first[2])
+        with redirect_stderr(io.StringIO()), redirect_stdout(io.StringIO()):
+            self.assertEqual(hopscotch_compile.main([str(self.path)]), 1)
+
+    def test_main_reports_undecodable_file(self) -> None:
+        self.path.write_bytes(b"```hopscotch:npc id=npc.a\nname: \xff\n```\n")
+        err = io.StringIO()
+        with redirect_stderr(err), redirect_stdout(io.StringIO()):
+            self.assertEqual(hopscotch_compile.main([str(self.path)]), 2)
+        self.assertIn(f"ERROR: Could not read {self.path}: 'utf-8' codec", err.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import sys
+from pathlib import Path
+import unittest
+
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+import hopscotch_conditions  # noqa: E402
+import validate_hopscotch  # noqa: E402
+
+SCENES = """\
+```hopscotch:scene id=scene.vault
+title: Vault
+summary: The party reaches the vault.
+conditions:
+  enterIf:
+    - hasSecret: secret.vault
+    - clockAtLeast:
+        id: clock.frost
+        track: village
+        days: 2
+  skipIf:
+    - hasSecret: secret.looted
+dialogue:
+  - type: conditional
+    conditions:
+      - if: party.polite && !party.armed || party.bribed
+        says: Come in.
+      - if: party.polite && && party.armed
+        says: Broken.
+```
+
+```hopscotch:scene id=scene.road
+title: Road
+summary: Open to everyone.
+```
+"""
+
+
+class ConditionTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.errors = []
+        blocks = validate_hopscotch.scan_blocks(SCENES.encode("utf-8"))
+        self.conditions = hopscotch_conditions.compile_scene_conditions(blocks, self.errors)
+        self.flags = self.conditions.flags
+
+    def test_scene_conditions_compile_and_evaluate(self) -> None:
+        self.assertEqual(
+            self.conditions.keys,
+            [("scene.vault", "conditions"), ("scene.vault", "dialogue[0].conditions[0]"), ("scene.road", "conditions")],
+        )
+        self.assertEqual(len(self.errors), 1)
+        self.assertIn("scene.vault dialogue[0].conditions[1]: Invalid condition operand ''", self.errors[0])
+
+        frost = {("clock.frost", "village"): 3}
+        self.assertEqual(
+            self.conditions.live(self.flags.pack(["secret.vault", "party.polite"], frost)),
+            [("scene.vault", "conditions"), ("scene.vault", "dialogue[0].conditions[0]"), ("scene.road", "conditions")],
+        )
+        early = {("clock.frost", "village"): 1}
+        self.assertEqual(self.conditions.evaluate(self.flags.pack(["secret.vault"], early)), (False, False, True))
+        self.assertEqual(
+            self.conditions.evaluate(self.flags.pack(["secret.vault", "secret.looted", "party.bribed"], frost)),
+            (False, True, True),
+        )
+
+    def test_batch_matches_single_state_evaluation(self) -> None:
+        names = ["secret.vault", "secret.looted", "party.polite", "party.armed", "party.bribed"]
+        states = []
+        for number in range(64):
+            flags = [name for bit, name in enumerate(names) if number >> bit & 1]
+            states.append(self.flags.pack(flags, {("clock.frost", "village"): number % 3}))
+        self.assertEqual(self.conditions.live_batch(states), [self.conditions.live(state) for state in states])
+        self.assertEqual(self.conditions.live_batch([]), [])
+
+    def test_contradictions_and_malformed_conditions(self) -> None:
+        flags = hopscotch_conditions.FlagTable()
+        self.assertEqual(hopscotch_conditions.compile_expression("a && !a", flags), [])
+        self.assertEqual(hopscotch_conditions.compile_expression("!!a", flags), [(1, 0)])
+        gating = {"enterIf": [{"hasSecret": "s"}], "skipIf": [{"hasSecret": "s"}]}
+        self.assertEqual(hopscotch_conditions.compile_gating(gating, flags), [])
+        for condition in ({"hasSecret": 3}, {"sees": "x"}, {"clockAtLeast": {"id": "c", "track": "t", "days": "2"}}):
+            with self.assertRaises(hopscotch_conditions.ConditionError):
+                hopscotch_conditions.compile_simple_condition(condition, flags)
+
+
+if __name__ == "__main__":
+    unittest.main()
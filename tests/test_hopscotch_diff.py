@@ -0,0 +1,117 @@
+import io
+import json
+import sys
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+import unittest
+
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+import hopscotch_diff  # noqa: E402
+
+OLD = """\
+```hopscotch:world id=world.w
+name: World
+```
+
+```hopscotch:npc id=npc.a
+name: A
+tags: [one]
+```
+
+```hopscotch:npc id=npc.b
+name: B
+```
+
+```hopscotch:npc id=npc.c
+name: C
+```
+
+```hopscotch:npc id=npc.gone
+name: Gone
+```
+"""
+
+NEW = """\
+```hopscotch:world id=world.w
+name:   World   # reformatted only
+```
+
+```hopscotch:npc id=npc.c
+name: C
+```
+
+```hopscotch:npc id=npc.a
+name: A2
+alignment: neutral
+```
+
+```hopscotch:npc id=npc.b
+name: B
+```
+
+```hopscotch:npc id=npc.new
+name: New
+```
+"""
+
+
+class DiffTests(unittest.TestCase):
+    def test_blocks_are_matched_by_id(self) -> None:
+        changes, unchanged = hopscotch_diff.diff_buffers(OLD.encode("utf-8"), NEW.encode("utf-8"))
+        self.assertEqual(unchanged, 2)
+        summary = [(change.block_id, change.kinds, change.old_line, change.new_line) for change in changes]
+        self.assertEqual(
+            summary,
+            [
+                ("npc.c", ["moved"], 14, 5),
+                ("npc.a", ["changed"], 5, 9),
+                ("npc.new", ["added"], None, 18),
+                ("npc.gone", ["removed"], 18, None),
+            ],
+        )
+        fields = [(item.name, item.kind, item.old, item.new) for item in changes[1].fields]
+        self.assertEqual(
+            fields,
+            [
+                ("name", "changed", "A", "A2"),
+                ("tags", "removed", ["one"], None),
+                ("alignment", "added", None, "neutral"),
+            ],
+        )
+
+    def test_stable_positions_keeps_longest_ordered_run(self) -> None:
+        self.assertEqual(hopscotch_diff.stable_positions([]), set())
+        self.assertEqual(hopscotch_diff.stable_positions([4, 0, 1, 2, 3]), {1, 2, 3, 4})
+        self.assertEqual(len(hopscotch_diff.stable_positions([2, 0, 3, 1, 4])), 3)
+
+    def test_main_exit_codes_and_json(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            old, new = Path(tmp) / "old.hopscotch", Path(tmp) / "new.hopscotch"
+            old.write_text(OLD, encoding="utf-8")
+            new.write_text(NEW, encoding="utf-8")
+            out = io.StringIO()
+            with redirect_stdout(out):
+                self.assertEqual(hopscotch_diff.main(["--json", str(old), str(new)]), 1)
+            documents = [json.loads(line) for line in out.getvalue().splitlines()]
+            kinds = [document["changes"] for document in documents]
+            self.assertEqual(kinds, [["moved"], ["changed"], ["added"], ["removed"]])
+            self.assertEqual(documents[1]["fields"][2], {"name": "alignment", "change": "added", "new": "neutral"})
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(hopscotch_diff.main([str(old), str(old)]), 0)
+
+    def test_main_reports_undecodable_changed_block(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            old, new = Path(tmp) / "old.hopscotch", Path(tmp) / "new.hopscotch"
+            old.write_bytes(b"```hopscotch:npc id=npc.a\nname: A\n```\n")
+            new.write_bytes(b"```hopscotch:npc id=npc.a\nname: \xff\n```\n")
+            err = io.StringIO()
+            with redirect_stderr(err), redirect_stdout(io.StringIO()):
+                self.assertEqual(hopscotch_diff.main([str(old), str(new)]), 2)
+            self.assertIn(f"ERROR: Could not read {old} or {new}: 'utf-8' codec", err.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
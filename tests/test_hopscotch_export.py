@@ -0,0 +1,69 @@
+import io
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+import unittest
+
+
+ROOT = Path(__file__).resolve().parents[1]
+VALIDATOR = ROOT / "scripts" / "validate_hopscotch.py"
+EXAMPLE = ROOT / "examples" / "frozen-sick.hopscotch"
+
+sys.path.insert(0, str(VALIDATOR.parent))
+import hopscotch_export  # noqa: E402
+
+
+def export(func) -> str:
+    out = io.StringIO()
+    with open(EXAMPLE, encoding="utf-8") as f:
+        errors = func(f, out)
+    assert errors == [], errors
+    return out.getvalue()
+
+
+class ExportTests(unittest.TestCase):
+    def test_json_projection(self) -> None:
+        document = json.loads(export(hopscotch_export.export_json))
+        self.assertEqual(list(document), ["metadata", "nodes", "entities", "edges"])
+        self.assertEqual(document["metadata"]["hopscotchVersion"], "0.5.0")
+        self.assertEqual(document["nodes"]["world.exandria"]["type"], "world")
+        self.assertIn("scene.palebank.funeral", document["entities"])
+        self.assertIn(
+            {"from": "continent.wildemount", "to": "world.exandria", "field": "parent", "type": "parent"},
+            document["edges"],
+        )
+
+    def test_ndjson_one_record_per_block(self) -> None:
+        records = [json.loads(line) for line in export(hopscotch_export.export_ndjson).splitlines()]
+        self.assertIn("metadata", records[0])
+        self.assertEqual(len(records), 142)
+        self.assertEqual(records[1]["id"], "world.exandria")
+
+    def test_cli_output_is_byte_stable(self) -> None:
+        runs = [
+            subprocess.run(
+                [sys.executable, str(VALIDATOR), "export", str(EXAMPLE)],
+                capture_output=True,
+                check=True,
+            ).stdout
+            for _ in range(2)
+        ]
+        self.assertEqual(runs[0], runs[1])
+        self.assertEqual(runs[0].decode("utf-8"), export(hopscotch_export.export_json))
+
+    def test_cli_reports_undecodable_file(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            bad = Path(tmp) / "bad.hopscotch"
+            bad.write_bytes(b"```hopscotch:npc id=npc.a\nname: \xff\n```\n")
+            for extra in ([], ["--ndjson"]):
+                result = subprocess.run(
+                    [sys.executable, str(VALIDATOR), "export", str(bad), *extra], capture_output=True, text=True
+                )
+                self.assertEqual(result.returncode, 2, result.stderr)
+                self.assertIn(f"ERROR: Could not read {bad}: 'utf-8' codec", result.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
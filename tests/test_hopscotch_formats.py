@@ -0,0 +1,115 @@
+import io
+import json
+import subprocess
+import sys
+from pathlib import Path
+import unittest
+
+
+ROOT = Path(__file__).resolve().parents[1]
+VALIDATOR = ROOT / "scripts" / "validate_hopscotch.py"
+FIXTURES = ROOT / "tests" / "fixtures"
+sys.path.insert(0, str(VALIDATOR.parent))
+import hopscotch_formats  # noqa: E402
+import validate_hopscotch  # noqa: E402
+
+REFS = str(FIXTURES / "refs-invalid.hopscotch")
+
+
+class WriterTests(unittest.TestCase):
+    def test_json_lines(self) -> None:
+        stream = io.StringIO()
+        writer = hopscotch_formats.JsonLinesWriter(stream)
+        self.assertEqual(writer.write_file(validate_hopscotch.validate_file(REFS)), 1)
+        self.assertEqual(writer.write_file(validate_hopscotch.validate_file(REFS + ".missing")), 2)
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(
+            records[0],
+            {
+                "path": REFS,
+                "line": 15,
+                "code": "HS303",
+                "severity": "error",
+                "message": "scene hasSecret 'npc.guide' has type npc, expected secret.",
+            },
+        )
+        self.assertEqual([r["code"] for r in records], ["HS303", "HS302", "HS001"])
+
+    def test_sarif_log(self) -> None:
+        stream = io.StringIO()
+        writer = hopscotch_formats.SarifWriter(stream)
+        writer.write_file(validate_hopscotch.validate_file(REFS))
+        writer.write_file(validate_hopscotch.validate_file(str(FIXTURES / "scene-valid.hopscotch")))
+        writer.close()
+        log = json.loads(stream.getvalue())
+        self.assertEqual(log["version"], "2.1.0")
+        run = log["runs"][0]
+        rules = run["tool"]["driver"]["rules"]
+        self.assertEqual([rule["id"] for rule in rules], sorted(validate_hopscotch.DIAGNOSTIC_CODES))
+        first = run["results"][0]
+        self.assertEqual(rules[first["ruleIndex"]]["id"], first["ruleId"])
+        self.assertEqual(first["locations"][0]["physicalLocation"]["region"], {"startLine": 15})
+        self.assertEqual(len(run["results"]), 2)
+
+    def test_records_are_written_as_they_are_found(self) -> None:
+        read = []
+
+        def lines():
+            yield from ["```hopscotch:scene id=scene.a\n", "summary: S\n", "```\n"]
+            for n in range(20):
+                read.append(n)
+                yield from [f"```hopscotch:npc id=npc.n{n}\n", "name: N\n", "scope: scene.a\n", "```\n"]
+
+        stream = io.StringIO()
+        writer = hopscotch_formats.JsonLinesWriter(stream)
+        written = []
+
+        def on_diagnostic(message: str, severity: str) -> None:
+            writer.write("a.hopscotch", message, severity)
+            written.append(len(read))
+
+        validate_hopscotch.validate_stream(lines(), on_diagnostic=on_diagnostic)
+        # The scene's own error is out before the blocks after it are read; reference errors wait for every id.
+        self.assertEqual(written, [0] + [20] * 20)
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual([r["code"] for r in records], ["HS205"] + ["HS303"] * 20)
+
+    def test_in_process_and_worker_output_agree(self) -> None:
+        outputs = []
+        for jobs in ("1", "2"):
+            result = subprocess.run(
+                [sys.executable, str(VALIDATOR), FIXTURES, "--format", "sarif", "-j", jobs],
+                capture_output=True,
+                text=True,
+                check=False,
+            )
+            self.assertEqual(result.returncode, 1, result.stderr)
+            results = json.loads(result.stdout)["runs"][0]["results"]
+            outputs.append(sorted(json.dumps(record, sort_keys=True) for record in results))
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertTrue(outputs[0])
+
+
+class MaxErrorsTests(unittest.TestCase):
+    def test_validation_stops_at_limit(self) -> None:
+        text = "".join(
+            f"```hopscotch:scene id=scene.s{n}\nsummary: S\nlinkedNPCs:\n  - npc.later\n```\n" for n in range(50)
+        )
+        diagnostics = validate_hopscotch.validate_text(text, max_errors=3)
+        self.assertEqual([d.code for d in diagnostics], ["HS205"] * 3)
+        self.assertEqual(len(validate_hopscotch.validate_text(text)), 100)
+
+    def test_fail_fast_skips_remaining_files(self) -> None:
+        result = subprocess.run(
+            [sys.executable, str(VALIDATOR), FIXTURES, "--fail-fast", "--format", "jsonl", "-j", "1"],
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        self.assertEqual(result.returncode, 1)
+        self.assertEqual(len(result.stdout.splitlines()), 1)
+        self.assertIn("Stopped at the --max-errors limit of 1; 4 files were not checked.", result.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
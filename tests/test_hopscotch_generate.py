@@ -0,0 +1,39 @@
+import sys
+import tempfile
+from pathlib import Path
+import unittest
+
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+import hopscotch_generate  # noqa: E402
+import hopscotch_graph  # noqa: E402
+import validate_hopscotch  # noqa: E402
+
+
+class GenerateTests(unittest.TestCase):
+    def test_generated_adventures_validate_at_any_size(self) -> None:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            schemas = validate_hopscotch.load_schemas(validate_hopscotch.DEFAULT_SCHEMA_DIR, cache_dir)
+        for blocks in (1, 2, 17, 500):
+            lines = list(hopscotch_generate.generate_adventure(blocks, seed=7))
+            result = validate_hopscotch.validate_stream(lines, schemas=schemas)
+            self.assertEqual((result.errors, result.warnings), ([], []), blocks)
+            self.assertEqual(result.block_count, blocks)
+
+    def test_output_depends_only_on_seed(self) -> None:
+        first = list(hopscotch_generate.generate_adventure(300, seed=1))
+        self.assertEqual(first, list(hopscotch_generate.generate_adventure(300, seed=1)))
+        self.assertNotEqual(first, list(hopscotch_generate.generate_adventure(300, seed=2)))
+
+    def test_scenes_form_one_story(self) -> None:
+        lines = hopscotch_generate.generate_adventure(500, seed=3)
+        graph = hopscotch_graph.build_graph(validate_hopscotch.iter_blocks(lines))
+        report = hopscotch_graph.analyse(graph)
+        self.assertEqual(report.entries, ["scene.d0.s0"])
+        self.assertEqual(report.unreachable, [])
+        self.assertEqual(report.cycles, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import io
+import sys
+import tempfile
+from contextlib import redirect_stderr
+from pathlib import Path
+import unittest
+
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+import hopscotch_graph  # noqa: E402
+import validate_hopscotch  # noqa: E402
+
+
+def scene(block_id: str, *unlocks: str) -> list:
+    lines = [f"```hopscotch:scene id={block_id}\n", "title: T\n", "summary: S\n"]
+    if unlocks:
+        lines += ["outcomes:\n", "  possible:\n", "    - id: outcome.next\n", "      unlocks:\n"]
+        lines += [f"        - {target}\n" for target in unlocks]
+    return lines + ["```\n"]
+
+
+def link(block_id: str, source: str, target: str) -> list:
+    return [
+        f"```hopscotch:link id={block_id}\n",
+        f"from: {source}\n",
+        "to:\n",
+        f"  - {target}\n",
+        "linkType: narrative_linear\n",
+        "```\n",
+    ]
+
+
+class GraphTests(unittest.TestCase):
+    def test_example_flows_from_funeral_to_conclusion(self) -> None:
+        with open(ROOT / "examples" / "frozen-sick.hopscotch", encoding="utf-8") as f:
+            graph = hopscotch_graph.build_graph(validate_hopscotch.iter_blocks(f))
+        report = hopscotch_graph.analyse(graph)
+        self.assertEqual(report.entries, ["scene.palebank.funeral"])
+        self.assertEqual(report.unreachable, [])
+        self.assertEqual(report.dead_ends, ["scene.conclusion"])
+        self.assertEqual(report.cycles, [])
+
+    def test_unreachable_orphans_and_cycles(self) -> None:
+        lines = (
+            scene("scene.a", "scene.b")
+            + scene("scene.b")
+            + link("link.b-c", "scene.b", "scene.c")
+            + scene("scene.c", "scene.b")
+            + scene("scene.d", "scene.e")
+            + scene("scene.e")
+        )
+        graph = hopscotch_graph.build_graph(validate_hopscotch.iter_blocks(lines))
+        self.assertEqual(list(graph.offsets), [0, 1, 2, 3, 4, 4])
+        report = hopscotch_graph.analyse(graph)
+        self.assertEqual(report.unreachable, ["scene.d", "scene.e"])
+        self.assertEqual(report.dead_ends, ["scene.e"])
+        self.assertEqual(report.orphans, ["scene.d"])
+        self.assertEqual(report.cycles, [["scene.b", "scene.c"]])
+        document = hopscotch_graph.graph_document(graph, report)
+        self.assertIn(
+            {"from": "scene.b", "to": "scene.c", "field": "to", "type": "narrative_linear"}, document["edges"]
+        )
+        self.assertIn({"from": "scene.a", "to": "scene.b", "field": "unlocks", "type": "unlocks"}, document["edges"])
+        self.assertEqual(hopscotch_graph.analyse(graph, ["scene.d"]).unreachable, ["scene.a", "scene.b", "scene.c"])
+        with self.assertRaises(hopscotch_graph.GraphError):
+            hopscotch_graph.analyse(graph, ["scene.d", "scene.typo"])
+
+    def test_unknown_entry_exits_2(self) -> None:
+        err = io.StringIO()
+        with redirect_stderr(err):
+            code = hopscotch_graph.main([str(ROOT / "examples" / "frozen-sick.hopscotch"), "--entry", "scene.typo"])
+        self.assertEqual(code, 2)
+        self.assertIn("Unknown entry id: scene.typo", err.getvalue())
+
+    def test_undecodable_file_exits_2(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            bad = Path(tmp) / "bad.hopscotch"
+            bad.write_bytes(b"```hopscotch:npc id=npc.a\nname: \xff\n```\n")
+            err = io.StringIO()
+            with redirect_stderr(err):
+                code = hopscotch_graph.main([str(bad)])
+        self.assertEqual(code, 2)
+        self.assertIn(f"ERROR: Could not read {bad}: 'utf-8' codec", err.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import io
+import json
+import sys
+from pathlib import Path
+import unittest
+
+
+ROOT = Path(__file__).resolve().parents[1]
+FIXTURES = ROOT / "tests" / "fixtures"
+sys.path.insert(0, str(ROOT / "scripts"))
+import hopscotch_lsp  # noqa: E402
+
+URI = "file:///refs-invalid.hopscotch"
+
+
+def frame(payload: dict) -> bytes:
+    body = json.dumps(payload).encode("utf-8")
+    return b"Content-Length: %d\r\n\r\n" % len(body) + body
+
+
+def run_session(*messages: dict) -> list:
+    reader = io.BytesIO(b"".join(frame(message) for message in messages))
+    writer = io.BytesIO()
+    server = hopscotch_lsp.LanguageServer(reader, writer, debounce=0)
+    server.serve()
+    writer.seek(0)
+    replies = []
+    while True:
+        message = hopscotch_lsp.read_message(writer)
+        if message is None:
+            return replies
+        replies.append(message)
+
+
+def request(number: int, method: str, params: dict) -> dict:
+    return {"jsonrpc": "2.0", "id": number, "method": method, "params": params}
+
+
+def notification(method: str, params: dict) -> dict:
+    return {"jsonrpc": "2.0", "method": method, "params": params}
+
+
+class DocumentTests(unittest.TestCase):
+    def test_incremental_edits_match_full_text(self) -> None:
+        document = hopscotch_lsp.Document(URI, "a\r\nb😀c\rd\n")
+        edits = [
+            ({"start": {"line": 1, "character": 3}, "end": {"line": 2, "character": 0}}, "X\n"),
+            ({"start": {"line": 0, "character": 1}, "end": {"line": 0, "character": 1}}, "\r"),
+            ({"start": {"line": 3, "character": 1}, "end": {"line": 4, "character": 0}}, ""),
+        ]
+        for edit_range, text in edits:
+            document.apply({"range": edit_range, "text": text})
+        self.assertEqual(document.text, "a\r\r\nb😀X\nd")
+        self.assertEqual(document.lines, ["a\r", "\r\n", "b😀X\n", "d"])
+
+
+class LanguageServerTests(unittest.TestCase):
+    def test_session(self) -> None:
+        text = (FIXTURES / "refs-invalid.hopscotch").read_text(encoding="utf-8")
+        lines = text.splitlines()
+        secret_line = next(n for n, line in enumerate(lines) if "hasSecret: npc.guide" in line)
+        world_line = lines.index("```hopscotch:world id=world.test")
+        scope_line = lines.index("scope: world.test")
+        replies = run_session(
+            request(1, "initialize", {"capabilities": {}}),
+            notification("initialized", {}),
+            notification(
+                "textDocument/didOpen",
+                {"textDocument": {"uri": URI, "languageId": "hopscotch", "version": 1, "text": text}},
+            ),
+            notification(
+                "textDocument/didChange",
+                {
+                    "textDocument": {"uri": URI, "version": 2},
+                    "contentChanges": [
+                        {
+                            "range": {
+                                "start": {"line": secret_line, "character": 17},
+                                "end": {"line": secret_line, "character": 26},
+                            },
+                            "text": "secret.none",
+                        }
+                    ],
+                },
+            ),
+            request(
+                2,
+                "textDocument/definition",
+                {"textDocument": {"uri": URI}, "position": {"line": scope_line, "character": 9}},
+            ),
+            request(
+                3,
+                "textDocument/references",
+                {
+                    "textDocument": {"uri": URI},
+                    "position": {"line": world_line, "character": 25},
+                    "context": {"includeDeclaration": True},
+                },
+            ),
+            request(4, "textDocument/hover", {}),
+            request(5, "shutdown", None),
+            notification("exit", {}),
+        )
+        by_id = {reply["id"]: reply for reply in replies if "id" in reply}
+        self.assertTrue(by_id[1]["result"]["capabilities"]["definitionProvider"])
+        published = [r["params"] for r in replies if r.get("method") == "textDocument/publishDiagnostics"]
+        self.assertEqual([p["version"] for p in published], [1, 2])
+        self.assertIn(
+            "scene hasSecret 'npc.guide' has type npc, expected secret.",
+            [d["message"] for d in published[0]["diagnostics"]],
+        )
+        self.assertIn(
+            "scene hasSecret 'secret.none' does not match any block id.",
+            [d["message"] for d in published[1]["diagnostics"]],
+        )
+        world = {"start": {"line": world_line, "character": 22}, "end": {"line": world_line, "character": 32}}
+        scope = {"start": {"line": scope_line, "character": 7}, "end": {"line": scope_line, "character": 17}}
+        self.assertEqual(by_id[2]["result"], [{"uri": URI, "range": world}])
+        self.assertEqual(by_id[3]["result"], [{"uri": URI, "range": world}, {"uri": URI, "range": scope}])
+        self.assertEqual(by_id[4]["error"]["code"], hopscotch_lsp.METHOD_NOT_FOUND)
+        self.assertIsNone(by_id[5]["result"])
+
+    def test_malformed_messages_do_not_end_session(self) -> None:
+        replies = run_session(
+            request(1, "initialize", {"capabilities": {}}),
+            notification("textDocument/didOpen", {"textDocument": {"uri": URI}}),
+            notification(
+                "textDocument/didOpen",
+                {"textDocument": {"uri": URI, "languageId": "hopscotch", "version": 1, "text": ""}},
+            ),
+            request(2, "textDocument/definition", {"textDocument": {"uri": URI}}),
+            request(3, "textDocument/references", []),
+            request(4, "shutdown", None),
+            notification("exit", {}),
+        )
+        by_id = {reply["id"]: reply for reply in replies if "id" in reply}
+        logged = [r["params"]["message"] for r in replies if r.get("method") == "window/logMessage"]
+        self.assertTrue(any("textDocument/didOpen" in line for line in logged))
+        self.assertEqual(by_id[2]["error"]["code"], hopscotch_lsp.INVALID_PARAMS)
+        self.assertEqual(by_id[3]["error"]["code"], hopscotch_lsp.INVALID_PARAMS)
+        self.assertIsNone(by_id[4]["result"])
+
+
+if __name__ == "__main__":
+    unittest.main()
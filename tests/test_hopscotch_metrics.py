@@ -0,0 +1,70 @@
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+import unittest
+
+
+ROOT = Path(__file__).resolve().parents[1]
+EXAMPLE = ROOT / "examples" / "frozen-sick.hopscotch"
+sys.path.insert(0, str(ROOT / "scripts"))
+import hopscotch_metrics  # noqa: E402
+import validate_hopscotch  # noqa: E402
+
+
+class MetricsTests(unittest.TestCase):
+    def test_instrumented_run_matches_plain_run(self) -> None:
+        metrics = hopscotch_metrics.Metrics("frozen-sick", slowest=3)
+        with open(EXAMPLE, encoding="utf-8") as f:
+            timed = validate_hopscotch.validate_stream(f, metrics=metrics)
+        with open(EXAMPLE, encoding="utf-8") as f:
+            plain = validate_hopscotch.validate_stream(f)
+        self.assertEqual(
+            (timed.errors, timed.warnings, timed.counts), (plain.errors, plain.warnings, plain.counts)
+        )
+        self.assertIs(timed.metrics, metrics)
+        self.assertIsNone(plain.metrics)
+
+        document = metrics.document()
+        self.assertEqual((document["files"], document["blocks"]), (1, 141))
+        self.assertEqual(document["blockTypes"]["scene"]["count"], 15)
+        self.assertEqual(sum(stats["count"] for stats in document["blockTypes"].values()), 141)
+        self.assertGreater(document["phases"]["parse"]["wall"], 0)
+        seconds = [entry["seconds"] for entry in document["slowest"]]
+        self.assertEqual(len(seconds), 3)
+        self.assertEqual(seconds, sorted(seconds, reverse=True))
+
+    def test_merge_keeps_overall_slowest(self) -> None:
+        first = hopscotch_metrics.Metrics("a", slowest=2)
+        second = hopscotch_metrics.Metrics("b", slowest=2)
+        for metrics, times in ((first, [0.1, 0.5, 0.3]), (second, [0.4, 0.2])):
+            metrics.files = 1
+            for line, seconds in enumerate(times, 1):
+                metrics._record((seconds, metrics.path, line, "scene", f"scene.{line}"))
+        first.merge(second)
+        self.assertEqual(first.files, 2)
+        self.assertEqual(
+            sorted(first.slowest, reverse=True),
+            [(0.5, "a", 2, "scene", "scene.2"), (0.4, "b", 1, "scene", "scene.1")],
+        )
+
+    def test_cli_writes_metrics_document(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "metrics.json"
+            validator = ROOT / "scripts" / "validate_hopscotch.py"
+            result = subprocess.run(
+                [sys.executable, validator, EXAMPLE, "--timings", "--metrics-json", path],
+                capture_output=True,
+                text=True,
+                check=False,
+            )
+            document = json.loads(path.read_text(encoding="utf-8"))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("Timings (1 files, 141 blocks):", result.stdout)
+        self.assertEqual(list(document["phases"]), hopscotch_metrics.PHASES)
+        self.assertEqual(len(document["slowest"]), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import io
+import sys
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+import unittest
+
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+import hopscotch_migrate  # noqa: E402
+import validate_hopscotch  # noqa: E402
+
+OLD = """\
+---
+title: Old
+hopscotchVersion: 0.1.0
+---
+Start at @{location.cave}, not @{location.cave-x}.
+
+```hopscotch:world id=world.w
+name: W
+```
+
+```hopscotch:region id=region.north
+name: North
+parent: world.w
+```
+
+```hopscotch:location id=location.cave
+name: Cave
+kind: dungeon
+parent: region.north
+```
+
+```hopscotch:location id=location.cave.hut
+name: Hut
+kind: ruin
+parent: location.cave
+```
+
+```hopscotch:area id=area.c1
+name: C1
+parent: location.cave
+exits: [location.cave, "location.cave.hut"]
+description: "See @{location.cave}."
+```
+"""
+
+
+class MigrateTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name) / "old.hopscotch"
+
+    def migrate(self, *args: str) -> int:
+        with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()) as err:
+            code = hopscotch_migrate.main([*args, str(self.path)])
+        self.stderr = err.getvalue()
+        return code
+
+    def test_renames_region_locations_and_rewrites_references(self) -> None:
+        self.path.write_bytes(OLD.replace("\n", "\r\n").encode("utf-8"))
+        self.assertEqual(self.migrate("--check"), 1)
+        self.assertEqual(self.path.read_bytes(), OLD.replace("\n", "\r\n").encode("utf-8"))
+
+        self.assertEqual(self.migrate(), 0)
+        self.assertIn("location.cave.hut stays a location but has destination kind 'ruin'", self.stderr)
+        migrated = self.path.read_bytes().decode("utf-8")
+        self.assertNotIn("\n", migrated.replace("\r\n", ""))
+        migrated = migrated.replace("\r\n", "\n")
+        self.assertIn('hopscotchVersion: "0.5.0"\n', migrated)
+        self.assertIn("Start at @{destination.cave}, not @{location.cave-x}.", migrated)
+        self.assertIn("```hopscotch:destination id=destination.cave\n", migrated)
+        self.assertIn("id=location.cave.hut\nname: Hut\nkind: ruin\nparent: destination.cave\n", migrated)
+        self.assertIn('exits: [destination.cave, "location.cave.hut"]', migrated)
+        self.assertIn('description: "See @{destination.cave}."', migrated)
+
+        result = validate_hopscotch.validate_file(str(self.path)).result
+        self.assertFalse([error for error in result.errors if "destination.cave" in error or "location.cave" in error])
+        self.assertEqual(self.migrate("--check"), 0)
+
+    def test_adds_frontmatter_and_refuses_collisions(self) -> None:
+        self.path.write_text("```hopscotch:world id=world.w\nname: W\n```\n", encoding="utf-8")
+        self.assertEqual(self.migrate(), 0)
+        self.assertTrue(self.path.read_text(encoding="utf-8").startswith('---\nhopscotchVersion: "0.5.0"\n---\n```'))
+
+        collision = OLD + "\n```hopscotch:destination id=destination.cave\nname: Taken\nparent: region.north\n```\n"
+        self.path.write_text(collision, encoding="utf-8")
+        self.assertEqual(self.migrate(), 2)
+        self.assertIn("location.cave -> destination.cave", self.stderr)
+        self.assertEqual(self.path.read_text(encoding="utf-8"), collision)
+
+
+if __name__ == "__main__":
+    unittest.main()
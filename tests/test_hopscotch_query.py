@@ -0,0 +1,81 @@
+import io
+import json
+import shutil
+import sys
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+import unittest
+
+
+ROOT = Path(__file__).resolve().parents[1]
+EXAMPLE = ROOT / "examples" / "frozen-sick.hopscotch"
+sys.path.insert(0, str(ROOT / "scripts"))
+import hopscotch_compile  # noqa: E402
+import hopscotch_query  # noqa: E402
+import validate_hopscotch  # noqa: E402
+
+
+class QueryTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name) / EXAMPLE.name
+        shutil.copyfile(EXAMPLE, self.path)
+        self.blocks = list(validate_hopscotch.scan_blocks(self.path.read_bytes()))
+
+    def query(self, text: str):
+        with hopscotch_compile.load_index(str(self.path)) as index:
+            numbers = hopscotch_query.run_query(index, hopscotch_query.parse_filter(text))
+            return [index.identity(number)[1] for number in numbers]
+
+    def test_terms_match_parsed_blocks(self) -> None:
+        self.assertEqual(self.query("npc.elro-aldataur"), ["npc.elro-aldataur"])
+        self.assertEqual(
+            self.query("id:npc.*"), [block.block_id for block in self.blocks if block.block_id.startswith("npc.")]
+        )
+        self.assertEqual(self.query("tag:disease,nothing type:ruleRef"), ["rule.frigid-woe-disease"])
+        self.assertEqual(
+            self.query("type:encounter under:destination.croaker-cave"),
+            [
+                "encounter.croaker.ice-frogs",
+                "encounter.croaker.old-croaker",
+                "encounter.croaker.bandits",
+                "encounter.croaker.hulil",
+            ],
+        )
+        self.assertEqual(self.query("type:npc type:encounter"), [])
+        self.assertEqual(len(self.query("")), len(self.blocks))
+
+        under_world = set(self.query("under:world.exandria"))
+        self.assertNotIn("world.exandria", under_world)
+        self.assertIn("encounter.palebank.tulgi", under_world)
+
+    def test_main_output_and_exit_codes(self) -> None:
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.assertEqual(hopscotch_query.main(["--json", "npc.elro-aldataur", str(self.path)]), 0)
+        document = json.loads(out.getvalue())
+        self.assertEqual((document["id"], document["line"]), ("npc.elro-aldataur", 398))
+        self.assertEqual(document["fields"]["scope"], "destination.palebank-village")
+
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.assertEqual(hopscotch_query.main(["--source", "npc.elro-aldataur", str(self.path)]), 0)
+        self.assertTrue(out.getvalue().startswith("```hopscotch:npc id=npc.elro-aldataur\n"))
+
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(hopscotch_query.main(["scene.nowhere", str(self.path)]), 1)
+        with self.assertRaises(ValueError):
+            hopscotch_query.parse_filter("color:red")
+
+    def test_main_reports_undecodable_file(self) -> None:
+        self.path.write_bytes(b"```hopscotch:npc id=npc.a\nname: \xff\n```\n")
+        err = io.StringIO()
+        with redirect_stderr(err), redirect_stdout(io.StringIO()):
+            self.assertEqual(hopscotch_query.main(["npc.a", str(self.path)]), 2)
+        self.assertIn(f"ERROR: Could not query {self.path}: 'utf-8' codec", err.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+import unittest
+
+
+ROOT = Path(__file__).resolve().parents[1]
+VALIDATOR = ROOT / "scripts" / "validate_hopscotch.py"
+FIXTURES = ROOT / "tests" / "fixtures"
+
+sys.path.insert(0, str(VALIDATOR.parent))
+import hopscotch_schema  # noqa: E402
+import validate_hopscotch  # noqa: E402
+
+
+def compiled(documents: dict) -> hopscotch_schema.CompiledSchemas:
+    namespace: dict = {}
+    exec(hopscotch_schema.compile_schemas(documents), namespace)
+    return hopscotch_schema.CompiledSchemas(namespace["VALIDATORS"])
+
+
+class SchemaCompilerTests(unittest.TestCase):
+    def test_refs_resolve_across_files_and_defs(self) -> None:
+        schemas = compiled(
+            {
+                "a.schema.json": {
+                    "$id": "https://example.invalid/a.schema.json",
+                    "anyOf": [{"$ref": "b.schema.json"}, {"$ref": "#/$defs/count"}],
+                    "$defs": {"count": {"type": "integer", "minimum": 0}},
+                },
+                "b.schema.json": {
+                    "type": "object",
+                    "required": ["name"],
+                    "additionalProperties": False,
+                    "properties": {"name": {"type": "string", "pattern": "^n\\."}},
+                },
+            }
+        )
+        self.assertEqual(schemas.validate("a.schema.json", 3), [])
+        self.assertEqual(schemas.validate("a.schema.json", {"name": "n.x"}), [])
+        self.assertEqual(schemas.validate("a.schema.json", -1), [": does not match any allowed form"])
+        self.assertEqual(
+            schemas.validate("b.schema.json", {"name": "x", "extra": True}),
+            ["/name: must match ^n\\.", ": unexpected property 'extra'"],
+        )
+
+    def test_one_of_not_and_if_then(self) -> None:
+        schemas = compiled(
+            {
+                "c.schema.json": {
+                    "oneOf": [{"type": "string"}, {"type": "string", "minLength": 2}],
+                    "not": {"const": "no"},
+                },
+                "d.schema.json": {
+                    "if": {"properties": {"kind": {"const": "x"}}},
+                    "then": {"required": ["x"]},
+                },
+            }
+        )
+        self.assertEqual(schemas.validate("c.schema.json", "a"), [])
+        self.assertEqual(
+            schemas.validate("c.schema.json", "no"),
+            [": must match exactly one allowed form, matched 2", ": matches a disallowed form"],
+        )
+        self.assertEqual(schemas.validate("d.schema.json", {"kind": "y"}), [])
+        self.assertEqual(
+            schemas.validate("d.schema.json", {"kind": "x"}), [": missing required property 'x'"]
+        )
+
+    def test_unsupported_keywords_are_rejected(self) -> None:
+        with self.assertRaises(hopscotch_schema.SchemaError):
+            hopscotch_schema.compile_schemas({"e.schema.json": {"maxLength": 3}})
+
+    def test_bundled_schemas_accept_the_example(self) -> None:
+        schemas = hopscotch_schema.load_schemas()
+        with open(ROOT / "examples" / "frozen-sick.hopscotch", encoding="utf-8") as f:
+            errors = [err for block in validate_hopscotch.iter_blocks(f) for err in schemas.validate_block(block)]
+        self.assertEqual(errors, [])
+
+    def test_compiled_module_is_cached_by_schema_hash(self) -> None:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            first = hopscotch_schema.load_schemas(validate_hopscotch.DEFAULT_SCHEMA_DIR, cache_dir)
+            self.assertTrue(first.source_path.startswith(os.path.join(cache_dir, "schemas")))
+            self.assertTrue(os.path.exists(first.source_path))
+            self.assertEqual(os.listdir(os.path.dirname(first.source_path)), [os.path.basename(first.source_path)])
+
+    def test_tampered_cached_module_is_rewritten_not_run(self) -> None:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            documents = hopscotch_schema.load_schema_files(validate_hopscotch.DEFAULT_SCHEMA_DIR)
+            path = Path(cache_dir) / "schemas" / f"compiled_{hopscotch_schema._fingerprint(documents)}.py"
+            path.parent.mkdir()
+            path.write_text("raise SystemExit('tampered')\n", encoding="utf-8")
+            schemas = hopscotch_schema.load_schemas(validate_hopscotch.DEFAULT_SCHEMA_DIR, cache_dir)
+            self.assertEqual(schemas.source_path, str(path))
+            self.assertNotIn("tampered", path.read_text(encoding="utf-8"))
+
+
+class SchemaCliTests(unittest.TestCase):
+    def test_schema_flag_reports_block_violations(self) -> None:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            result = subprocess.run(
+                [
+                    sys.executable,
+                    str(VALIDATOR),
+                    FIXTURES / "scene-invalid-conditional.hopscotch",
+                    "--cache-dir",
+                    cache_dir,
+                    "--schema",
+                ],
+                capture_output=True,
+                text=True,
+                check=False,
+            )
+        self.assertEqual(result.returncode, 1)
+        self.assertIn(
+            "- Line 6: scene schema: /dialogue/0: missing required property 'conditions'", result.stderr
+        )
+
+    def test_schema_switch_does_not_take_the_path(self) -> None:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for flags in (["--schema"], ["--schema-dir", ROOT / "schemas"]):
+                command = [sys.executable, str(VALIDATOR), "--cache-dir", cache_dir, *flags]
+                result = subprocess.run(
+                    [*command, FIXTURES / "scene-valid.hopscotch"],
+                    capture_output=True,
+                    text=True,
+                    check=False,
+                )
+                self.assertEqual(result.returncode, 0, result.stderr)
+
+    def test_schema_without_cache_writes_nothing(self) -> None:
+        with tempfile.TemporaryDirectory() as cwd:
+            result = subprocess.run(
+                [sys.executable, str(VALIDATOR), "--schema", FIXTURES / "scene-valid.hopscotch"],
+                capture_output=True,
+                text=True,
+                check=False,
+                cwd=cwd,
+            )
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertEqual(os.listdir(cwd), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import sys
+import tempfile
+from pathlib import Path
+import unittest
+
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+import hopscotch_shard  # noqa: E402
+import validate_hopscotch  # noqa: E402
+
+BLOCKS = [
+    "```hopscotch:world id=world.w\nname: W\n```\n",
+    "```hopscotch:region id=region.r\nname: R\nparent: world.w\n```\n",
+    "```hopscotch:npc id=npc.a\nname: A\nscope: region.r\nextra: 1\n```\n",
+    "```hopscotch:npc\nname: No id\n```\n",
+    "```hopscotch:scene id=scene.s\ntitle: S\nparticipants:\n  - npc.a\n  - npc.missing\n```\n",
+    "```hopscotch:npc id=npc.a\nname: Again\nscope: scene.s\n```\n",
+    "```hopscotch:bogus id=bogus.b\n```\n",
+]
+
+
+class ShardTests(unittest.TestCase):
+    def test_sharded_result_matches_serial(self) -> None:
+        text = "---\nhopscotchVersion: 0.4.0\n---\n" + "prose\n".join(BLOCKS * 3)
+        text += "```hopscotch:npc id=npc.tail\nname: Tail\n"
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / "big.hopscotch")
+            Path(path).write_text(text, encoding="utf-8")
+            serial = validate_hopscotch.validate_file(path).result
+            self.assertTrue(any("Duplicate id 'npc.a'" in error for error in serial.errors))
+            self.assertTrue(any("Unterminated" in error for error in serial.errors))
+            for shards in (2, 3, 5, 40):
+                sharded = hopscotch_shard.validate_sharded(path, 2, shards=shards).result
+                self.assertEqual(sharded.errors, serial.errors)
+                self.assertEqual(sharded.warnings, serial.warnings)
+                self.assertEqual((sharded.counts, sharded.block_count), (serial.counts, serial.block_count))
+                self.assertEqual(
+                    [(node.block_id, node.line_start) for node in sharded.nodes],
+                    [(node.block_id, node.line_start) for node in serial.nodes],
+                )
+
+    def test_plan_starts_shards_at_opening_fences(self) -> None:
+        data = "".join(BLOCKS * 4).encode("utf-8")
+        plan, parse_errors = hopscotch_shard.plan_shards(data, 4)
+        self.assertEqual(len(plan), 4)
+        self.assertEqual(plan[0][:1], (0,))
+        self.assertEqual(plan[-1][1], len(data))
+        for start, end, line_no in plan[1:]:
+            self.assertTrue(data[start:].startswith(b"```hopscotch:"))
+            self.assertEqual(line_no, data[:start].count(b"\n") + 1)
+        self.assertEqual(len(parse_errors), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import sys
+import tempfile
+from pathlib import Path
+import unittest
+
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+import hopscotch_watch  # noqa: E402
+import validate_hopscotch  # noqa: E402
+
+EXAMPLE = ROOT / "examples" / "frozen-sick.hopscotch"
+
+
+def snapshot(result: validate_hopscotch.ValidationResult) -> tuple:
+    nodes = [(block.block_id, block.line_start) for block in result.nodes]
+    return result.errors, result.warnings, nodes, result.counts, result.block_count
+
+
+class IncrementalFileTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "adventure.hopscotch"
+        self.text = EXAMPLE.read_text(encoding="utf-8")
+        self.state = hopscotch_watch.IncrementalFile(str(self.path))
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def save(self, text: str) -> validate_hopscotch.ValidationResult:
+        self.path.write_text(text, encoding="utf-8")
+        self.text = text
+        result = self.state.update()
+        self.assertEqual(snapshot(result), snapshot(validate_hopscotch.validate_file(str(self.path)).result))
+        return result
+
+    def test_edit_reparses_only_the_changed_block(self) -> None:
+        self.save(self.text)
+        anchor = self.text.index("title:", len(self.text) // 2)
+        result = self.save(self.text[:anchor] + "\n\n" + self.text[anchor:])
+        self.assertEqual(self.state.reparsed, 1)
+        self.assertEqual(result.block_count, 141)
+
+    def test_cross_block_checks_follow_edits(self) -> None:
+        original = self.text
+        self.save(original)
+        duplicate = "```hopscotch:npc id=npc.urgon-wenth\nname: Again\nscope: destination.palebank-village\n```\n"
+        result = self.save(original + duplicate)
+        line = original.count("\n") + 1
+        self.assertEqual(result.errors, [f"Line {line}: Duplicate id 'npc.urgon-wenth'."])
+        self.assertEqual(self.state.reparsed, 1)
+        renamed = original.replace("id=npc.urgon-wenth", "id=npc.urgon-wenth-2", 1)
+        result = self.save(renamed)
+        self.assertTrue(any("does not match any block id" in err for err in result.errors))
+        result = self.save(original)
+        self.assertEqual(result.errors, [])
+
+    def test_unterminated_block_and_recovery(self) -> None:
+        original = self.text
+        self.save(original)
+        result = self.save(original[: original.rindex("```")])
+        self.assertIn("Unterminated hopscotch block", result.errors[-1])
+        self.save(original)
+
+    def test_common_prefix_and_suffix(self) -> None:
+        old = b"a" * 70000 + b"b" + b"c" * 70000
+        new = b"a" * 70000 + b"xy" + b"c" * 70000
+        self.assertEqual(hopscotch_watch.common_prefix(old, new), 70000)
+        self.assertEqual(hopscotch_watch.common_suffix(old, new, len(old) - 70000), 70000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,42 +1,457 @@
+import io
+import pickle
 import subprocess
 import sys
+import tempfile
+from contextlib import redirect_stdout
 from pathlib import Path
 import unittest
+from unittest import mock
 
 
 ROOT = Path(__file__).resolve().parents[1]
 VALIDATOR = ROOT / "scripts" / "validate_hopscotch.py"
 FIXTURES = ROOT / "tests" / "fixtures"
 
+sys.path.insert(0, str(VALIDATOR.parent))
+import validate_hopscotch  # noqa: E402
 
-def run_validator(path: Path) -> subprocess.CompletedProcess:
+
+def run_validator(*args: object) -> subprocess.CompletedProcess:
     return subprocess.run(
-        [sys.executable, str(VALIDATOR), str(path)],
+        [sys.executable, str(VALIDATOR), *map(str, args)],
         capture_output=True,
         text=True,
         check=False,
     )
 
 
+def messages(path: Path, severity: str = "error") -> list:
+    return [str(d) for d in validate_hopscotch.validate_path(str(path)) if d.severity == severity]
+
+
 class ValidateHopscotchTests(unittest.TestCase):
     def test_scene_validates(self) -> None:
-        result = run_validator(FIXTURES / "scene-valid.hopscotch")
-        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(messages(FIXTURES / "scene-valid.hopscotch"), [])
 
     def test_scene_missing_title_fails(self) -> None:
-        result = run_validator(FIXTURES / "scene-invalid-missing-title.hopscotch")
-        self.assertNotEqual(result.returncode, 0)
-        self.assertIn("scene missing required field 'title'", result.stderr)
+        self.assertIn(
+            "Line 6: scene missing required field 'title'.",
+            messages(FIXTURES / "scene-invalid-missing-title.hopscotch"),
+        )
 
     def test_scene_conditional_missing_conditions_fails(self) -> None:
-        result = run_validator(FIXTURES / "scene-invalid-conditional.hopscotch")
-        self.assertNotEqual(result.returncode, 0)
-        self.assertIn("conditional dialogue missing conditions", result.stderr)
+        errors = messages(FIXTURES / "scene-invalid-conditional.hopscotch")
+        self.assertTrue(any("conditional dialogue missing conditions" in err for err in errors), errors)
 
     def test_scene_blocked_in_v02(self) -> None:
-        result = run_validator(FIXTURES / "scene-v02-blocked.hopscotch")
-        self.assertNotEqual(result.returncode, 0)
-        self.assertIn("scene blocks require hopscotchVersion >= 0.3.0", result.stderr)
+        errors = messages(FIXTURES / "scene-v02-blocked.hopscotch")
+        self.assertTrue(any("scene blocks require hopscotchVersion >= 0.3.0" in err for err in errors), errors)
+
+    def test_dangling_and_wrong_type_refs_fail(self) -> None:
+        result = run_validator(FIXTURES / "refs-invalid.hopscotch")
+        self.assertEqual(result.returncode, 1)
+        self.assertIn(
+            "Line 15: scene hasSecret 'npc.guide' has type npc, expected secret.", result.stderr
+        )
+        self.assertIn(
+            "Line 15: scene unlocks 'scene.missing' does not match any block id.", result.stderr
+        )
+
+    def test_batch_directory_and_glob(self) -> None:
+        result = run_validator(FIXTURES, ROOT / "examples" / "*.hopscotch")
+        self.assertEqual(result.returncode, 1)
+        headers = [line for line in result.stdout.splitlines() if line.startswith("==> ")]
+        self.assertEqual(
+            headers,
+            [f"==> {FIXTURES / name} <==" for name in sorted(p.name for p in FIXTURES.iterdir())]
+            + [f"==> {ROOT / 'examples' / 'frozen-sick.hopscotch'} <=="],
+        )
+        self.assertIn("files/sec", result.stdout)
+
+    def test_batch_reports_undecodable_file_and_continues(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            (Path(tmp) / "bad.hopscotch").write_bytes(b"```hopscotch:npc id=npc.a\nname: \xff\n```\n")
+            (Path(tmp) / "ok.hopscotch").write_text("```hopscotch:npc id=npc.b\nname: B\n```\n", encoding="utf-8")
+            for jobs in ("1", "2"):
+                result = run_validator("--jobs", jobs, tmp)
+                self.assertEqual(result.returncode, 2, result.stderr)
+                self.assertIn(f"ERROR: Could not read {Path(tmp) / 'bad.hopscotch'}: 'utf-8' codec", result.stderr)
+                self.assertIn(f"==> {Path(tmp) / 'ok.hopscotch'} <==", result.stdout)
+                self.assertIn("Validated 2 files", result.stdout)
+
+    def test_cache_hits_on_rerun(self) -> None:
+        example = ROOT / "examples" / "frozen-sick.hopscotch"
+        with tempfile.TemporaryDirectory() as cache_dir:
+            first = run_validator("--cache-dir", cache_dir, example)
+            second = run_validator("--cache-dir", cache_dir, example)
+        self.assertEqual(second.returncode, 0, second.stderr)
+        self.assertIn("Cache: 0 hits, 141 misses", first.stdout)
+        self.assertIn("Cache: 141 hits, 0 misses", second.stdout)
+        self.assertEqual(
+            first.stdout.replace("0 hits, 141 misses", ""),
+            second.stdout.replace("141 hits, 0 misses", ""),
+        )
+
+    def test_cache_hits_parse_nothing(self) -> None:
+        path = FIXTURES / "refs-invalid.hopscotch"
+        with tempfile.TemporaryDirectory() as cache_dir:
+            schemas = validate_hopscotch.load_schemas(validate_hopscotch.DEFAULT_SCHEMA_DIR, cache_dir)
+            for validate, contents in (
+                (validate_hopscotch.validate_buffer, path.read_bytes()),
+                (validate_hopscotch.validate_stream, path.read_text(encoding="utf-8").splitlines(True)),
+            ):
+                with validate_hopscotch.open_cache(cache_dir) as cache:
+                    first = validate(contents, cache, schemas)
+                with validate_hopscotch.open_cache(cache_dir) as cache:
+                    with mock.patch.object(validate_hopscotch, "parse_body", side_effect=AssertionError("parsed")):
+                        second = validate(contents, cache, schemas)
+                self.assertEqual(second.cache_misses, 0)
+                self.assertEqual(second.cache_hits, first.block_count)
+                self.assertIn("Line 15: scene unlocks 'scene.missing' does not match any block id.", second.errors)
+                self.assertEqual((second.errors, second.warnings), (first.errors, first.warnings))
+                self.assertEqual([node.block_id for node in second.nodes], [node.block_id for node in first.nodes])
+
+    def test_cache_switch_does_not_take_the_path(self) -> None:
+        example = ROOT / "examples" / "frozen-sick.hopscotch"
+        with tempfile.TemporaryDirectory() as tmp:
+            result = subprocess.run(
+                [sys.executable, str(VALIDATOR), "--cache", example], capture_output=True, text=True, cwd=tmp
+            )
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertIn("Cache: 0 hits, 141 misses", result.stdout)
+            self.assertTrue((Path(tmp) / ".hopscotch-cache").is_dir())
+
+
+class DiagnosticTests(unittest.TestCase):
+    def test_validate_text_returns_structured_diagnostics(self) -> None:
+        text = (
+            "---\r\nhopscotchVersion: 0.5.0\r\n---\r\n"
+            "```hopscotch:scene id=scene.a\r\nsummary: S\r\nmood: grim\r\n```\r\n"
+            "```hopscotch:link id=link.a\r\nfrom: scene.a\r\nto: scene.b\r\nlinkType: narrative_linear\r\n```\r\n"
+        )
+        self.assertEqual(
+            validate_hopscotch.validate_text(text),
+            [
+                validate_hopscotch.Diagnostic(4, "HS205", "error", "scene missing required field 'title'."),
+                validate_hopscotch.Diagnostic(8, "HS302", "error", "link to 'scene.b' does not match any block id."),
+                validate_hopscotch.Diagnostic(
+                    4, "HS502", "warning", "Field 'mood' is not defined in SPEC for type 'scene'."
+                ),
+            ],
+        )
+
+    def test_every_check_tags_its_messages_with_a_stable_code(self) -> None:
+        head = "---\nhopscotchVersion: 0.5.0\n---\n"
+        npc = "```hopscotch:npc id=npc.a\nname: A\nscope: npc.a\n```\n"
+        samples = {
+            "HS101": head + "```hopscotch:npc id=npc.a\nname: A\n",
+            "HS102": head + "```hopscotch: \n",
+            "HS103": head + "```hopscotch:npc\nname: A\n```\n",
+            "HS201": head + "```hopscotch:spell id=spell.a\nname: A\n```\n",
+            "HS202": "---\nhopscotchVersion: 0.3.0\n---\n```hopscotch:gate id=gate.a\n```\n",
+            "HS203": head + "```hopscotch:npc\nname: A\n```\n",
+            "HS204": head + "```hopscotch:scene id=scene.a\ntitle: T\nsummary: S\ndialogue:\n  - type: shout\n```\n",
+            "HS205": head + "```hopscotch:scene id=scene.a\nsummary: S\n```\n",
+            "HS206": head + "```hopscotch:gate id=x.bad\n```\n",
+            "HS207": head + "```hopscotch:scene id=scene.a\ntitle: T\nsummary: S\nrules: x\n```\n",
+            "HS208": head + "```hopscotch:area id=area.a\nname: A\nparent: region.r\n```\n",
+            "HS209": head + npc + "```hopscotch:link id=link.a\nfrom: npc.a\nto: npc.a\nlinkType: sideways\n```\n",
+            "HS301": head + npc + npc,
+            "HS302": head + "```hopscotch:link id=link.a\nfrom: scene.b\nto: scene.b\n```\n",
+            "HS303": head
+            + npc
+            + "```hopscotch:scene id=scene.a\ntitle: T\nsummary: S\nconditions:\n  enterIf:\n"
+            + "    - hasSecret: npc.a\n```\n",
+            "HS401": head + "```hopscotch:npc id=npc.a\nname:\n  - A\nscope: npc.a\n```\n",
+            "HS501": head + npc,
+            "HS502": head + "```hopscotch:npc id=npc.a\nname: A\nscope: npc.a\nmood: grim\n```\n",
+        }
+        found = set()
+        for code, text in samples.items():
+            schema_dir = validate_hopscotch.DEFAULT_SCHEMA_DIR if code == "HS401" else None
+            with mock.patch.dict(validate_hopscotch.ALLOWED_FIELDS):
+                if code == "HS501":
+                    del validate_hopscotch.ALLOWED_FIELDS["npc"]
+                diagnostics = validate_hopscotch.validate_text(text, schema_dir)
+            codes = [d.code for d in diagnostics]
+            self.assertIn(code, codes, diagnostics)
+            self.assertNotIn(validate_hopscotch.UNKNOWN_CODE, codes, diagnostics)
+            found.update(codes)
+        # HS001, for files that cannot be read, is attached by the output formats (see test_hopscotch_formats).
+        self.assertEqual(found | {"HS001"}, set(validate_hopscotch.DIAGNOSTIC_CODES))
+        self.assertEqual(validate_hopscotch.diagnostic_code("Line 1: Something new."), validate_hopscotch.UNKNOWN_CODE)
+
+    def test_codes_survive_the_cache_and_worker_processes(self) -> None:
+        text = "```hopscotch:scene id=scene.a\nsummary: S\nmood: grim\n```\n" * 2
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for _ in range(2):
+                with validate_hopscotch.open_cache(cache_dir) as cache:
+                    result = validate_hopscotch.validate_buffer(text.encode("utf-8"), cache)
+                diagnostics = validate_hopscotch.result_diagnostics(pickle.loads(pickle.dumps(result)))
+                self.assertEqual(
+                    [d.code for d in diagnostics], ["HS205", "HS301", "HS205", "HS502", "HS502"], diagnostics
+                )
+        self.assertEqual(result.cache_hits, 2)
+
+    def test_unreadable_path_raises(self) -> None:
+        with self.assertRaises(OSError):
+            validate_hopscotch.validate_path(str(FIXTURES / "missing.hopscotch"))
+
+
+class IterBlocksTests(unittest.TestCase):
+    def test_blocks_are_yielded_at_closing_fence(self) -> None:
+        consumed = []
+
+        def lines():
+            for line in [
+                "```hopscotch:world id=world.a\n",
+                "name: A\n",
+                "```\n",
+                "prose\n",
+                "```hopscotch:continent id=continent.b\n",
+            ]:
+                consumed.append(line)
+                yield line
+
+        errors = []
+        blocks = validate_hopscotch.iter_blocks(lines(), errors)
+        first = next(blocks)
+        self.assertEqual((first.block_id, first.line_start), ("world.a", 1))
+        self.assertEqual(len(consumed), 3)
+        self.assertEqual(list(blocks), [])
+        self.assertEqual(errors, ["Line 6: Unterminated hopscotch block for id continent.b."])
+
+    def test_validate_stream_keeps_only_nodes(self) -> None:
+        with open(ROOT / "examples" / "frozen-sick.hopscotch", encoding="utf-8") as f:
+            result = validate_hopscotch.validate_stream(f)
+        self.assertEqual(result.errors, [])
+        self.assertTrue(all(b.block_type in validate_hopscotch.NODE_TYPES for b in result.nodes))
+        self.assertEqual(result.counts["scene"], 15)
+
+    def test_scan_blocks_matches_line_parser(self) -> None:
+        texts = [
+            "---\r\nhopscotchVersion: 0.4.0\r\n---\r\n```hopscotch:scene id=scene.a\r\ntitle: T\r\n```\r\n",
+            "prose\r```hopscotch:\r```hopscotch:npc\rname: N\r```\r x ```hopscotch:scene id=scene.b\n",
+            "```hopscotch:area id=area.c\nname: C\n\n  ```hopscotch:scene\n```",
+            "text\n```hopscotch:world id=world.d\nname: D",
+            "```hopscotch:npc id=npc.e\r\nname: E\r\n```\r\nprose\rmore\r\n```hopscotch:npc id=npc.f\r\nname: F\r\n```\r\n",
+        ]
+        for text in texts:
+            expected_errors: list = []
+            expected = list(validate_hopscotch.iter_blocks(io.StringIO(text, newline=None), expected_errors))
+            errors: list = []
+            blocks = list(validate_hopscotch.scan_blocks(text.encode("utf-8"), errors))
+            self.assertEqual(errors, expected_errors, text)
+            self.assertEqual(
+                [(b.block_type, b.block_id, b.line_start, b.content_lines) for b in blocks],
+                [(b.block_type, b.block_id, b.line_start, b.content_lines) for b in expected],
+                text,
+            )
+
+    def test_compact_blocks_keep_their_bodies(self) -> None:
+        text = (
+            "prose\n```hopscotch:scene id=scene.a\ntitle: T\r\nsummary: S\n```\n"
+            "```hopscotch:oddity id=x.b\nname: N\n```\n"
+        )
+        buffer = text.encode("utf-8")
+        blocks = list(validate_hopscotch.scan_blocks(buffer))
+        scene, oddity = blocks
+        self.assertEqual(scene.content_lines, ["title: T\n", "summary: S\n"])
+        self.assertIs(scene.block_type, "scene")
+        self.assertIs(next(iter(scene.keys)), "title")
+        self.assertNotEqual(scene.type_code, oddity.type_code)
+        scene.compact()
+        self.assertIsNone(scene.tree)
+        self.assertEqual(validate_hopscotch.block_tree(scene), {"title": "T", "summary": "S"})
+        self.assertEqual(scene.values, {"title": "T", "summary": "S"})
+        self.assertEqual(scene.keys, {"title", "summary"})
+        copied = pickle.loads(pickle.dumps(blocks))
+        self.assertEqual([b.block_type for b in copied], ["scene", "oddity"])
+        self.assertEqual(copied[1].content_lines, ["name: N\n"])
+        self.assertEqual(copied[1].keys, {"name"})
+
+        lines = ["name: A\n", "parent: world.w"]
+        block = validate_hopscotch.Block("region", "region.r", {"name"}, {"name": "A", "parent": "world.w"}, 1, lines)
+        self.assertEqual(block.content_lines, lines)
+        self.assertEqual(block.keys, {"name"})
+
+    def test_parse_blocks_share_one_buffer(self) -> None:
+        with open(ROOT / "examples" / "frozen-sick.hopscotch", encoding="utf-8") as f:
+            lines = f.readlines()
+        blocks, errors = validate_hopscotch.parse_blocks(lines)
+        expected = list(validate_hopscotch.iter_blocks(lines))
+        self.assertEqual(errors, [])
+        self.assertEqual(len({id(block._source) for block in blocks}), 1)
+        self.assertEqual(
+            [(b.block_type, b.block_id, b.line_start, b.values, set(b.keys), b.content_lines) for b in blocks],
+            [(b.block_type, b.block_id, b.line_start, b.values, set(b.keys), b.content_lines) for b in expected],
+        )
+
+    def test_crlf_file_reports_same_lines(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "crlf.hopscotch"
+            source = (FIXTURES / "scene-invalid-missing-title.hopscotch").read_text(encoding="utf-8")
+            path.write_bytes(source.replace("\n", "\r\n").encode("utf-8"))
+            crlf = run_validator(path)
+        lf = run_validator(FIXTURES / "scene-invalid-missing-title.hopscotch")
+        self.assertEqual(crlf.returncode, 1)
+        self.assertEqual((crlf.stdout, crlf.stderr), (lf.stdout, lf.stderr))
+
+
+class ValidationRuleTests(unittest.TestCase):
+    def test_every_type_has_compiled_validator(self) -> None:
+        self.assertEqual(set(validate_hopscotch.BLOCK_VALIDATORS), validate_hopscotch.ALL_TYPES)
+
+    def test_rule_messages(self) -> None:
+        block = validate_hopscotch.Block(
+            "area", "x.bad", {"name", "parent"}, {"name": "A", "parent": "region.r"}, 3, []
+        )
+        errors, _ = validate_hopscotch.validate_block(block, (0, 5, 0))
+        self.assertEqual(
+            errors,
+            ["Line 3: area parent 'region.r' must be a destination.* or location.* id."],
+        )
+        block = validate_hopscotch.Block("gate", "x.bad", {"type"}, {"type": "open"}, 9, [])
+        errors, _ = validate_hopscotch.validate_block(block, (0, 3, 0))
+        self.assertEqual(
+            errors,
+            [
+                "Line 9: gate blocks require hopscotchVersion >= 0.4.0.",
+                "Line 9: gate missing required field 'skill'.",
+                "Line 9: gate missing required field 'threshold'.",
+                "Line 9: gate id 'x.bad' must start with gate.",
+                "Line 9: gate type 'open' is not valid.",
+            ],
+        )
+
+
+class ParseBodyTests(unittest.TestCase):
+    def test_nested_tree(self) -> None:
+        lines = [
+            "title: \"Quoted: title\"\n",
+            "dc: 13\n",
+            "tags: [a, \"b c\"]\n",
+            "notes: |\n",
+            "  Line one\n",
+            "  Line two\n",
+            "outcomes:\n",
+            "  possible:\n",
+            "    - id: outcome.a\n",
+            "      unlocks:\n",
+            "        - scene.b\n",
+            "rules:\n",
+            "  - ref: rule.x  # trailing comment\n",
+        ]
+        keys, values, tree = validate_hopscotch.parse_body(lines)
+        self.assertEqual(keys, {"title", "dc", "tags", "notes", "outcomes", "rules"})
+        self.assertEqual(values["title"], "Quoted: title")
+        self.assertEqual(values["outcomes"], "")
+        self.assertEqual(
+            tree,
+            {
+                "title": "Quoted: title",
+                "dc": 13,
+                "tags": ["a", "b c"],
+                "notes": "Line one\nLine two\n",
+                "outcomes": {"possible": [{"id": "outcome.a", "unlocks": ["scene.b"]}]},
+                "rules": [{"ref": "rule.x"}],
+            },
+        )
+        self.assertEqual(
+            list(validate_hopscotch.iter_refs(tree)),
+            [("unlocks", "scene.b"), ("rules", "rule.x")],
+        )
+
+    def test_dialogue_and_attachment_checks(self) -> None:
+        lines = [
+            "title: T\n",
+            "summary: S\n",
+            "dialogue:\n",
+            "  - type: likely_actions\n",
+            "    action: Run\n",
+            "  - type: shout\n",
+            "rules:\n",
+            "  - rule.bare-id\n",
+            "assets:\n",
+            "  - ref: npc.x\n",
+        ]
+        keys, values, tree = validate_hopscotch.parse_body(lines)
+        block = validate_hopscotch.Block("scene", "scene.s", keys, values, 4, lines, tree)
+        errors, _ = validate_hopscotch.validate_block(block, (0, 5, 0))
+        self.assertEqual(
+            errors,
+            [
+                "Line 4: likely_actions dialogue missing required field 'response'.",
+                "Line 4: dialogue type 'shout' is not valid.",
+                "Line 4: scene rules entries must be ref objects with a 'ref' id.",
+                "Line 4: scene assets ref 'npc.x' must start with asset.",
+            ],
+        )
+
+
+def node(block_id: str, parent: str = "") -> "validate_hopscotch.Block":
+    values = {"name": block_id.split(".")[-1].upper()}
+    if parent:
+        values["parent"] = parent
+    return validate_hopscotch.Block(block_id.split(".")[0], block_id, set(values), values, 1, [])
+
+
+class HierarchyIndexTests(unittest.TestCase):
+    def test_containment_queries_and_defects(self) -> None:
+        index = validate_hopscotch.HierarchyIndex(
+            [
+                node("area.a2", "location.l"),
+                node("world.w"),
+                node("continent.c", "world.w"),
+                node("region.r", "continent.c"),
+                node("destination.d", "region.r"),
+                node("area.a1", "destination.d"),
+                node("location.l", "destination.d"),
+                node("region.x", "region.y"),
+                node("region.y", "region.x"),
+                node("area.bad", "region.r"),
+                node("destination.lost", "region.missing"),
+            ]
+        )
+        self.assertEqual(
+            index.format_lines(),
+            [
+                "world: world.w (W)",
+                "\tcontinent: continent.c (C)",
+                "\t\tregion: region.r (R)",
+                "\t\t\tdestination: destination.d (D)",
+                "\t\t\t\tlocation: location.l (L)",
+                "\t\t\t\t\tarea: area.a2 (A2)",
+                "\t\t\t\tarea: area.a1 (A1)",
+            ],
+        )
+        self.assertTrue(index.contains("region.r", "area.a2"))
+        self.assertFalse(index.contains("location.l", "area.a1"))
+        self.assertFalse(index.contains("area.a1", "area.a1"))
+        self.assertFalse(index.contains("region.r", "area.bad"))
+        self.assertEqual([b.block_id for b in index.descendants("region.r", "area")], ["area.a2", "area.a1"])
+        self.assertEqual(len(index.descendants("continent.c")), 5)
+        self.assertEqual(index.descendants("area.bad"), [])
+        self.assertEqual(index.ancestor("area.a2", "destination").block_id, "destination.d")
+        self.assertIsNone(index.ancestor("region.r", "location"))
+        self.assertEqual(
+            [b.block_id for b in index.orphans], ["region.x", "region.y", "area.bad", "destination.lost"]
+        )
+        self.assertEqual([b.block_id for b in index.wrong_level], ["region.x", "region.y", "area.bad"])
+        self.assertEqual([[b.block_id for b in cycle] for cycle in index.cycles], [["region.x", "region.y"]])
+
+    def test_report_lists_parent_cycles(self) -> None:
+        nodes = [node("world.w"), node("region.x", "region.y"), node("region.y", "region.x")]
+        counts = {block_type: 0 for block_type in validate_hopscotch.ALL_TYPES}
+        result = validate_hopscotch.ValidationResult([], [], nodes, counts, len(nodes))
+        with redirect_stdout(io.StringIO()) as out:
+            validate_hopscotch.report_file(validate_hopscotch.FileResult("x.hopscotch", result))
+        self.assertIn(
+            "\torphaned nodes:\n\t\tregion: region.x (X)\n\t\tregion: region.y (Y)\n"
+            "\tparent cycles:\n\t\tregion.x -> region.y -> region.x\n",
+            out.getvalue(),
+        )
 
 
 if __name__ == "__main__":